@@ -0,0 +1,208 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Ask the sensors for the packets that were missed, a few at a time.
+
+The missing packets of a position are split into chunks of at most
+chunk_size packets, and only max_in_flight chunks are asked for at
+once, so each reply from the sensor is small and is processed quickly.
+A chunk is finished when all of its packets are received, and the next
+chunk is asked for.  If a chunk is not finished in timeout milliseconds
+the packets still missing are asked for again, up to max_retries times,
+and then the chunk is given up on.  Packets given up on are not asked
+for again for ABANDON_TIME seconds after their chunk was given up on,
+in case the sensor does not have them.
+
+The requests and timeout checks run on the ingest worker thread, and the
+metrics are read from the instrumentation.Reporter thread, so the
+scheduler's lock is held while the requests are changed or counted.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from collections import deque
+import logging
+import threading
+import time
+import tkinter as tk  # type hinting
+from typing import Callable, List
+
+# local files
+import global_params
+import packet_gaps
+
+ABANDON_TIME = 300  # seconds before asking again for packets that were given up on
+
+
+class _Chunk:
+    """ Request for a range of packets sent to a sensor and not finished yet """
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+        self.remaining = set(range(start, end + 1))
+        self.retries = 0
+        self.sent_time = 0.0
+
+    def remaining_ranges(self) -> List[List[int]]:
+        return packet_gaps.PacketGaps(list(self.remaining)).ranges()
+
+
+class BackfillScheduler:
+    """
+    Queue of the missing packet requests for each position.
+
+    Attributes:
+        root_app (tk.Tk): used to schedule the timeout checks with its after
+        method, the TimeStreamData passes its ingest.IngestPipeline so the
+        checks run on the ingest worker thread
+        send_request (Callable): function called with the position and a list of
+        [start, end] packet ranges to ask the sensor for, it returns False if
+        the request could not be sent
+        chunk_size (int): maximum number of packets in 1 request
+        timeout (int): milliseconds to wait for a request to be finished
+        max_in_flight (int): maximum unfinished requests for each position
+        max_retries (int): times to ask again for a chunk before giving up on it
+    """
+    def __init__(self, root_app: tk.Tk,
+                 send_request: Callable[[str, List[List[int]]], bool],
+                 chunk_size: int = global_params.REMOTE_ASK_PKT_SIZE,
+                 timeout: int = global_params.REMOTE_ASK_TIME,
+                 max_in_flight: int = global_params.REMOTE_ASK_IN_FLIGHT,
+                 max_retries: int = global_params.REMOTE_ASK_RETRIES):
+        self.root_app = root_app
+        self.send_request = send_request
+        self.chunk_size = max(int(chunk_size), 1)
+        self.timeout = timeout
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.max_retries = max_retries
+        self._queues = {}  # position to deque of [start, end] chunks not sent yet
+        self._in_flight = {}  # position to list of _Chunk
+        self._abandoned = {}  # position to list of (time.monotonic() to ask again, [start, end])
+        self.lock = threading.RLock()  # held while the requests are changed or counted
+        self._metrics = {"chunks sent": 0, "chunks finished": 0,
+                         "retries": 0, "chunks abandoned": 0}
+
+    def request(self, position: str, missing_ranges: List[List[int]]):
+        """
+        Ask for the missing packets of a position.  This replaces the chunks
+        of the position that were not sent yet, chunks already sent are kept.
+
+        Args:
+            position (str): position name, ie "position 2"
+            missing_ranges (list): sorted [start, end] ranges of the missing
+            packet ids, inclusive
+        """
+        with self.lock:
+            in_flight = self._in_flight.setdefault(position, [])
+            asked = sorted([chunk.start, chunk.end] for chunk in in_flight)
+            ranges = packet_gaps.subtract_ranges(missing_ranges, asked)
+            ranges = packet_gaps.subtract_ranges(ranges, self._abandoned_ranges(position))
+            queue = deque()
+            for start, end in ranges:
+                for chunk_start in range(start, end + 1, self.chunk_size):
+                    queue.append([chunk_start, min(chunk_start + self.chunk_size - 1, end)])
+            self._queues[position] = queue
+            self._send_next(position)
+
+    def packet_received(self, position: str, packet_id: int):
+        """
+        Mark a packet as received, and ask for the next chunk if this
+        finishes one.
+
+        Args:
+            position (str): position name, ie "position 2"
+            packet_id (int): id of the packet received
+        """
+        with self.lock:
+            for chunk in self._in_flight.get(position, []):
+                if chunk.start <= packet_id <= chunk.end:
+                    chunk.remaining.discard(packet_id)
+                    if not chunk.remaining:
+                        self._in_flight[position].remove(chunk)
+                        self._metrics["chunks finished"] += 1
+                        self._send_next(position)
+                    return
+
+    def pending(self, position: str) -> int:
+        """ Number of chunks of a position waiting to be sent or finished """
+        with self.lock:
+            return (len(self._queues.get(position, [])) +
+                    len(self._in_flight.get(position, [])))
+
+    def clear(self, position: str = None):
+        """
+        Forget the requests of a position, or all positions, for a new day
+        when the packet ids start over.
+
+        Args:
+            position (str, optional): position to clear, None for all
+        """
+        with self.lock:
+            positions = [position] if position else list(self._positions())
+            for _position in positions:
+                self._queues.pop(_position, None)
+                self._in_flight.pop(_position, None)
+                self._abandoned.pop(_position, None)
+
+    def metrics(self) -> dict:
+        """ Get the counts of chunks sent, finished, retried and given up on """
+        with self.lock:
+            metrics = dict(self._metrics)
+            metrics["chunks pending"] = sum(self.pending(position)
+                                            for position in self._positions())
+        return metrics
+
+    def _positions(self) -> set:
+        return set(self._queues) | set(self._in_flight) | set(self._abandoned)
+
+    def _abandoned_ranges(self, position: str) -> List[List[int]]:
+        """ Forget the packets of a position given up on more than ABANDON_TIME
+        ago, and get sorted ranges of the ones still not to ask for """
+        now = time.monotonic()
+        abandoned = [(until, ids) for until, ids in self._abandoned.get(position, [])
+                     if now < until]
+        self._abandoned[position] = abandoned
+        return packet_gaps.PacketGaps(packet_gaps.expand_ranges(
+            [ids for _, ids in abandoned])).ranges()
+
+    def _send_next(self, position: str):
+        """ Send chunks from the queue until max_in_flight are unfinished """
+        queue = self._queues.get(position)
+        in_flight = self._in_flight.setdefault(position, [])
+        while queue and len(in_flight) < self.max_in_flight:
+            chunk = _Chunk(*queue[0])
+            if not self._send(position, chunk, [[chunk.start, chunk.end]]):
+                return  # no connection, try again with the next request
+            queue.popleft()
+            in_flight.append(chunk)
+            self._metrics["chunks sent"] += 1
+
+    def _send(self, position: str, chunk: _Chunk, ranges: List[List[int]]) -> bool:
+        if self.send_request(position, ranges) is False:
+            return False
+        chunk.sent_time = time.monotonic()
+        self.root_app.after(self.timeout, self._check_timeouts, position)
+        return True
+
+    def _check_timeouts(self, position: str):
+        """ Ask again for the chunks of a position that are not finished in
+        time, or give up on them after max_retries """
+        with self.lock:
+            now = time.monotonic()
+            for chunk in self._in_flight.get(position, [])[:]:
+                if 1000 * (now - chunk.sent_time) < self.timeout:
+                    continue  # a newer timeout check is scheduled for this chunk
+                if chunk.retries < self.max_retries:
+                    chunk.retries += 1
+                    self._metrics["retries"] += 1
+                    logging.debug(f"asking {position} again for packets {chunk.remaining_ranges()}")
+                    if self._send(position, chunk, chunk.remaining_ranges()):
+                        continue
+                logging.warning(f"{position} did not send packets {chunk.remaining_ranges()}")
+                self._in_flight[position].remove(chunk)
+                self._metrics["chunks abandoned"] += 1
+                # each range given up on gets its own time to be asked for again
+                self._abandoned.setdefault(position, []).extend(
+                    (now + ABANDON_TIME, ids) for ids in chunk.remaining_ranges())
+            self._send_next(position)
@@ -10,6 +10,8 @@ __author__ = "Kyle Vitatus Lopin"
 from datetime import datetime
 import os
 
+# local files
+import packet_gaps
 
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -32,11 +34,17 @@ def get_data_needed(position, remote_data: list):
 
 
 def find_missing_packets(pkts_rx, pkts_in_remote):
-    pkts_needed = []
-    for i in range(int(pkts_in_remote)):
-        if i not in pkts_rx:
-            pkts_needed.append(i)
-    return pkts_needed
+    """
+    Find the packets the remote sensor has that were not received.
+
+    Args:
+        pkts_rx (list): packet ids in the saved data file
+        pkts_in_remote (int, str): number of packets the sensor saved
+
+    Returns:
+        list: [start, end] ranges of the packet ids needed, inclusive
+    """
+    return packet_gaps.PacketGaps(pkts_rx).missing(int(pkts_in_remote))
 
 
 def get_packets(position, file, num_packets):
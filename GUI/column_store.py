@@ -0,0 +1,225 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Columnar storage for the time series data of a sensor position.
+
+Each column is a preallocated numpy array, the live data is the
+slice [start:stop] of the arrays so the columns can be handed to the
+graphs and save functions as views without copying them.  Appending
+is amortized O(1), inserting an out of order packet only shifts the
+side of the buffer closest to the insert point, and when a maximum
+length is set the oldest points are dropped by moving the start
+pointer (ring buffer semantics).
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from typing import Dict, Sequence, Tuple
+
+# installed libraries
+import numpy as np
+
+INITIAL_CAPACITY = 256
+
+
+def missing_value(dtype: np.dtype):
+    """
+    Get the value used to fill a column of dtype when no data is given for it
+
+    Args:
+        dtype (np.dtype): data type of the column
+
+    Returns:
+        NaN for floats, NaT for datetimes and -1 for integers
+
+    Test
+    -------------
+    >>> missing_value(np.dtype(np.float32))
+    nan
+    >>> missing_value(np.dtype(np.int32))
+    -1
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'M':
+        return np.datetime64("NaT")
+    return -1
+
+
+class ColumnStore:
+    """
+    Hold a set of equal length numpy columns in preallocated buffers.
+
+    Attributes:
+        dtypes (dict): column name to numpy data type of the column
+        max_length (int): if not None, the oldest points are dropped when
+        more than max_length points are stored
+    """
+    def __init__(self, dtypes: Dict[str, str],
+                 capacity: int = INITIAL_CAPACITY,
+                 max_length: int = None):
+        """
+        Args:
+            dtypes (dict): column names mapped to the numpy dtype to store them as
+            capacity (int): number of points to preallocate
+            max_length (int, optional): maximum number of points to keep,
+            None to let the columns keep growing
+        """
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in dtypes.items()}
+        self.max_length = max_length
+        self._capacity = max(int(capacity), 1)
+        self._columns = {name: np.empty(self._capacity, dtype=dtype)
+                         for name, dtype in self.dtypes.items()}
+        self._start = 0
+        self._stop = 0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """ Get a view of the live data of a column """
+        return self._columns[name][self._start:self._stop]
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def search_sorted(self, name: str, value) -> Tuple[int, bool]:
+        """
+        Binary search a column that is kept in sorted order, without copying it.
+
+        Args:
+            name (str): column to search, has to be sorted
+            value: value to look for
+
+        Returns:
+            tuple of the index where value is, or should be inserted to keep
+            the column sorted, and True if the value is already in the column
+        """
+        column = self[name]
+        index = int(np.searchsorted(column, value))
+        return index, bool(index < column.shape[0] and column[index] == value)
+
+    def append(self, values: dict):
+        """
+        Add a point to the end of the columns.
+
+        Args:
+            values (dict): column name to the value to store, any columns
+            not in values are filled with their missing value
+        """
+        return self.insert(len(self), values)
+
+    def insert(self, index: int, values: dict):
+        """
+        Insert a point at index, shifting the smaller side of the buffer
+        to make room for it.
+
+        Args:
+            index (int): where to put the point, 0 to len(self)
+            values (dict): column name to the value to store, any columns
+            not in values are filled with their missing value
+
+        Returns:
+            int: index of the new point, this is smaller than index if the
+            oldest points were dropped to stay under max_length, or -1 if
+            the new point was the oldest and was dropped
+
+        Raises:
+            IndexError: if the index is outside the stored data
+        """
+        length = len(self)
+        if index < 0 or index > length:
+            raise IndexError(f"insert index {index} out of range for {length} points")
+        if index < length // 2 and self._start > 0:
+            # cheaper to move the points in front of the index back one
+            position = self._start + index
+            for column in self._columns.values():
+                column[self._start - 1:position - 1] = column[self._start:position]
+            self._start -= 1
+            position -= 1
+        else:
+            self._reserve(1)
+            position = self._start + index
+            if position < self._stop:
+                for column in self._columns.values():
+                    column[position + 1:self._stop + 1] = column[position:self._stop]
+            self._stop += 1
+        for name, column in self._columns.items():
+            column[position] = values.get(name, missing_value(self.dtypes[name]))
+        if self.max_length is not None:
+            self.trim(self.max_length)
+        return max(position - self._start, -1)
+
+    def trim(self, max_length: int):
+        """ Drop the oldest points so no more than max_length are stored """
+        if len(self) > max_length:
+            self._start = self._stop - max_length
+
+    def clear(self):
+        """ Remove all the points, the buffers are kept for reuse """
+        self._start = 0
+        self._stop = 0
+
+    def set_column(self, name: str, values: Sequence):
+        """
+        Overwrite a column with new values.  If the length of values does
+        not match the number of points stored, the store is resized to the
+        new length and all the other columns are set to their missing value,
+        so a set of columns can be assigned one after another.
+
+        Args:
+            name (str): column to overwrite
+            values (Sequence): new data for the column
+        """
+        values = np.asarray(values, dtype=self.dtypes[name])
+        if values.shape[0] != len(self):
+            self._resize(values.shape[0])
+        self[name][:] = values
+
+    def set_columns(self, columns: Dict[str, Sequence]):
+        """
+        Replace all the stored data in one call
+
+        Args:
+            columns (dict): column name to the values of the column, all
+            the values have to be the same length, missing columns are
+            filled with their missing values
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"columns have different lengths: {lengths}")
+        self._resize(lengths.pop() if lengths else 0)
+        for name, values in columns.items():
+            self[name][:] = np.asarray(values, dtype=self.dtypes[name])
+
+    def _resize(self, length: int):
+        """ Make the store hold length points, all set to missing values """
+        self.clear()
+        self._reserve(length)
+        self._stop = length
+        for name in self._columns:
+            self[name][:] = missing_value(self.dtypes[name])
+
+    def _reserve(self, n_points: int):
+        """
+        Make sure there is room for n_points after the stop pointer,
+        first by moving the data to the front of the buffers if enough
+        space was freed at the front, else by doubling the buffers.
+        """
+        if self._stop + n_points <= self._capacity:
+            return
+        length = len(self)
+        if length + n_points <= self._capacity and self._start >= self._capacity // 4:
+            for column in self._columns.values():
+                column[:length] = column[self._start:self._stop]
+        else:
+            self._capacity = max(2 * self._capacity, length + n_points)
+            for name, column in self._columns.items():
+                new_column = np.empty(self._capacity, dtype=self.dtypes[name])
+                new_column[:length] = column[self._start:self._stop]
+                self._columns[name] = new_column
+        self._start = 0
+        self._stop = length
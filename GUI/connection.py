@@ -7,7 +7,6 @@ Connection classes to connect to MQTT servers.
 __author__ = "Kyle Vitautas Lopin"
 
 # standard files
-import ast
 import json
 import logging
 import os
@@ -22,6 +21,9 @@ from dotenv import load_dotenv, find_dotenv
 import check_saved_data
 import data_class
 import global_params
+import instrumentation
+import message_decoder
+import packet_gaps
 import update_sensor
 # files for type hinting
 if False:
@@ -80,13 +82,16 @@ class ConnectionClass:
         if "HIVEMQ" in CONNECTION_OPTIONS:
             self.hivemqtt = HIVEMQConnection(root, data)
 
-    def ask_for_stored_data(self, position, pkt_nums):
+    def ask_for_stored_data(self, position, pkt_ranges):
         """
-        Ask a sensor to send old data that it has saved.
+        Ask a sensor to send old data that it has saved.  The sensors
+        already in the factory only read the "packet numbers" list, so it
+        is sent along with the "packet ranges" the newer sensors read.
 
         Args:
             position (str): position name, ie "position 2"
-            pkt_nums (list): list of packet numbers to send
+            pkt_ranges (list): [start, end] ranges of the packet numbers
+            to send, inclusive
 
         Returns: None, the sensor will respond and the on_message
         callback will handle the rest
@@ -94,7 +99,9 @@ class ConnectionClass:
         """
         device = POSITIONS[position]
         _topic = f"device/{device}/control"
-        _message = f'{{"command": "send packet", "packet numbers": {pkt_nums}}}'
+        _message = json.dumps({"command": "send packet",
+                               "packet numbers": packet_gaps.expand_ranges(pkt_ranges),
+                               "packet ranges": pkt_ranges})
         self.publish(_topic, _message, msg_qos=0)
 
     def destroy(self):
@@ -132,6 +139,7 @@ class BaseConnectionClass:
         self.mqtt_server_index = 0
         self.master = master
         self.loop = None
+        self.loop_started = False  # if the paho network thread is running
         self.found_server = False
         self.connected = False
         self.client = mqtt.Client(client_name,  # clean_session=False,
@@ -145,7 +153,9 @@ class BaseConnectionClass:
 
     def start_conn(self):
         """
-        Start a connection and keep it looping
+        Start a connection and check it every 15 seconds.  The messages are
+        handled by the paho network thread from loop_start, so the Tk loop
+        is not blocked waiting for them.
 
         Returns:  None
 
@@ -154,7 +164,9 @@ class BaseConnectionClass:
         # print(f"loop client: {self._connected}")
         if not self.connected:
             self.connect()
-        self.client.loop(timeout=10)
+        if not self.loop_started:
+            self.client.loop_start()
+            self.loop_started = True
 
     def stop_conn(self):
         """
@@ -163,11 +175,15 @@ class BaseConnectionClass:
         """
         self.master.after_cancel(self.loop)
         self.client.loop_stop()
+        self.loop_started = False
         self.client.disconnect()
 
     def _on_message(self, client, userdata, msg: mqtt.MQTTMessage):
         """
-        Handle all incoming message from the broker
+        Handle all incoming message from the broker.  This is called on
+        the paho network thread, so the message is only decoded here and
+        handed to the data's ingest worker thread to be processed.
+
         Args:
             client:  paho MQTT Client
             userdata: data associated with the MQTT channel, None now
@@ -175,34 +191,47 @@ class BaseConnectionClass:
             usually from a sensor
         """
         # print("Got message:", msg.topic, msg.payload)
-        device = msg.topic.split("/")[1]
-
-        # devices, i.e. "device_2" are sent in the topic, convert that
-        # to position, i.e. "position 2" for the rest of this program
-        if device in global_params.DEVICES:
-            position = global_params.DEVICES[device]
-            # update the user information frame the sensor is working
-            self.master.info.check_in(position)
-        else:  # the topic is not correct for a device
-            return
-        if 'data' in msg.topic:
-            data_str = msg.payload.decode('utf8')
-            self.parse_mqtt_data(json.loads(data_str))
-        elif 'status' in msg.topic:
-            # JSON converts False to false and True to true, fix that here
-            payload = msg.payload.decode('utf8').replace("false", "False")
-            payload = payload.replace("true", "True")
-            # print(f"Got control message: {msg.payload}")
-            msg_dict = ast.literal_eval(payload)
-            # print(f"msg dict: {msg_dict}")
-            if "status" in msg_dict:
-                self.parse_mqtt_status(msg_dict)
-            if 'saved files' in msg_dict:
-                data_needed = check_saved_data.get_data_needed(device,
-                                                               msg_dict["saved files"])
-                pkt = {"command": "send old data",
-                       "data needed": data_needed}
-                self.send_command(device, pkt)
+        # devices, i.e. "device_2" are sent in the topic, the decoder converts
+        # that to position, i.e. "position 2" for the rest of this program,
+        # and rejects topics that are not for a device
+        instrumentation.count("mqtt messages")
+        with instrumentation.stage("mqtt decode"):
+            try:
+                message = message_decoder.decode_message(msg.topic, msg.payload)
+            except message_decoder.MessageError as _error:
+                instrumentation.count("mqtt messages rejected")
+                logger.warning(f"rejected message on {msg.topic}: {_error}")
+                return
+        # update the user information frame the sensor is working
+        self.data.ingest.call_in_ui(self.master.info.check_in, message.position)
+        if message.n_rejected:
+            instrumentation.count("saved packets rejected", message.n_rejected)
+            logger.warning(f"rejected {message.n_rejected} saved packets on {msg.topic}")
+        if message.kind == message_decoder.STATUS:
+            self.data.ingest.submit(self.parse_mqtt_control, message.device, message.body)
+        else:
+            self.data.ingest.submit(self.parse_mqtt_data, message)
+
+    def parse_mqtt_control(self, device, msg_dict):
+        """
+        Handle a message from the status channel of a sensor, this is run
+        on the ingest worker thread.
+
+        Args:
+            device (str): device that sent the message, i.e. "device_2"
+            msg_dict (dict): decoded message
+        """
+        if "status" in msg_dict:
+            self.parse_mqtt_status(msg_dict)
+        if 'saved files' in msg_dict:
+            data_needed = check_saved_data.get_data_needed(device,
+                                                           msg_dict["saved files"])
+            # "data needed" has every packet number for the older sensors
+            pkt = {"command": "send old data",
+                   "data needed": [[filename, packet_gaps.expand_ranges(pkt_ranges)]
+                                   for filename, pkt_ranges in data_needed],
+                   "data needed ranges": data_needed}
+            self.send_command(device, pkt)
 
     def parse_mqtt_status(self, packet):
         """
@@ -218,8 +247,8 @@ class BaseConnectionClass:
         position = packet["status"]
         if position in POSITIONS:
             if "running" in packet:
-                self.master.info.position_online(position,
-                                                 packet["running"])
+                self.data.ingest.call_in_ui(self.master.info.position_online,
+                                            position, packet["running"])
             if "packets sent" in packet:
                 self.data.update_latest_packet_id(position,
                                                   packet["packets sent"])
@@ -230,26 +259,21 @@ class BaseConnectionClass:
                     print("Error checking model, please reload")
                     # TODO: reload the model
 
-    def parse_mqtt_data(self, packet):
+    def parse_mqtt_data(self, message: message_decoder.DecodedMessage):
         """
         Deal with incoming data packet(s), either a current read, or older
-        saved packets that coming in a large packet
+        saved packets that coming in a large packet, this is run on the
+        ingest worker thread.
+
         Args:
-            packet (dict): data packet(s) from sensor
-        """
-        if "data packets" in packet: # this is saved data packets
-            for key in packet:
-                # print(f"data key: {key}")
-                if "data packets" not in key:
-                    try:
-                        self.data.add_data(packet[key])
-                    except Exception as _error:
-                        print(f"error processing packet: {packet}")
-                        logging.error(f"Error: {_error}\nprocessing packet {packet}")
+            message (message_decoder.DecodedMessage): checked data packet(s) from sensor
+        """
+        if message.kind == message_decoder.SAVED_DATA:
+            # score all the saved packets together and add them in order
+            self.data.add_data_batch(message.body)
         else:
             # update the data
-            # print(f"parse mqtt data keys: {packet.keys()}")
-            self.data.add_data(packet)
+            self.data.add_data(message.body)
             # the data class will update the display
 
     def publish(self, topic, message, qos=0):
@@ -496,6 +520,7 @@ class HIVEMQConnection(BaseConnectionClass):
                                     password=HIVEMQTT_PASSWORD)
         self.connect()
         self.client.loop_start()
+        self.loop_started = True
 
     def connect(self):
         print("Trying to connect to HIVEMQ Server")
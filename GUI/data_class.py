@@ -13,23 +13,32 @@ import datetime as dt
 import json
 import logging
 import os
-import shutil
 import tkinter as tk  # type hinting
 from typing import List
 
 # installed libraries
-from codetiming import Timer
-from numpy import array, nan, searchsorted
-from psutil import cpu_count, getloadavg, virtual_memory
-from psutil._common import bytes2human
+import numpy as np
+from numpy import asarray, datetime_as_string, float32, int32, isnan, unique
+from psutil import cpu_count
 
 # sys.path.append(os.getcwd())
 # sys.path.append('/Users/kylesmac/PycharmProjects/NIR_ROB/GUI')
 # print(sys.path)
 # local files
+import backfill
+import column_store
+import day_store
+import file_thread
 import global_params
 import helper_functions
+import ingest
+import instrumentation
 import model
+import packet_gaps
+import rolling_stats
+import scoring
+import sensor_packet
+import write_ahead_log
 
 # Test and run log files are different, but messages are the same
 logger = logging.getLogger('my_logger')
@@ -61,6 +70,18 @@ SETTINGS = json.loads(json_data2)
 DISPLAY_ROLLING_MEAN = SETTINGS["Rolling avg"]
 rolling_samples = SETTINGS["Rolling samples"]
 LOG_RAW_DATA = SETTINGS["log data"]  # option to save raw data
+# how long and how many lines the file writer thread buffers before writing
+FILE_FLUSH_INTERVAL = SETTINGS.get("file flush interval", file_thread.FLUSH_INTERVAL)
+FILE_FLUSH_SIZE = SETTINGS.get("file flush size", file_thread.FLUSH_SIZE)
+# option to also save the data in binary files that reload quickly
+USE_DAY_STORE = SETTINGS.get("binary day store", False)
+# seconds between cpu and RAM samples, and between logging the stage latencies
+METRICS_SAMPLE_INTERVAL = SETTINGS.get("metrics sample interval",
+                                       instrumentation.SAMPLE_INTERVAL)
+METRICS_LOG_INTERVAL = SETTINGS.get("metrics log interval", instrumentation.LOG_INTERVAL)
+# log each saved line with a checksum so the day file can be rebuilt after a crash
+USE_WRITE_AHEAD_LOG = SETTINGS.get("write ahead log", False)
+# lines logged before they are merged into the sorted day file
 FILE_HEADER = ["time", "position", "OryConc", "AV", "CPUTemp", "SensorTemp", "packet_id"]
 FILE_HEADER_TO_SAVE = ["time", "device", "OryConc", "AV", "CPUTemp", "SensorTemp", "packet_id"]
 
@@ -70,19 +91,28 @@ RAW_DATA_HEADERS = ["time", "device", "packet_id"]
 RAW_DATA_HEADERS.extend([str(i) for i in range(1350, 1651)])
 CPU_COUNT = cpu_count()
 
+# columns of DeviceData and the dtype they are stored as
+DEVICE_DATA_COLUMNS = {"time_series": "datetime64[s]",
+                       "packet_ids": int32,
+                       "cpu_temp": float32,
+                       "sensor_temp": float32,
+                       "oryzanol": float32,
+                       "ory_rolling": float32,
+                       "av": float32,
+                       "av_rolling": float32}
+
 indices = dict()
 for header in FILE_HEADER:
     indices[header] = FILE_HEADER.index(header)
 
 
 def log_cpu_ram_usage():
-    """ Write into the logger the cpu and RAM usage """
-    print(getloadavg(), cpu_count())
-    cpu_loads = [x / CPU_COUNT for x in getloadavg()]
-    virt_mem = virtual_memory()
-    ram_usage = bytes2human(virt_mem.used)
-    logger.info(f"cpu loads: {cpu_loads}")
-    logger.info(f"ram percentage: {virt_mem.percent}, ram used: {ram_usage}")
+    """ Write into the logger the cpu and RAM usage, the instrumentation.Reporter
+    thread samples these on its own timer so this is only for checking by hand """
+    instrumentation.sample_system()
+    gauges = instrumentation.INSTRUMENTS.snapshot()["gauges"]
+    logger.info(f"cpu loads: {gauges['cpu loads']}")
+    logger.info(f"ram percentage: {gauges['ram percentage']}, ram used: {gauges['ram used']}")
 
 
 def isfloat(str_to_test: str) -> bool:
@@ -308,21 +338,144 @@ class DataPacket:
         return csv_str
 
 
+def _parse_floats(strings: np.ndarray) -> np.ndarray:
+    """ Convert an array of stripped strings to floats in one pass,
+    blank or badly formatted strings are NaN """
+    values = np.full(strings.shape[0], np.nan)
+    not_blank = strings != ""
+    try:
+        values[not_blank] = strings[not_blank].astype(float)
+    except ValueError:  # only check each string if some are bad
+        values[:] = [float(string) if isfloat(string) else np.nan
+                     for string in strings]
+    return values
+
+
+def _parse_ints(strings: np.ndarray) -> np.ndarray:
+    """ Convert an array of stripped strings to ints in one pass,
+    strings that are not ints (like isint) are -1 """
+    try:
+        return strings.astype(np.int64)
+    except ValueError:  # only check each string if some are bad
+        return np.array([int(string) if isint(string) else -1
+                         for string in strings], dtype=np.int64)
+
+
+def _parse_clock_times(strings: np.ndarray) -> np.ndarray:
+    """
+    Convert an array of stripped "%H:%M:%S" or "%Y-%m-%d %H:%M:%S" strings
+    to the seconds since midnight, like extract_time_stamp does for one
+    string, times that are not in either format are -1
+
+    Test
+    -------------
+    >>> _parse_clock_times(np.array(["00:01:37", "2023-05-12 10:25:45", "bbb"])).tolist()
+    [97, 37545, -1]
+    """
+    # the time is after the last space for both formats
+    clock = np.char.rpartition(strings, " ")[:, 2]
+    try:
+        times = np.char.add("1970-01-01T", clock).astype("datetime64[s]")
+        valid = np.char.str_len(clock) == 8
+    except ValueError:  # only check each string if some are bad
+        clock = np.array([extract_time_stamp(string) for string in strings])
+        valid = clock != ""
+        times = np.char.add("1970-01-01T", np.where(valid, clock, "00:00:00")
+                            ).astype("datetime64[s]")
+    seconds = times.astype(np.int64)
+    seconds[~valid | (seconds < 0) | (seconds >= 86400)] = -1
+    return seconds
+
+
+def convert_csv_rows_to_columns(csv_rows: List[List[str]], date: dt.date) -> dict:
+    """
+    Convert the rows of a saved csv file into DeviceData columns for each
+    position, parsing each column at once instead of a row at a time.
+    Rows are skipped the same as convert_csv_row_to_packet skips them, if
+    the packet id is not an int or the position is not in POSITIONS, and
+    also if the time is not valid.
+
+    Args:
+        csv_rows (list): rows of the saved csv file, already split on the
+        commas and without the header, each with at least 7 entries
+        date (dt.date): day to put the times of the rows on
+
+    Returns:
+        dict: position to a dict of DEVICE_DATA_COLUMNS names and values,
+        in the order of the file, use DeviceData.set_data to sort them
+    """
+    if not csv_rows:
+        return {}
+    columns = list(zip(*[row[:len(FILE_HEADER)] for row in csv_rows]))
+    strings = {header: np.char.strip(np.array(columns[indices[header]], dtype=str))
+               for header in FILE_HEADER}
+    packet_ids = _parse_ints(strings["packet_id"])
+    seconds = _parse_clock_times(strings["time"])
+    valid = (packet_ids >= 0) & (seconds >= 0)
+    positions = strings["position"]
+    n_skipped = np.count_nonzero(~valid | ~np.isin(positions, POSITIONS))
+    if n_skipped:
+        logger.warning(f"skipped {n_skipped} rows of saved data that were not formatted correctly")
+    time_series = np.datetime64(date, 's') + seconds.astype("timedelta64[s]")
+    values = {name: _parse_floats(strings[header]) for name, header in
+              [("oryzanol", "OryConc"), ("av", "AV"),
+               ("cpu_temp", "CPUTemp"), ("sensor_temp", "SensorTemp")]}
+    data = {}
+    for position in POSITIONS:
+        rows = valid & (positions == position)
+        if rows.any():
+            data[position] = {"time_series": time_series[rows],
+                              "packet_ids": packet_ids[rows]}
+            for name, column in values.items():
+                data[position][name] = column[rows]
+    return data
+
+
+def _column_property(name: str) -> property:
+    """ Make a property that gives a view of a DeviceData column, and
+    lets the column be assigned with a list or array """
+    def getter(self):
+        return self._data[name]
+
+    def setter(self, values):
+        self._data.set_column(name, values)
+    return property(getter, setter, doc=f"view of the {name} column")
+
+
 class DeviceData:
-    def __init__(self, use_av=False):
-        self.time_series = []
-        self.packet_ids = []
-        self.cpu_temp = []
-        self.sensor_temp = []
-        self.oryzanol = []
-        self.ory_rolling = []
+    """
+    Hold the time series data for one sensor position.  The data is kept
+    in a column_store.ColumnStore and each attribute (time_series,
+    packet_ids, oryzanol, etc.) is a numpy view of its column, sorted
+    by packet id.
+    """
+    time_series = _column_property("time_series")
+    packet_ids = _column_property("packet_ids")
+    cpu_temp = _column_property("cpu_temp")
+    sensor_temp = _column_property("sensor_temp")
+    oryzanol = _column_property("oryzanol")
+    ory_rolling = _column_property("ory_rolling")
+    av = _column_property("av")
+    av_rolling = _column_property("av_rolling")
+
+    def __init__(self, use_av=False, max_data_pts=None):
+        """
+        Args:
+            use_av (bool): if the position measures acid values
+            max_data_pts (int, optional): if set only keep this many of the
+            newest data points, else keep the whole day
+        """
+        self._data = column_store.ColumnStore(DEVICE_DATA_COLUMNS,
+                                              max_length=max_data_pts)
         self.use_av = use_av
-        self.av = []
-        self.av_rolling = []
+
+        self._ory_stats = rolling_stats.RollingStats(rolling_samples)
+        self._av_stats = rolling_stats.RollingStats(rolling_samples)
 
         self.today = dt.datetime.today().date()
-        self.rolling_samples = rolling_samples
         self.ask_for_missing_packets = False
+        # every packet id received today, even ones trimmed from the columns
+        self.packet_gaps = packet_gaps.PacketGaps()
         self.last_packet_id = -1
         self.next_packet_to_get = 0
         self.lost_pkt_ptr = None  # use this to find missing pkts
@@ -330,143 +483,149 @@ class DeviceData:
         self.model_checked = False
         self.settings_checked = False
 
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def rolling_samples(self) -> int:
+        return self._ory_stats.n_samples
+
+    @rolling_samples.setter
+    def rolling_samples(self, n_samples: int):
+        """ Change the rolling window and rebuild the rolling columns in one pass """
+        self._ory_stats.n_samples = int(n_samples)
+        self._av_stats.n_samples = int(n_samples)
+        self.rebuild_rolling()
+
+    def rebuild_rolling(self):
+        """ Recalculate the full rolling columns, after the data columns are assigned """
+        self._ory_stats.rebuild(self.oryzanol, self.ory_rolling)
+        self._av_stats.rebuild(self.av, self.av_rolling)
+
+    def set_data(self, columns: dict):
+        """
+        Replace all the data with whole columns at once, for loading saved data.
+        Repeated packet ids keep their first point, the same as adding the
+        points one at a time, and the points are sorted by packet id.
+
+        Args:
+            columns (dict): DEVICE_DATA_COLUMNS names to the values of the
+            column, has to include "packet_ids", the rolling columns are
+            calculated here
+        """
+        packet_ids = asarray(columns["packet_ids"])
+        _, first_index = unique(packet_ids, return_index=True)
+        self.packet_gaps.set(packet_ids)
+        self._data.set_columns({name: asarray(values)[first_index]
+                                for name, values in columns.items()})
+        if self._data.max_length is not None:
+            self._data.trim(self._data.max_length)
+        self.rebuild_rolling()
+        self.ask_for_missing_packets = bool(self.packet_gaps.missing())
+
     def save_summary_data(self, csv_writer: csv.writer, position: str):
         print(f"save position summary data")
-        for i in range(len(self.packet_ids)):
-            # make row to write
-            if len(self.av) > 0:
-                row = [self.time_series[i].strftime("%Y-%m-%d %H:%M:%S"),
-                       position, self.oryzanol[i],
-                       self.av[i], self.cpu_temp[i],
-                       self.sensor_temp[i], self.packet_ids[i]]
-            else:
-                row = [self.time_series[i].strftime("%Y-%m-%d %H:%M:%S"),
-                       position, self.oryzanol[i],
-                       '', self.cpu_temp[i],
-                       self.sensor_temp[i], self.packet_ids[i]]
+        times = datetime_as_string(self.time_series, unit='s')
+        for i in range(len(self)):
+            # make row to write, leave the AV blank if there is none
+            av = self.av[i]
+            if isnan(av):
+                av = ''
+            row = [times[i].replace("T", " "),
+                   position, self.oryzanol[i],
+                   av, self.cpu_temp[i],
+                   self.sensor_temp[i], self.packet_ids[i]]
             # print(f"row: {row}")
             csv_writer.writerow(row)
 
     def update_date(self, date):
         self.today = dt.datetime.today().date()
-        self.time_series = []
-        self.packet_ids = []
-        self.cpu_temp = []
-        self.sensor_temp = []
-        self.oryzanol = []
-        self.ory_rolling = []
-        self.av = []
-        self.av_rolling = []
+        self._data.clear()
+        self.packet_gaps.clear()
         self.ask_for_missing_packets = False
         self.last_packet_id = -1
         self.next_packet_to_get = 0
         self.lost_pkt_ptr = None  # use this to find missing pkts
 
+    @instrumentation.timed("add_data_pkt")
     def add_data_pkt(self, data_pkt, models):
+        """
+        Add a data packet to the columns, in packet id order.
+
+        Args:
+            data_pkt (sensor_packet.Packet, dict): packet to add, dicts are
+            converted to a Packet, with today's date if they only have a time
+            models (model.Models): models to score the raw data with, None
+            if the packet already has its model values
+
+        Returns:
+            sensor_packet.Packet: the packet added, None if it has no packet
+            id or the packet id was already received
+        """
         # print(f"add data pkt: {data_pkt}")
-        # print(f"cwd data_class: {os.getcwd()}")
+        if type(data_pkt) is dict and "packet_id" not in data_pkt:
+            return None  # no pkt id
+        data_pkt = sensor_packet.as_packet(data_pkt, self.today)
         insert_idx = self.check_pkt_id_get_insert_idx(data_pkt)
         # print(f"insert index: {insert_idx}")
         if insert_idx is None:
             return None  # no pkt id, or one already received
         # print(f"sort idx: {insert_idx}, len packet id: {len(self.packet_ids)}")
-        if "AV" in data_pkt :
-            # print(f"inserting AV: {data_pkt['AV']}")
-            self.av.insert(insert_idx, float(data_pkt["AV"]))
-
-            # print(f"adding av: {insert_idx}, {float(data_pkt['AV'])}, {self.av}")
-        elif self.use_av:
-            self.av.insert(insert_idx, nan)
-
-        if "device" in data_pkt:  # this is the code in the sensors still
-            position = data_pkt["device"].strip()
-        elif "position" in data_pkt:  # trying to move all code to here
-            position = data_pkt["position"]
-        else:
-            raise KeyError("data packet has to have 'position' or 'device' in it")
+        new_point = {}
+        if data_pkt.av is not None:
+            new_point["av"] = data_pkt.av
 
+        position = data_pkt.position
         device = global_params.POSITIONS[position]
         # print(f"device: {device}")
-        if USE_LOCAL_MODEL and ("Raw_data" in data_pkt):
-            raw_data = [float(x) for x in data_pkt["Raw_data"]]
-            ory_conc = models.fit(raw_data, device)
-            data_pkt["OryConc"] = ory_conc
+        if USE_LOCAL_MODEL and data_pkt.raw_data is not None and models is not None:
+            data_pkt.ory_conc = models.fit(data_pkt.raw_data, device)
             if position == "position 1":
                 print(f"making AV values, len av_values: {len(self.av)}, {len(self.time_series)}")
 
-                av_value = models.fit(raw_data, "AV")
-                data_pkt["AV"] = av_value
-                # print(insert_idx, av_value, device_data.av)
-                self.av.insert(insert_idx, av_value)
-                self.av_rolling = self.rolling_avg(self.av)
-
-        if "CPUTemp" in data_pkt:
-            temp = float(data_pkt["CPUTemp"])
-            self.cpu_temp.insert(insert_idx, temp)
-        else:
-            self.cpu_temp.insert(insert_idx, nan)
-        if "SensorTemp" in data_pkt:
-            sensor_temp = float(data_pkt["SensorTemp"])
-            self.sensor_temp.insert(insert_idx, sensor_temp)
-        else:
-            self.sensor_temp.insert(insert_idx, nan)
-
-        self.packet_ids.insert(insert_idx, int(data_pkt["packet_id"]))
-        # print(f"packet time: {data_pkt['time']}")
-        # print(f"packet: {data_pkt}")
-        if len(data_pkt["time"]) <= 8:
-            time = dt.datetime.strptime(data_pkt["time"], "%H:%M:%S").time()
-            time = dt.datetime.combine(self.today, time)
-        else:
-            time = data_pkt["time"]
-        self.time_series.insert(insert_idx, time)
-        self.oryzanol.insert(insert_idx, float(data_pkt["OryConc"]))
-        self.ory_rolling = self.rolling_avg(self.oryzanol)
+                av_value = models.fit(data_pkt.raw_data, "AV")
+                data_pkt.av = av_value
+                new_point["av"] = av_value
+
+        if data_pkt.cpu_temp is not None:
+            new_point["cpu_temp"] = data_pkt.cpu_temp
+        if data_pkt.sensor_temp is not None:
+            new_point["sensor_temp"] = data_pkt.sensor_temp
+
+        new_point["packet_ids"] = data_pkt.packet_id
+        new_point["time_series"] = data_pkt.time
+        new_point["oryzanol"] = float(data_pkt.ory_conc)
+        insert_idx = max(self._data.insert(insert_idx, new_point), 0)
+        self.packet_gaps.add(new_point["packet_ids"])
+        # only the rolling values with the new point in their window change
+        self._ory_stats.update(self.oryzanol, self.ory_rolling, insert_idx)
+        if self.use_av or "av" in new_point:
+            self._av_stats.update(self.av, self.av_rolling, insert_idx)
         return data_pkt
 
     def resize_data(self):
-        self.time_series = self.time_series[-MAX_DATA_PTS:]
-        self.packet_ids = self.packet_ids[-MAX_DATA_PTS:]
-        self.cpu_temp = self.cpu_temp[-MAX_DATA_PTS:]
-        self.sensor_temp = self.sensor_temp[-MAX_DATA_PTS:]
-        self.oryzanol = self.oryzanol[-MAX_DATA_PTS:]
-        self.ory_rolling = self.ory_rolling[-MAX_DATA_PTS:]
-        self.av = self.av[-MAX_DATA_PTS:]
-        self.av_rolling = self.av_rolling[-MAX_DATA_PTS:]
-
-    def check_pkt_id_get_insert_idx(self, data_pkt):
+        self._data.trim(MAX_DATA_PTS)
+
+    def check_pkt_id_get_insert_idx(self, data_pkt: sensor_packet.Packet):
         """ Check if the packet id is unique and
-        return the index to insert the data in the array if so """
+        return the index to insert the data in the array if so.
+        The packet_ids column is always sorted so it is its own index,
+        a binary search finds both the insert index and any duplicate """
         # print(f"check pkt: {data_pkt}")
-        if "packet_id" in data_pkt:
-            _pkt_id = int(data_pkt["packet_id"])
-            # print(f"got packet_id--: {_pkt_id}")
-        else:
-            # print(f"No packet id, abondoning data")
-            return None
-        _sort_idx = searchsorted(array(self.packet_ids), _pkt_id)
-        #         print(f"{_pkt_id in self.packet_ids}, pkt ids: {self.packet_ids}")
-        if _pkt_id in self.packet_ids:
+        _pkt_id = data_pkt.packet_id
+        _sort_idx, already_received = self._data.search_sorted("packet_ids", _pkt_id)
+        if already_received:
             # print(f"Already received pkt id: {_pkt_id}")
             return None  # this packet id is already present
         # print(f"sort idx: {_sort_idx}, len packet id: {len(self.packet_ids)}")
-        mode = None
-        if "mode" in data_pkt:
-            mode = data_pkt["mode"]
+        mode = data_pkt.mode
         #         print(f"ask for check: mode: {mode}, sort idx: {_sort_idx}, pkt: {_pkt_id}")
         if mode != "saved" and (_sort_idx < _pkt_id):
             self.ask_for_missing_packets = True
         return _sort_idx
 
     def rolling_avg(self, _list):
-        _rolling_avg = []
-        for i in range(1, len(_list) + 1):
-            if (i - self.rolling_samples) > 0:
-                avg = sum(_list[i - self.rolling_samples:i]) / rolling_samples
-            else:
-                avg = sum(_list[:i]) / i
-            _rolling_avg.append(avg)
-        return _rolling_avg
+        return rolling_stats.rolling_mean(_list, self.rolling_samples).tolist()
 
 
 class TimeStreamData:
@@ -479,6 +638,10 @@ class TimeStreamData:
         devices = DEVICES[:]  # copy to append to it
         devices.append("AV")
         self.models = model.Models(devices)
+        # scores the spectra of packets that come in together in batches, on
+        # the ingest thread, the backfill chunks of global_params.REMOTE_ASK_PKT_SIZE
+        # packets are too small for scoring.Scorer's worker processes to help
+        self.scorer = scoring.Scorer(self.models)
         # this is not pretty
         # TODO: remove dependance inject, this uses after and the info frame
         # Move afters to main, and import info frame directly
@@ -488,11 +651,28 @@ class TimeStreamData:
         # this is needed to make the datetime in the data
         self.today = dt.datetime.today().strftime("%Y-%m-%d")
         logging.debug(f"dt device data: {self.today}")
-        # message_id to prevent repeately asking for the same data
-        self.already_asked_for_data = False
+        # the connections hand the messages to this, and the data is
+        # changed on its worker thread once it is started
+        self.ingest = ingest.IngestPipeline(root_app)
+        # ask the sensors for missed packets a few at a time,
+        # its timeouts are checked on the ingest worker thread
+        self.backfill = backfill.BackfillScheduler(self.ingest, self.ask_for_stored_data)
         # make these in make_save_files() has to make these on new days also
         self.save_file = None
         self.save_raw_data_file = None
+        # write the data files from a background thread in batches
+        self.file_writer = file_thread.FileWriter(flush_interval=FILE_FLUSH_INTERVAL,
+                                                  flush_size=FILE_FLUSH_SIZE)
+        self.file_writer.start()
+        self.day_store = None  # type: day_store.DayStore
+        self.wal = None  # type: write_ahead_log.WriteAheadLog
+        # samples the cpu and RAM and logs the stage latencies, started by the main gui
+        self.reporter = instrumentation.Reporter(
+            sample_interval=METRICS_SAMPLE_INTERVAL, log_interval=METRICS_LOG_INTERVAL,
+            sources={"ingest": self.ingest.metrics,
+                     "file writer": self.file_writer.metrics,
+                     "backfill": self.backfill.metrics,
+                     "write ahead log": lambda: self.wal.metrics() if self.wal else {}})
         if not self.check_previous_data():
             print("No previous data so making file")
             self.make_save_files()
@@ -501,14 +681,29 @@ class TimeStreamData:
         today = dt.datetime.today().strftime("%Y-%m-%d")
         data_path = os.path.join(__location__, "data")
         self.save_file = os.path.join(data_path, f"{today}.csv")
+        if USE_DAY_STORE:
+            self.day_store = day_store.DayStore(data_path, today, self.file_writer)
+        if USE_WRITE_AHEAD_LOG:
+            self.make_log(data_path, today)
+            if os.path.isfile(self.wal.filename):
+                # the program stopped before the logged lines were compacted
+                print("replaying the write ahead log")
+                self.compact_log()
         if os.path.isfile(self.save_file):
             # file exists so load it
+            if self.day_store is not None and self.day_store.matches_csv(self.save_file):
+                # the binary files have the same data as the csv file
+                print("loading previous data from the binary day store")
+                self.load_day_store()
+                return True
             print("loading previous data")
             self.load_previous_data()
             # save the data after sorting
             print(self.positions)
             # print('device data 2:', self.positions["position 2"].oryzanol)
             self.save_summary_data()
+            if self.day_store is not None:  # make the binary files match the sorted csv file
+                self.day_store.rewrite_summary(self.summary_records())
             return True
         return False
 
@@ -524,36 +719,97 @@ class TimeStreamData:
                 print(f"Saving to factory dir: {self.save_file}")
         except Exception as e:
             print("no factory directory")
+        if USE_DAY_STORE:
+            self.day_store = day_store.DayStore(data_path, today, self.file_writer)
+            if not os.path.isfile(self.save_file):
+                # a new csv file, so any binary files left are not for it
+                self.day_store.clear()
+        if USE_WRITE_AHEAD_LOG:
+            self.make_log(data_path, today)
         self.make_file(self.save_file, FILE_HEADER)
         if LOG_RAW_DATA and not os.path.isfile(self.save_raw_data_file):
             self.make_file(self.save_raw_data_file, RAW_DATA_HEADERS)
 
     def load_previous_data(self):
+        """ Load the day's csv file, each column is parsed at once and each
+        position's data is assigned at once instead of adding a row at a time """
         # print(f"load file: {self.save_file}")
         with open(self.save_file) as csv_file:
             csv_reader = csv.reader(csv_file, delimiter=',')
-            line_count = 0
-            for row in csv_reader:
-                # print(f"line count: {line_count}, len row: {len(row)}")
-                if line_count != 0 and len(row) >= 7:
-                    # print(f"load row: {row}")
-                    self.add_csv_data(row)
-                line_count += 1
+            next(csv_reader, None)  # skip the header
+            rows = [row for row in csv_reader if len(row) >= 7]
+        date = dt.datetime.today().date()
+        for position, columns in convert_csv_rows_to_columns(rows, date).items():
+            if position not in self.positions:
+                self.add_device(position)
+            self.positions[position].set_data(columns)
+
+    def load_day_store(self):
+        """ Load the day's data from the binary day store, each position's
+        columns are assigned at once instead of a packet at a time """
+        records = self.day_store.summary()
+        for position, columns in day_store.records_to_columns(records).items():
+            if position not in POSITIONS:
+                logger.error(f"day store has data for position not in POSITIONS: {position}")
+                continue
+            if position not in self.positions:
+                self.add_device(position)
+            self.positions[position].set_data(columns)
+        del records  # close the memory map
+
+    def summary_records(self):
+        """ Get all the positions' data as day_store.SUMMARY_RECORD records """
+        return day_store.positions_to_records(
+            {position: {name: getattr(device_data, name)
+                        for name in day_store.SUMMARY_COLUMNS}
+             for position, device_data in self.positions.items()})
 
     def save_summary_data(self):
         # print(f"saving data: {self.positions}")
-        with open('sorted_file.csv', 'w', newline='') as csv_file:
+        # lines still in the writer would be lost when the file is replaced
+        self.file_writer.flush()
+        # write next to the day file and then replace it, so a crash
+        # while writing does not lose the day file
+        sorted_file = self.save_file + ".tmp"
+        with open(sorted_file, 'w', newline='') as csv_file:
             writer = csv.writer(csv_file, delimiter=",")
             # write header
             writer.writerow(FILE_HEADER)
             for position in self.positions:
                 # print(f"saving positions: {position}")
                 self.positions[position].save_summary_data(writer, position)
-        # os.replace("sorted_file.csv", self.save_file)
-        shutil.copyfile("sorted_file.csv", self.save_file)
+        os.replace(sorted_file, self.save_file)
+
+    def make_log(self, data_path, date):
+        """ Make the write ahead log for the day's summary file """
+        self.wal = write_ahead_log.WriteAheadLog(os.path.join(data_path, f"{date}.wal"),
+                                                 self.file_writer)
+
+    def compact_log(self, wal: write_ahead_log.WriteAheadLog = None, save_file: str = None):
+        """ Merge the lines in a write ahead log, today's by default, into
+        its sorted day file.  This rewrites the whole day file, so it is only
+        done on start up, on the file writer thread when a day is finished
+        and after the file writer is closed, never on the ingest thread.
+        If the day file can not be replaced, i.e. it is open on the factory
+        computer, the log is kept, the day file still has the lines. """
+        wal = wal or self.wal
+        save_file = save_file or self.save_file
+        if wal is None or save_file is None:
+            return
+        try:
+            metrics = wal.compact(save_file, FILE_HEADER)
+        except OSError as _error:
+            logging.error(f"Could not compact {wal.filename} into "
+                          f"{save_file}: {_error}")
+            return
+        logging.info(f"compacted {wal.filename} into {save_file}: {metrics}")
 
     def update_date(self, date):
-        self.make_save_files()
+        with self.ingest.lock:
+            if self.wal is not None:
+                # finish the old day's file after its queued lines are written
+                self.file_writer.call_after_writes(self.compact_log, self.wal, self.save_file)
+            self.make_save_files()
 
     def add_connection(self, conn):
         self.connection = conn
@@ -591,23 +847,85 @@ class TimeStreamData:
             device_data.add_data_pkt(data_pkt, self.models)
             # print(f"len: {len(device_data.time_series)}")
 
-    @Timer(name="add_data", text="Time: {:.4f}", logger=logging.debug)
-    def add_data(self, data_pkt: dict, save_data_pkt=True):
+    def add_data_batch(self, data_pkts: list, save_data_pkt=True):
+        """
+        Add many data packets at once, like the saved packets a sensor sends.
+        The spectra are all scored together by the scorer first, then the
+        packets are added in packet id order.
+
+        Args:
+            data_pkts (list): data packets to add
+            save_data_pkt (bool): if the packets should be saved to the files
+        """
+        packets = []
+        for data_pkt in data_pkts:
+            try:
+                packets.append(self.make_packet(data_pkt))
+            except (KeyError, TypeError, ValueError) as _error:
+                logging.error(f"Error: {_error}\nconverting packet {data_pkt}")
+        scored = False
+        if USE_LOCAL_MODEL:
+            try:
+                self.scorer.score_packets(packets)
+                scored = True
+            except Exception as _error:  # fall back to scoring each packet
+                logging.error(f"Error scoring batch of {len(packets)} packets: {_error}")
+        packets.sort(key=lambda data_pkt: data_pkt.packet_id)
+        for data_pkt in packets:
+            try:
+                self.add_data(data_pkt, save_data_pkt, scored=scored)
+            except Exception as _error:
+                print(f"error processing packet: {data_pkt}")
+                logging.error(f"Error: {_error}\nprocessing packet {data_pkt}")
+
+    @staticmethod
+    def make_packet(data_pkt) -> sensor_packet.Packet:
+        """
+        Get a data packet as a Packet, the dict packets from the
+        database or the tests are converted here, the connections
+        already send Packets.
+
+        Args:
+            data_pkt (sensor_packet.Packet, dict): data packet
+
+        Returns:
+            sensor_packet.Packet: the data packet
+
+        Raises:
+            KeyError, TypeError, ValueError: if a dict packet can not be converted
+        """
+        if type(data_pkt) is dict:
+            # if data is from a database, it has to be converted first
+            data_pkt = helper_functions.check_database_info(data_pkt)
+        return sensor_packet.as_packet(data_pkt)
+
+    @instrumentation.timed("add_data")
+    def add_data(self, data_pkt, save_data_pkt=True, scored=False):
+        """
+        Add a data packet from a sensor, save it and update the display.
+
+        Args:
+            data_pkt (sensor_packet.Packet, dict): data packet to add
+            save_data_pkt (bool): if the packet should be saved to the files
+            scored (bool): if the packet already has its model values
+
+        Returns:
+            int: 0 if the packet was added, else an error code
+        """
         # TODO: fix this, its a mess
-        # print(f"data_pkt: {data_pkt}")
-        # print(f"dt3: {dt.datetime.now()}")
-        logger.info(f"adding data packet: {data_pkt}")
-        if type(data_pkt) is not dict:
+        if type(data_pkt) is dict:
+            if "device" not in data_pkt and "position" not in data_pkt:
+                print("No 'device' or 'position' in data_pkt")
+                return 200
+            try:
+                data_pkt = self.make_packet(data_pkt)
+            except (KeyError, TypeError, ValueError) as _error:
+                logging.error(f"Error: {_error}\nconverting packet {data_pkt}")
+                return 200
+        elif not isinstance(data_pkt, sensor_packet.Packet):
             return 204  # TODO: sometimes an int gets in here.  look at sensor code to fix
-        # if data is from a database, it has to be converted first
-        data_pkt = helper_functions.check_database_info(data_pkt)
-        if "device" in data_pkt:
-            position = data_pkt["device"].strip()
-        elif "position" in data_pkt:
-            position = data_pkt["position"].strip()
-        else:
-            print("No 'device' or 'position' in data_pkt")
-            return 200
+        logger.info(f"adding data packet: {data_pkt}")
+        position = data_pkt.position
         if position not in self.positions:
             print(f"adding device2: {position}")
             self.add_device(position)
@@ -615,122 +933,140 @@ class TimeStreamData:
         device_data = self.positions[position]  # type: DeviceData
 
         # check if date has changed
-        packet_date = data_pkt["date"]
-        packet_datetime = dt.datetime.strptime(packet_date, "%Y-%m-%d").date()
+        packet_date = data_pkt.date
         current_date = device_data.today
         # print(f"dt4: {current_date}")
-        if packet_date != str(current_date):
+        if packet_date != current_date:
             print(f"This is a different day. Today {current_date}, packet date {packet_date}")
             # test if date advanced at midnight and files need to update
-            if packet_datetime == device_data.today + dt.timedelta(days=1):
+            if packet_date == device_data.today + dt.timedelta(days=1):
                 # TODO: check the date is really changed
                 self.update_date(None)  # make the new file
                 device_data.update_date(None)  # tell device_data to update
-            # elif packet_datetime == device_data.today - timedelta(days=1):
+                self.backfill.clear(position)  # the packet ids start over
+            # elif packet_date == device_data.today - timedelta(days=1):
             else:
                 # old data was received, just ignore it rather than figure out if its needed
                 # print(f"packet data: {packet_date}, current date: {current_date}")
                 return 201  # testing unit code
         # add the date to the individual sensor data class
-        data_pkt = device_data.add_data_pkt(data_pkt, self.models)
+        # packets scored with their batch already have the model values
+        data_pkt = device_data.add_data_pkt(data_pkt, None if scored else self.models)
         # device_data.resize_data()
         if not data_pkt:
             return 222
-        # print(f"ask 2: {self.already_asked_for_data}")
-        # print(f"ask 2b: {device_data.ask_for_missing_packets}")
-        if data_pkt and device_data.ask_for_missing_packets and \
-                not self.already_asked_for_data:  # this is not data loaded from file
-            # or the sensor is not currently sending saved data
-            self.already_asked_for_data = True
-            self.root_app.after(5*60000, self.clear_ask_for_data_flag)
-            missing_pkt = self.find_next_missing_pkts(device_data, int(data_pkt["packet_id"]))
-            logging.debug(f"ask for packets: {missing_pkt} from position: {position}")
-            if self.connection:  # for testing or offline
-                self.connection.ask_for_stored_data(position, missing_pkt)
-                device_data.ask_for_missing_packets = False
-
-        if "Raw_data" in data_pkt and save_data_pkt:
-            self.master_graph.update_spectrum(data_pkt["Raw_data"], position)
+        # finishes the backfill chunk this packet was asked for in, if any
+        self.backfill.packet_received(position, data_pkt.packet_id)
+        if device_data.ask_for_missing_packets:  # a live packet showed a gap
+            missing_ranges = self.find_next_missing_pkts(device_data, data_pkt.packet_id)
+            logging.debug(f"ask for packets: {missing_ranges} from position: {position}")
+            # chunks already asked for are kept, so this can be called for every packet
+            self.backfill.request(position, missing_ranges)
+            device_data.ask_for_missing_packets = False
+
+        # the widgets can only be changed from the Tk thread
+        if data_pkt.raw_data is not None and save_data_pkt:
+            self.ingest.call_in_ui(self.master_graph.update_spectrum,
+                                   data_pkt.raw_data, position)
         if not self.update_after:
-            self.update_after = self.root_app.after(500, lambda: self.update_graph(position))
+            self.update_after = True  # until the Tk thread schedules the update
+            self.ingest.call_in_ui(self.schedule_graph_update, position)
 
         if save_data_pkt:  # this is live data
             # TODO: update the ory conc value in this
             # print(f"saving data: {data_pkt['packet_id']}")
             self.save_data(data_pkt)
-            self.root_app.info.check_in(position)
+            self.ingest.call_in_ui(self.root_app.info.check_in, position)
             # only update the info frame if the is newer data than
             # the data saved
-            self.root_app.info.update_current_info(data_pkt, position)
-        if logger.isEnabledFor(logging.INFO):  # only get statitics if log is set high enough
-            log_cpu_ram_usage()
+            self.ingest.call_in_ui(self.root_app.info.update_current_info,
+                                   data_pkt, position)
+        instrumentation.count("packets added")
         return 0
 
     def update_rolling_samples(self, n_samples):
         try:
-            self.rolling_samples = int(n_samples)
-        except TypeError:  # just pass if something weird was passed in
+            n_samples = int(n_samples)
+        except (TypeError, ValueError):  # just pass if something weird was passed in
             return
-        for device in self.positions:
-            device_data = self.positions[device]
-            new_rolling_data = self.rolling_avg(device_data.oryzanol)
-            self.master_graph.update_roll(device, new_rolling_data)
+        with self.ingest.lock:  # called from the Tk thread
+            for position, device_data in self.positions.items():
+                device_data.rolling_samples = n_samples
+                self.master_graph.update_notebook(position, device_data)
+
+    def schedule_graph_update(self, position):
+        """ Update the graph after a short wait, so the graph is updated once
+        when a lot of data comes in at once, called on the Tk thread """
+        self.update_after = self.root_app.after(500, lambda: self.update_graph(position))
 
     def update_graph(self, position):
         print(f"Updating graph for position: {position}")
-        device_data = self.positions[position]  # type: DeviceData
-        self.master_graph.update_notebook(position, device_data)
-        self.update_after = None
+        with self.ingest.lock, instrumentation.stage("graph update"):  # run from a Tk after call
+            device_data = self.positions[position]  # type: DeviceData
+            self.master_graph.update_notebook(position, device_data)
+            self.update_after = None
+
+    @staticmethod
+    def find_next_missing_pkts(device_data, last_pkt_id):
+        """
+        Get the packets before last_pkt_id that have not been received.
 
-    def find_next_missing_pkts(self, device_data, last_pkt_id):
-        missing_pkts = []
-        for i in range(last_pkt_id):
-            if i not in device_data.packet_ids:
-                missing_pkts.append(i)
-        return missing_pkts
+        Args:
+            device_data (DeviceData): data of the position to check
+            last_pkt_id (int): id of the newest packet from the sensor
+
+        Returns:
+            list: [start, end] ranges of the missing packet ids, inclusive
+        """
+        return device_data.packet_gaps.missing(last_pkt_id)
 
-    def save_data(self, data_pkt):
+    @instrumentation.timed("save_data")
+    def save_data(self, data_pkt: sensor_packet.Packet):
         # make a string of the data and write it
-        data_list = []
-
-        date = dt.datetime.strptime(data_pkt["date"], "%Y-%m-%d")
-        time = dt.datetime.strptime(data_pkt["time"], "%H:%M:%S").time()
-
-        data_pkt["time"] = dt.datetime.combine(date, time)
-        for item in FILE_HEADER_TO_SAVE:
-            if item in data_pkt:
-                if type(data_pkt[item]) is float:
-                    data_list.append(f"{data_pkt[item]:.1f}")
-                else:
-                    data_list.append(f"{data_pkt[item]}")
-            else:
-                data_list.append("")
+        data_list = data_pkt.csv_values()
         data_list.append('\n')
-        # now write a row to the file
-        try:
-            with open(self.save_file, 'a', encoding="utf8") as _file:
-                _file.write(', '.join(data_list))
-        except Exception as _error:
-            # do something here to save the list and write later
-            print(f"Error in saving data: {_error}")
-        if LOG_RAW_DATA:
-            data_list2 = []
-            for item in RAW_DATA_HEADERS[:3]:
-                # print(f"add item: {item}")
-                if item in data_pkt:
-                    data_list2.append(str(data_pkt[item]))
-                else:  # make a blank entry
-                    data_list2.append(", ")
-            if "Raw_data" in data_pkt:
-                data_list2.extend([str(i) for i in data_pkt["Raw_data"]])
-                with open(self.save_raw_data_file, 'a', encoding="utf8") as _file:
-                    _file.write(', '.join(data_list2))
-                    if "\n" not in data_list2[-1]:
-                        _file.write("\n")
-
-    def clear_ask_for_data_flag(self):
-        self.already_asked_for_data = False
-        print(f"cleared asked for data: {self.already_asked_for_data}")
+        line = ", ".join(data_list)
+        # now queue a row to be written to the file
+        self.file_writer.write_line_to_file(self.save_file, line)
+        if self.wal is not None:
+            self.wal.append(line)
+        if self.day_store is not None:
+            self.day_store.append(data_pkt, save_raw=LOG_RAW_DATA)
+        if LOG_RAW_DATA and self.save_raw_data_file and data_pkt.raw_data is not None:
+            data_list2 = [str(data_pkt.time), data_pkt.position, str(data_pkt.packet_id)]
+            data_list2.extend([str(i) for i in data_pkt.raw_data])
+            self.file_writer.write_line_to_file(self.save_raw_data_file,
+                                                data_list2)
+
+    def flush_files(self):
+        """ Wait for the queued data to be written to the save files """
+        self.file_writer.flush()
+
+    def close(self):
+        """ Finish the messages already received, write any queued data,
+        fsync the save files and stop the worker and writer threads """
+        self.ingest.close()
+        self.scorer.close()
+        self.file_writer.close()
+        if self.wal is not None:
+            self.compact_log()
+        self.reporter.close()  # logs the last metrics of each part
+
+    def ask_for_stored_data(self, position, pkt_ranges) -> bool:
+        """
+        Send a backfill request to a sensor, if there is a connection.
+
+        Args:
+            position (str): position name, ie "position 2"
+            pkt_ranges (list): [start, end] ranges of the packets to send
+
+        Returns:
+            bool: False if there is no connection to send the request on
+        """
+        if not self.connection:  # for testing or offline
+            return False
+        self.connection.ask_for_stored_data(position, pkt_ranges)
+        return True
 
     def update_latest_packet_id(self, device, pkt_num):
         # this is the first method to see the device so add it to devices
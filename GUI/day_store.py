@@ -0,0 +1,260 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Binary store of a day of sensor data, kept alongside the csv files.
+
+Each packet is appended to the day's file as one fixed-width numpy record
+(SUMMARY_RECORD), and each raw spectrum as a RAW_RECORD with the 301
+wavelengths as float32, so the files are just arrays of records and can
+be opened with np.memmap.  Reloading a day is then a memory map and a
+few column copies instead of parsing every line of the csv file, which
+is kept for the factory to use.
+
+If the program stops while a record is being written the last partial
+record is ignored when the file is read, and cut off when the day's
+store is opened again.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+from typing import Union
+
+# installed libraries
+import numpy as np
+
+# local files
+import sensor_packet
+
+N_WAVELENGTHS = 301  # 1350 nm to 1650 nm
+SUMMARY_RECORD = np.dtype([("time", "datetime64[s]"),
+                           ("position", "S16"),
+                           ("packet_id", np.int32),
+                           ("oryzanol", np.float32),
+                           ("av", np.float32),
+                           ("cpu_temp", np.float32),
+                           ("sensor_temp", np.float32)])
+RAW_RECORD = np.dtype([("time", "datetime64[s]"),
+                       ("position", "S16"),
+                       ("packet_id", np.int32),
+                       ("spectrum", np.float32, (N_WAVELENGTHS,))])
+# Packet attribute for each summary record field
+PACKET_ATTRIBUTES = {"oryzanol": "ory_conc", "av": "av",
+                     "cpu_temp": "cpu_temp", "sensor_temp": "sensor_temp"}
+# DeviceData column for each summary record field
+SUMMARY_COLUMNS = {"time_series": "time", "packet_ids": "packet_id",
+                   "oryzanol": "oryzanol", "av": "av",
+                   "cpu_temp": "cpu_temp", "sensor_temp": "sensor_temp"}
+
+
+def make_summary_record(data_pkt: Union[sensor_packet.Packet, dict]) -> np.ndarray:
+    """
+    Make the summary record for a data packet, missing values are NaN.
+
+    Args:
+        data_pkt (sensor_packet.Packet, dict): data packet, a dict needs a
+        full datetime as the "time"
+
+    Returns:
+        np.ndarray: array of 1 SUMMARY_RECORD
+    """
+    data_pkt = sensor_packet.as_packet(data_pkt)
+    record = np.zeros(1, dtype=SUMMARY_RECORD)
+    record["time"] = np.datetime64(data_pkt.time, 's')
+    record["position"] = data_pkt.position
+    record["packet_id"] = data_pkt.packet_id
+    for field, attribute in PACKET_ATTRIBUTES.items():
+        value = getattr(data_pkt, attribute)
+        record[field] = np.nan if value is None else value
+    return record
+
+
+def make_raw_record(data_pkt: Union[sensor_packet.Packet, dict]) -> np.ndarray:
+    """
+    Make the raw data record for a data packet with a raw data spectrum.
+
+    Args:
+        data_pkt (sensor_packet.Packet, dict): data packet, a dict needs a
+        full datetime as the "time"
+
+    Returns:
+        np.ndarray: array of 1 RAW_RECORD
+    """
+    data_pkt = sensor_packet.as_packet(data_pkt)
+    record = np.zeros(1, dtype=RAW_RECORD)
+    record["time"] = np.datetime64(data_pkt.time, 's')
+    record["position"] = data_pkt.position
+    record["packet_id"] = data_pkt.packet_id
+    record["spectrum"] = data_pkt.raw_data
+    return record
+
+
+def read_records(filename: str, dtype: np.dtype) -> np.ndarray:
+    """
+    Memory map a file of fixed-width records, read only.
+
+    Args:
+        filename (str): file to open
+        dtype (np.dtype): record type of the file
+
+    Returns:
+        np.ndarray: memory mapped records, an empty array if the file
+        is missing or has no full record
+    """
+    if not os.path.isfile(filename):
+        return np.empty(0, dtype=dtype)
+    n_records = os.path.getsize(filename) // dtype.itemsize
+    if n_records == 0:  # np.memmap can not map an empty file
+        return np.empty(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r', shape=(n_records,))
+
+
+def _drop_partial_record(filename: str, dtype: np.dtype):
+    """ Cut off the end of a file that is not a full record,
+    left if the program stopped in the middle of writing it """
+    if os.path.isfile(filename):
+        extra_bytes = os.path.getsize(filename) % dtype.itemsize
+        if extra_bytes:
+            os.truncate(filename, os.path.getsize(filename) - extra_bytes)
+
+
+class DayStore:
+    """
+    Binary summary and raw data files for one day.
+
+    Attributes:
+        summary_file (str): path of the summary records file
+        raw_file (str): path of the raw spectrum records file
+        file_writer (file_thread.FileWriter): thread to append the records
+        with, if None the records are written directly
+    """
+    def __init__(self, folder: str, date: str, file_writer=None):
+        """
+        Args:
+            folder (str): folder to keep the files in
+            date (str): day of the data, in "%Y-%m-%d" format
+            file_writer (file_thread.FileWriter, optional): background
+            writer to queue the appends on
+        """
+        self.summary_file = os.path.join(folder, f"{date}_summary.bin")
+        self.raw_file = os.path.join(folder, f"{date}_raw_data.bin")
+        self.file_writer = file_writer
+        # new records have to start on a record boundary
+        _drop_partial_record(self.summary_file, SUMMARY_RECORD)
+        _drop_partial_record(self.raw_file, RAW_RECORD)
+
+    def append(self, data_pkt: Union[sensor_packet.Packet, dict], save_raw: bool = True):
+        """
+        Append the summary record of a data packet, and the raw record if
+        the packet has a raw data spectrum.
+
+        Args:
+            data_pkt (sensor_packet.Packet, dict): data packet, a dict needs
+            a full datetime as the "time"
+            save_raw (bool): if the raw spectrum should be saved also
+        """
+        data_pkt = sensor_packet.as_packet(data_pkt)
+        self._append(self.summary_file, make_summary_record(data_pkt))
+        if save_raw and data_pkt.raw_data is not None:
+            self._append(self.raw_file, make_raw_record(data_pkt))
+
+    def summary(self) -> np.ndarray:
+        """ Get the day's summary records as a read only memory map """
+        return read_records(self.summary_file, SUMMARY_RECORD)
+
+    def raw(self) -> np.ndarray:
+        """ Get the day's raw spectrum records as a read only memory map,
+        raw()["spectrum"] is the (N, 301) float32 matrix of spectra """
+        return read_records(self.raw_file, RAW_RECORD)
+
+    def __len__(self):
+        """ Number of full summary records saved """
+        if not os.path.isfile(self.summary_file):
+            return 0
+        return os.path.getsize(self.summary_file) // SUMMARY_RECORD.itemsize
+
+    def rewrite_summary(self, records: np.ndarray):
+        """
+        Replace the summary file with records, used after the day was
+        loaded from the csv file so both files hold the same data.
+
+        Args:
+            records (np.ndarray): SUMMARY_RECORD array to save
+        """
+        if self.file_writer:  # don't let queued appends land after the rewrite
+            self.file_writer.flush()
+        with open(self.summary_file, 'wb') as _file:
+            _file.write(np.ascontiguousarray(records, dtype=SUMMARY_RECORD).tobytes())
+
+    def clear(self):
+        """ Remove the day's files, for when the day's csv file is started new """
+        if self.file_writer:
+            self.file_writer.flush()
+        for filename in [self.summary_file, self.raw_file]:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def matches_csv(self, csv_file: str) -> bool:
+        """
+        Check if the summary file has a record for every data row of the
+        csv file, counting the lines is much faster than parsing them.
+        If the csv file was edited or the binary store was turned on
+        during the day they will not match and the csv file has to be used.
+
+        Args:
+            csv_file (str): the day's csv file, with 1 header line
+
+        Returns:
+            bool: True if the summary file can be loaded instead of the csv file
+        """
+        with open(csv_file, 'rb') as _file:
+            n_rows = _file.read().count(b"\n") - 1
+        return 0 < n_rows == len(self)
+
+    def _append(self, filename: str, record: np.ndarray):
+        if self.file_writer:
+            self.file_writer.write_bytes_to_file(filename, record.tobytes())
+        else:
+            with open(filename, 'ab') as _file:
+                _file.write(record.tobytes())
+
+
+def records_to_columns(records: np.ndarray) -> dict:
+    """
+    Split summary records into the DeviceData columns for each position.
+
+    Args:
+        records (np.ndarray): SUMMARY_RECORD array
+
+    Returns:
+        dict: position name to a dict of DeviceData column name to array
+    """
+    positions = {}
+    for position in np.unique(records["position"]):
+        position_records = records[records["position"] == position]
+        positions[position.decode()] = {
+            column: np.array(position_records[field])
+            for column, field in SUMMARY_COLUMNS.items()}
+    return positions
+
+
+def positions_to_records(positions: dict) -> np.ndarray:
+    """
+    Make summary records from the DeviceData columns of each position.
+
+    Args:
+        positions (dict): position name to a dict of DeviceData column
+        name to array, like records_to_columns makes
+
+    Returns:
+        np.ndarray: SUMMARY_RECORD array
+    """
+    all_records = [np.empty(0, dtype=SUMMARY_RECORD)]
+    for position, columns in positions.items():
+        records = np.zeros(len(columns["packet_ids"]), dtype=SUMMARY_RECORD)
+        records["position"] = position
+        for column, field in SUMMARY_COLUMNS.items():
+            records[field] = columns[column]
+        all_records.append(records)
+    return np.concatenate(all_records)
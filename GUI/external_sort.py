@@ -0,0 +1,184 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Sort the saved csv files by position and packet id, and remove the
+duplicate packets, without reading the whole file into memory.
+
+The lines of the file are read in runs of about run_bytes, each run is
+sorted in memory and written to a temporary file, and then the runs
+are merged with heapq.merge, which only keeps 1 line of each run in
+memory.  If there are more than max_merge_files runs they are merged
+in groups first.  The lines are copied as they are, only their keys
+are parsed, so the values are never reformatted.
+
+When a (position, packet id) is in the file more than once, the first
+line in the file is kept.  Lines that are cut off or do not have a
+position and packet id are dropped.  The sorted file is written next
+to the original and then replaces it, so the original is left as it
+was if anything goes wrong.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import heapq
+from itertools import groupby
+from operator import itemgetter
+import os
+import tempfile
+from typing import Callable, Iterator, List, Tuple
+
+RUN_BYTES = 32 * 2 ** 20  # bytes of lines sorted in memory at once
+MAX_MERGE_FILES = 64  # runs merged at once, more are merged in groups first
+POSITION_COLUMN = 1
+PACKET_ID_HEADER = "packet_id"
+
+
+def sort_csv_file(filename: str, n_columns: int = 0,
+                  packet_id_column: int = None,
+                  position_column: int = POSITION_COLUMN,
+                  run_bytes: int = RUN_BYTES,
+                  max_merge_files: int = MAX_MERGE_FILES) -> dict:
+    """
+    Sort a csv file with 1 header line by position and packet id and
+    remove the duplicate packets.
+
+    Args:
+        filename (str): csv file to sort in place
+        n_columns (int): lines with fewer columns than this are dropped
+        packet_id_column (int): column of the packet ids, None to find
+        the "packet_id" column in the header
+        position_column (int): column of the position names
+        run_bytes (int): about how many bytes of lines to sort in memory
+        max_merge_files (int): most temporary files to merge at once
+
+    Returns:
+        dict: number of rows written, duplicate rows removed, rows dropped
+        and runs sorted
+
+    Test
+    -------------
+    >>> with open("unsorted.csv", "w") as _file:
+    ...     _ = _file.write("time, position, packet_id\\n"
+    ...                     "00:00:02, position 2, 2\\n00:00:01, position 2, 1\\n"
+    ...                     "00:00:03, position 1, 5\\n00:00:02, position 2, 2\\n")
+    >>> sort_csv_file("unsorted.csv", n_columns=3)
+    {'rows': 3, 'duplicates': 1, 'dropped': 0, 'runs': 1}
+    >>> print(open("unsorted.csv").read(), end="")
+    time, position, packet_id
+    00:00:03, position 1, 5
+    00:00:01, position 2, 1
+    00:00:02, position 2, 2
+    >>> os.remove("unsorted.csv")
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    metrics = {"rows": 0, "duplicates": 0, "dropped": 0, "runs": 0}
+    with open(filename, 'r', newline='') as _file, \
+            tempfile.TemporaryDirectory(dir=folder) as temp_folder:
+        header = _file.readline()
+        if packet_id_column is None:
+            packet_id_column = _find_column(header, PACKET_ID_HEADER)
+        key = _key_function(position_column, packet_id_column)
+        runs = []
+        for keyed_lines in _read_runs(_file, key, run_bytes, n_columns, metrics):
+            keyed_lines.sort(key=itemgetter(0))  # stable, so the first duplicate stays first
+            runs.append(_write_run(temp_folder, [line for _, line in keyed_lines]))
+        metrics["runs"] = len(runs)
+        # merge in groups until the rest can be merged at once,
+        # the groups keep the runs in order so the merge stays stable
+        while len(runs) > max(max_merge_files, 2):
+            runs = [_merge_runs(temp_folder, runs[i:i + max_merge_files], key, metrics)
+                    for i in range(0, len(runs), max_merge_files)]
+        tmp_filename = filename + ".tmp"
+        try:
+            with open(tmp_filename, 'w', newline='') as sorted_file:
+                sorted_file.write(_end_line(header))
+                metrics["rows"] = _merge(runs, sorted_file, key, metrics)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+    os.replace(tmp_filename, filename)
+    return metrics
+
+
+def _find_column(header: str, name: str) -> int:
+    columns = [column.strip() for column in header.split(",")]
+    if name not in columns:
+        raise ValueError(f"No {name} column in the header: {header.strip()}")
+    return columns.index(name)
+
+
+def _key_function(position_column: int,
+                  packet_id_column: int) -> Callable[[str], Tuple[str, int]]:
+    n_splits = max(position_column, packet_id_column) + 1
+
+    def key(line: str) -> Tuple[str, int]:
+        fields = line.split(",", n_splits)
+        return fields[position_column].strip(), int(fields[packet_id_column])
+    return key
+
+
+def _read_runs(_file, key: Callable, run_bytes: int, n_columns: int,
+               metrics: dict) -> Iterator[List[Tuple[Tuple[str, int], str]]]:
+    """ Read the complete lines of the file with their keys, about
+    run_bytes of lines at a time """
+    lines = []
+    n_bytes = 0
+    for line in _file:
+        if not line.strip():
+            continue
+        if line.count(",") < n_columns - 1:
+            metrics["dropped"] += 1  # cut off line
+            continue
+        try:
+            lines.append((key(line), _end_line(line)))
+        except (ValueError, IndexError):
+            metrics["dropped"] += 1  # no position or packet id
+            continue
+        n_bytes += len(line)
+        if n_bytes >= run_bytes:
+            yield lines
+            lines = []
+            n_bytes = 0
+    if lines:
+        yield lines
+
+
+def _write_run(temp_folder: str, lines: List[str]) -> str:
+    with tempfile.NamedTemporaryFile('w', dir=temp_folder, suffix=".run",
+                                     newline='', delete=False) as run_file:
+        run_file.writelines(lines)
+    return run_file.name
+
+
+def _merge_runs(temp_folder: str, runs: List[str], key: Callable,
+                metrics: dict) -> str:
+    with tempfile.NamedTemporaryFile('w', dir=temp_folder, suffix=".run",
+                                     newline='', delete=False) as run_file:
+        _merge(runs, run_file, key, metrics)
+    for run in runs:
+        os.remove(run)
+    return run_file.name
+
+
+def _merge(runs: List[str], out_file, key: Callable, metrics: dict) -> int:
+    """ Merge the sorted run files into out_file, keeping the first line
+    of each key, and return the number of lines written """
+    run_files = [open(run, 'r', newline='') for run in runs]
+    n_lines = 0
+    try:
+        keyed_lines = heapq.merge(*[((key(line), line) for line in run_file)
+                                    for run_file in run_files],
+                                  key=lambda keyed_line: keyed_line[0])
+        for _, group in groupby(keyed_lines, key=lambda keyed_line: keyed_line[0]):
+            out_file.write(next(group)[1])
+            n_lines += 1
+            metrics["duplicates"] += sum(1 for _ in group)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+    return n_lines
+
+
+def _end_line(line: str) -> str:
+    return line if line.endswith("\n") else line + "\n"
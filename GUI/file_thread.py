@@ -0,0 +1,314 @@
+# Copyright (c) 2019 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Class to write lines, or binary records, to files from a background thread.
+
+The GUI thread puts lines on a bounded queue and the writer thread
+collects them and writes them in batches with writelines, so each file
+is opened once per batch instead of once per line.  A batch is written
+when flush_size lines are waiting or flush_interval seconds have passed
+since the last write.  If the queue is full, write_line_to_file blocks
+until the writer catches up (back-pressure), and how often and how long
+that happens is kept in the metrics.
+
+If a file can not be written its lines are kept and tried again after
+retry_interval seconds, doubled after each failure, and only the newest
+max_retry_lines of them are kept, the older ones are dropped and counted
+in the metrics.
+
+call_after_writes runs a function on the writer thread after the lines
+queued before it are written, for slow work on the files, like merging a
+finished day's file, that should not block the thread that queues lines.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+
+# standard libraries
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Union
+
+FLUSH_INTERVAL = 1.0  # seconds
+FLUSH_SIZE = 100  # lines
+MAX_QUEUE_SIZE = 10000  # lines
+MAX_RETRY_LINES = 10000  # lines kept for each file that could not be written
+RETRY_INTERVAL = 5.0  # seconds before trying a file that failed again
+MAX_RETRY_INTERVAL = 120.0  # seconds, the retry interval doubles up to this
+# control messages put on the queue in place of a filename
+_FLUSH = object()
+_CALL = object()
+_STOP = object()
+
+
+class FileWriter(threading.Thread):
+    """
+    Background thread that appends lines to files in batches.
+
+    Attributes:
+        flush_interval (float): maximum number of seconds a line waits to be written
+        flush_size (int): number of waiting lines that start a write
+        write_queue (queue.Queue): lines waiting for the writer thread
+    """
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL,
+                 flush_size: int = FLUSH_SIZE,
+                 max_queue_size: int = MAX_QUEUE_SIZE,
+                 encoding: str = "utf8",
+                 max_retry_lines: int = MAX_RETRY_LINES,
+                 retry_interval: float = RETRY_INTERVAL):
+        """
+        Args:
+            flush_interval (float): seconds between writes when lines are waiting
+            flush_size (int): write as soon as this many lines are waiting
+            max_queue_size (int): number of lines the queue holds before
+            write_line_to_file blocks
+            encoding (str): encoding to write the files in
+            max_retry_lines (int): lines kept for a file that could not be
+            written, older lines are dropped
+            retry_interval (float): seconds to wait before trying to write
+            a file that failed again
+        """
+        threading.Thread.__init__(self, name="FileWriter", daemon=True)
+        self.flush_interval = flush_interval
+        self.flush_size = max(int(flush_size), 1)
+        self.encoding = encoding
+        self.max_retry_lines = max(int(max_retry_lines), 1)
+        self.retry_interval = retry_interval
+        self.write_queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()  # protects the metrics
+        self._pending = {}  # type: Dict[str, List[Union[str, bytes]]]
+        self._fsync_files = set()  # files to fsync after every batch
+        self._unsynced = set()  # files written since they were last fsynced
+        self._failed = {}  # type: Dict[str, List[Union[str, bytes]]]
+        self._retry_at = {}  # type: Dict[str, tuple]  # (monotonic time, interval)
+        self._n_pending = 0
+        self._n_failed = 0
+        self._last_write = time.monotonic()
+        self._metrics = {"lines queued": 0, "lines written": 0,
+                         "batches written": 0, "write errors": 0,
+                         "lines dropped": 0,
+                         "blocked puts": 0, "blocked seconds": 0.0,
+                         "max queue size": 0, "fsyncs": 0}
+
+    def write_line_to_file(self, filename: str, data: Union[str, list]):
+        """
+        Put a line on the queue to be appended to filename.  If the queue
+        is full this blocks until the writer thread makes room.
+
+        Args:
+            filename (str): path of the file to append the line to
+            data (str, list): line to write, a list is joined with ", "
+            and a newline is added if the line does not end with one
+
+        Raises:
+            TypeError: if data is not a list or string
+        """
+        if type(data) is list:
+            data = ", ".join(data)
+        elif type(data) is not str:
+            raise TypeError("data must list or string")
+        if not data.endswith("\n"):
+            data += "\n"
+        self._put(filename, data)
+
+    def write_bytes_to_file(self, filename: str, data: bytes, fsync: bool = False):
+        """
+        Put binary data on the queue to be appended to filename, the same
+        as write_line_to_file but the data is written as is.
+
+        Args:
+            filename (str): path of the file to append the data to
+            data (bytes): data to write
+            fsync (bool): force filename to disk after each batch is written
+            to it, so all the data of a batch is committed with 1 fsync
+        """
+        if fsync:
+            self._fsync_files.add(filename)
+        self._put(filename, bytes(data))
+
+    def _put(self, filename: str, data: Union[str, bytes]):
+        """ Queue data for filename, blocking if the queue is full """
+        try:
+            self.write_queue.put_nowait((filename, data))
+        except queue.Full:
+            start = time.perf_counter()
+            self.write_queue.put((filename, data))
+            blocked_time = time.perf_counter() - start
+            logging.warning(f"File writer queue full, blocked for {blocked_time:.3f} sec")
+            with self.lock:
+                self._metrics["blocked puts"] += 1
+                self._metrics["blocked seconds"] += blocked_time
+        with self.lock:
+            self._metrics["lines queued"] += 1
+            self._metrics["max queue size"] = max(self._metrics["max queue size"],
+                                                  self.write_queue.qsize())
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every line queued before this call is written.
+
+        Args:
+            timeout (float): maximum seconds to wait, None to wait until done
+
+        Returns:
+            bool: True if the lines were written before the timeout
+        """
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self.write_queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def call_after_writes(self, func: Callable, *args):
+        """
+        Run func on the writer thread after every line queued before this
+        call is written, without waiting for it.  Lines queued after this
+        call wait until func is done.  If the thread is not running func
+        is called now.
+
+        Args:
+            func (Callable): function to run
+            *args: arguments to call func with
+        """
+        if not self.is_alive():
+            func(*args)
+            return
+        self.write_queue.put((_CALL, (func, args)))
+
+    def close(self, timeout: float = None):
+        """
+        Write all the queued lines, fsync every file written since its
+        last fsync and stop the thread.
+
+        Args:
+            timeout (float): maximum seconds to wait for the thread to finish
+        """
+        if not self.is_alive():
+            return
+        done = threading.Event()
+        self.write_queue.put((_STOP, done))
+        done.wait(timeout)
+        self.join(timeout)
+
+    def metrics(self) -> dict:
+        """ Get the counts of lines written and how much the queue backed up """
+        with self.lock:
+            metrics = dict(self._metrics)
+        metrics["queue size"] = self.write_queue.qsize()
+        metrics["lines waiting"] = self._n_pending
+        metrics["lines to retry"] = self._n_failed
+        return metrics
+
+    def run(self):
+        while True:
+            wait_time = self.flush_interval - (time.monotonic() - self._last_write)
+            try:
+                filename, data = self.write_queue.get(
+                    timeout=min(max(wait_time, 0.0), self.flush_interval))
+            except queue.Empty:
+                self._write_pending()
+                continue
+            if filename is _FLUSH:
+                self._write_pending(retry=True)
+                data.set()
+            elif filename is _CALL:
+                self._write_pending(retry=True)
+                func, args = data
+                try:
+                    func(*args)
+                except Exception as _error:
+                    logging.error(f"Error in {func} called after the writes: {_error}")
+            elif filename is _STOP:
+                self._write_pending(retry=True, fsync=True)
+                for unsynced_file in list(self._unsynced):
+                    self._fsync(unsynced_file)
+                data.set()
+                return
+            else:
+                self._pending.setdefault(filename, []).append(data)
+                self._n_pending += 1
+                if (self._n_pending >= self.flush_size or
+                        time.monotonic() - self._last_write >= self.flush_interval):
+                    self._write_pending()
+
+    def _write_pending(self, retry: bool = False, fsync: bool = False):
+        """
+        Write the waiting lines to their files, one open and writelines per file.
+        Lines for a file that could not be written are kept to try again
+        after its retry interval.
+
+        Args:
+            retry (bool): try the files that failed before their retry interval is over
+            fsync (bool): force the files to disk after writing them
+        """
+        now = time.monotonic()
+        self._last_write = now
+        for filename in list(self._pending.keys()) + list(self._failed.keys()):
+            if filename not in self._pending and filename not in self._failed:
+                continue  # in both lists and already handled
+            new_lines = self._pending.pop(filename, [])
+            self._n_pending -= len(new_lines)
+            lines = self._failed.pop(filename, [])
+            self._n_failed -= len(lines)
+            lines.extend(new_lines)
+            if not retry and now < self._retry_at.get(filename, (0.0, 0.0))[0]:
+                self._keep_failed(filename, lines)
+                continue
+            synced = fsync or filename in self._fsync_files
+            try:
+                if isinstance(lines[0], bytes):
+                    _file = open(filename, 'ab')
+                else:
+                    _file = open(filename, 'a', encoding=self.encoding)
+                with _file:
+                    _file.writelines(lines)
+                    if synced:
+                        _file.flush()
+                        os.fsync(_file.fileno())
+                        with self.lock:
+                            self._metrics["fsyncs"] += 1
+            except Exception as _error:
+                interval = self._retry_at.get(filename, (0.0, self.retry_interval / 2))[1]
+                interval = min(2 * interval, MAX_RETRY_INTERVAL)
+                self._retry_at[filename] = (now + interval, interval)
+                logging.error(f"Error in saving data to {filename}: {_error}, "
+                              f"trying again in {interval:.0f} sec")
+                with self.lock:
+                    self._metrics["write errors"] += 1
+                self._keep_failed(filename, lines)
+                continue
+            self._retry_at.pop(filename, None)
+            if synced:
+                self._unsynced.discard(filename)
+            else:
+                self._unsynced.add(filename)
+            with self.lock:
+                self._metrics["lines written"] += len(lines)
+                self._metrics["batches written"] += 1
+
+    def _keep_failed(self, filename: str, lines: List[Union[str, bytes]]):
+        """ Keep the newest max_retry_lines lines of a file that could not
+        be written, to try again, the older lines are dropped """
+        n_dropped = len(lines) - self.max_retry_lines
+        if n_dropped > 0:
+            logging.error(f"Dropped {n_dropped} lines that could not be saved to {filename}")
+            lines = lines[n_dropped:]
+            with self.lock:
+                self._metrics["lines dropped"] += n_dropped
+        self._failed[filename] = lines
+        self._n_failed += len(lines)
+
+    def _fsync(self, filename: str):
+        """ Force a file already written to disk """
+        try:
+            with open(filename, 'ab') as _file:
+                os.fsync(_file.fileno())
+        except OSError as _error:
+            logging.error(f"Error in syncing {filename} to disk: {_error}")
+            return
+        self._unsynced.discard(filename)
+        with self.lock:
+            self._metrics["fsyncs"] += 1
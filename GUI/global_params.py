@@ -14,6 +14,8 @@ DEVICES = {"device_1": "position 1",
            "device_3": "position 3"}
 REMOTE_ASK_TIME = 5000  # ms
 REMOTE_ASK_PKT_SIZE = 5
+REMOTE_ASK_IN_FLIGHT = 3  # requests waiting on each sensor at once
+REMOTE_ASK_RETRIES = 3
 
 ORY_GRAPH_BUTTON_OPTS = (["Full", 0, 16000],
                          ["OZ 10,000", 8000, 12000],
@@ -14,7 +14,6 @@ import json
 import logging
 import os
 from random import randint
-import statistics
 import tkinter as tk
 from typing import List, Tuple
 logging.getLogger('matplotlib').setLevel(logging.WARNING)
@@ -25,10 +24,14 @@ import matplotlib as mp
 import matplotlib.dates as mdates
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib import pyplot as plt
+import numpy as np
 
 # local files
 import global_params
 from displays.collapsible_frame import CollapsibleFrame
+import level_of_detail
+import redraw_scheduler
+import rolling_stats
 plt.style.use("seaborn")
 
 __location__ = os.path.realpath(
@@ -53,6 +56,9 @@ with open(os.path.join(__location__, "master_settings.json")) as _file:
     json_data2 = _file.read()
 # json_data2 = open(os.path.join(__location__, "master_settings.json")).read()
 SETTINGS = json.loads(json_data2)
+MAX_FPS = SETTINGS.get("graph max fps", redraw_scheduler.MAX_FPS)
+USE_BLIT = SETTINGS.get("graph blit", False)
+LINE_BUFFER_CAPACITY = 1024
 ORY_GRAPH_SIZE = (7, 3)
 SPECTRUM_FRAME = (2.5, 2)
 LABEL_SIZE = 14
@@ -63,6 +69,128 @@ ROLL_ALPHA = 1.0
 LINE_ALPHA = 0.2
 
 
+def to_plot_numbers(x) -> np.ndarray:
+    """
+    Convert x data to the float64 numbers matplotlib plots, dates are
+    converted with mdates.date2num
+
+    Test
+    -------------
+    >>> to_plot_numbers([1350, 1351]).tolist()
+    [1350.0, 1351.0]
+    >>> to_plot_numbers(np.array(["1970-01-02"], dtype="datetime64[s]")).tolist()
+    [1.0]
+    """
+    x = np.asarray(x)
+    if x.dtype.kind in "fiu":
+        return x.astype(np.float64)
+    return np.asarray(mdates.date2num(x), dtype=np.float64)
+
+
+def first_difference(old, new) -> int:
+    """
+    Get the index of the first value of new that is not the same as in old,
+    the length of old if new only has values added to the end.
+
+    Test
+    -------------
+    >>> first_difference(np.array([1, 2, 3]), np.array([1, 2, 3, 4]))
+    3
+    >>> first_difference(np.array([1, 3, 3]), np.array([1, 2, 3, 3]))
+    1
+    """
+    if old is None:
+        return 0
+    n_same = min(old.shape[0], new.shape[0])
+    if old.dtype != new.dtype:
+        return 0
+    changed = np.flatnonzero(old[:n_same] != new[:n_same])
+    return int(changed[0]) if changed.shape[0] else n_same
+
+
+class LineBuffer:
+    """
+    Preallocated float64 buffers with the plotted data of a line and its
+    rolling mean line.  The new x data is compared to the x data given
+    last time, and only the x values from the first one that changed, or
+    the new ones at the end, are converted and copied in.
+    plot_indices picks the points to plot with a level of detail pyramid.
+
+    Attributes:
+        length (int): number of points in the buffers
+    """
+    def __init__(self, capacity: int = LINE_BUFFER_CAPACITY):
+        self.length = 0
+        self._x = np.empty(capacity)
+        self._y = np.empty(capacity)
+        self._mean = np.empty(capacity)
+        self._given_x = None  # copy of the x data given, to find what changed
+        self._pyramid = None  # made when it is first needed
+        self._changed_from = 0  # first y value changed since the pyramid was updated
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:self.length]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self.length]
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean[:self.length]
+
+    def update(self, x, y, mean=None):
+        """
+        Put new data in the buffers
+
+        Args:
+            x: x data, dates or numbers
+            y: y data, same length as x
+            mean (optional): rolling mean of y, same length as x
+        """
+        given_x = np.array(x)
+        n_points = given_x.shape[0]
+        if n_points > self._x.shape[0]:
+            self._grow(2 * n_points)
+        first_changed = first_difference(self._given_x, given_x)
+        # points put in the middle shift the x values after them, so
+        # everything from the first change on is converted again
+        self._x[first_changed:n_points] = to_plot_numbers(given_x[first_changed:])
+        # y values can change anywhere (rolling means, inserted points), but
+        # copying them into the buffer is cheap compared to converting dates
+        y = np.asarray(y, dtype=np.float64)
+        n_same = min(self.length, n_points)
+        changed_y = np.flatnonzero((self._y[:n_same] != y[:n_same]) &
+                                   ~(np.isnan(self._y[:n_same]) & np.isnan(y[:n_same])))
+        first_changed = min(first_changed, int(changed_y[0]) if changed_y.shape[0] else n_same)
+        self._changed_from = min(self._changed_from, first_changed)
+        self._y[:n_points] = y
+        if mean is not None:
+            self._mean[:n_points] = mean
+        self.length = n_points
+        self._given_x = given_x
+
+    def plot_indices(self, start: int, stop: int, n_pixels: int) -> np.ndarray:
+        """
+        Get the indexes of the points to plot for the range [start, stop)
+        on a graph n_pixels wide, see level_of_detail.MinMaxPyramid.indices
+        """
+        if self._pyramid is None:
+            self._pyramid = level_of_detail.MinMaxPyramid(self.y)
+        elif self._changed_from < self.length or self._pyramid.n_points != self.length:
+            # only the buckets after the first changed point are made again
+            self._pyramid.update(self.y, self._changed_from)
+        self._changed_from = self.length
+        return self._pyramid.indices(start, stop, n_pixels)
+
+    def _grow(self, capacity: int):
+        for name in ["_x", "_y", "_mean"]:
+            new_buffer = np.empty(capacity)
+            new_buffer[:self.length] = getattr(self, name)[:self.length]
+            setattr(self, name, new_buffer)
+
+
 class PyPlotFrame(tk.Frame):
     """
     A custom Tkinter frame that embeds a pyplot graph.
@@ -84,7 +212,9 @@ class PyPlotFrame(tk.Frame):
                  ylim_buttons: List[Tuple[str, int, int]] = None,
                  rhs_buttons: Tuple[str, str, str] = None,
                  hlines: List[float] = None,
-                 use_log: bool =False):
+                 use_log: bool =False,
+                 redraw_scheduler: redraw_scheduler.RedrawScheduler = None,
+                 use_blit: bool = False):
         """
         Initialize the PyPlotFrame.
 
@@ -105,9 +235,15 @@ class PyPlotFrame(tk.Frame):
             blank if you do not want to use the rhs.
             hlines (List[float], optional): Horizontal lines to be displayed on the graph. Defaults to None.
             use_log (bool, optional): Whether to use a logarithmic scale on the y-axis. Defaults to False.
+            redraw_scheduler (RedrawScheduler, optional): scheduler to coalesce the
+            redraws of the figure with, if None the figure is redrawn on every update.
+            use_blit (bool, optional): Only render the data lines over a saved
+            background of the rest of the figure, unless the axis limits change.
+            Defaults to False.
         """
         tk.Frame.__init__(self, master=parent)
         self.root_app = root_app
+        self.redraw_scheduler = redraw_scheduler
         self.ylim = ylim
         self.config(bg='white')
 
@@ -180,11 +316,21 @@ class PyPlotFrame(tk.Frame):
         self.lines = {}
         self.rolling_samples = SETTINGS["Rolling samples"]
         self.mean_lines = {}
+        self.line_buffers = {}  # type: dict[str, LineBuffer]
+
+        self.use_blit = use_blit
+        self._background = None  # the figure without the data lines, for blitting
+        self._full_draw = True
+        if use_blit:
+            self.canvas.mpl_connect("draw_event", self._on_draw)
+        # only plot as many points as the graph has pixels for the x range shown
+        self.left_axis.callbacks.connect("xlim_changed", self._on_xlim_changed)
 
         self.motion_connect = None
         self.rect = None
         self.zoom_coords = []
         self.zoomed = False
+        self.needs_rescale = False  # relimit the axis on the next redraw
 
         if hlines:
             for i, hline in enumerate(hlines):
@@ -192,7 +338,7 @@ class PyPlotFrame(tk.Frame):
                                        ls='--')
 
     def update_graph(self, x, y, label=None,
-                     show_mean=True):
+                     show_mean=True, rolling=None):
         """
 
         Args:
@@ -200,6 +346,8 @@ class PyPlotFrame(tk.Frame):
             y:
             label:
             show_mean:
+            rolling: rolling average of y if it is already calculated,
+            else it is calculated here if show_mean is True
 
         Returns:
 
@@ -215,7 +363,10 @@ class PyPlotFrame(tk.Frame):
             return
 
         if show_mean:
-            rolling_data = self.rolling_avg(y)
+            if rolling is not None and len(rolling) == len(y):
+                rolling_data = rolling
+            else:
+                rolling_data = self.rolling_avg(y)
         _color = "blue"  # reflectance data
 
         if label:
@@ -223,41 +374,109 @@ class PyPlotFrame(tk.Frame):
         else:
             label = "blank"
 
+        if label not in self.line_buffers:
+            self.line_buffers[label] = LineBuffer()
+        buffer = self.line_buffers[label]
+        buffer.update(x, y, rolling_data if show_mean else None)
+
         if label not in self.lines:
             marker = "-o"
             if label == "blank":
                 marker = "-"
+            # plot the original x the first time so the axis gets its date units
             self.lines[label], = self.left_axis.plot(x, y, marker,
                                                      alpha=LINE_ALPHA,
                                                      label=label,
-                                                     color=_color)
+                                                     color=_color,
+                                                     animated=self.use_blit)
             if label != "blank":
                 self.left_axis.legend(prop={'size': LABEL_SIZE})
             if show_mean:
                 self.mean_lines[label], = self.left_axis.plot(x, rolling_data, '--',
                                                               color=_color,
-                                                              alpha=ROLL_ALPHA)
-        else:
-            self.lines[label].set_xdata(mdates.date2num(x))
-            self.lines[label].set_ydata(y)
-
-            if show_mean:
-                self.mean_lines[label].set_xdata(mdates.date2num(x))
-                self.mean_lines[label].set_ydata(rolling_data)
+                                                              alpha=ROLL_ALPHA,
+                                                              animated=self.use_blit)
+            self._full_draw = True  # the legend changed
+        if not self.zoomed and label != "blank":
+            # use the full range so relim still sees the ends and extremes of the data
+            self._set_line_data(label, 0, buffer.length)
+        else:  # the axis keeps its limits, so keep the detail of the range shown
+            self._set_line_data(label, *level_of_detail.visible_range(
+                buffer.x, *self.left_axis.get_xlim()))
 
         # print(f"check1 {self.zoomed}, {label}")
         if not self.zoomed and label != "blank":
-            # print("re-limit axis", self.ylim)
-            self.left_axis.relim()
-            self.left_axis.autoscale()
+            # the axis is relimited once when it is drawn, not for every line
+            self.needs_rescale = True
             # if self.ylim:  # TODO: test if this is needed
             #     # print("setting ylim")
             #     self.left_axis.set_ylim(self.ylim)
             # tick_skips = len(x) // 6
             # print(f"tick skips: {tick_skips}")
             # self.axis.set_xticks(self.axis.get_xticks()[::tick_skips])
-        # print("Update in graph_v2; drawing")
-        self.canvas.draw()
+        self.request_redraw()
+
+    def _set_line_data(self, label: str, start: int, stop: int):
+        """ Put the level of detail points of the range [start, stop) of
+        a line's buffer into the line and its mean line """
+        buffer = self.line_buffers[label]
+        index = buffer.plot_indices(start, stop, int(self.left_axis.bbox.width))
+        x = buffer.x[index]
+        self.lines[label].set_data(x, buffer.y[index])
+        if label in self.mean_lines:
+            self.mean_lines[label].set_data(x, buffer.mean[index])
+
+    def _on_xlim_changed(self, axis):
+        """ Pick the level of detail for the new x range, so zooming in shows
+        the full resolution data and zooming out keeps the points plotted
+        to about the number of pixels """
+        x_low, x_high = axis.get_xlim()
+        for label, buffer in self.line_buffers.items():
+            if label in self.lines:
+                start, stop = level_of_detail.visible_range(buffer.x, x_low, x_high)
+                self._set_line_data(label, start, stop)
+
+    def request_redraw(self):
+        """
+        Redraw the figure, if there is a redraw scheduler the figure is only
+        marked and is drawn with the scheduler's next frame.
+        """
+        if self.redraw_scheduler:
+            self.redraw_scheduler.mark_dirty(self)
+        else:
+            self.redraw()
+
+    def redraw(self):
+        """
+        Relimit the axis if the data was updated and draw the figure the
+        next time Tk is idle.  In blit mode, if the axis limits did not
+        change, only the data lines are rendered over the saved background.
+        """
+        limits = (self.left_axis.get_xlim(), self.left_axis.get_ylim())
+        if self.needs_rescale and not self.zoomed:
+            # print("re-limit axis", self.ylim)
+            self.left_axis.relim()
+            self.left_axis.autoscale()
+        self.needs_rescale = False
+        if (not self.use_blit or self._full_draw or self._background is None or
+                limits != (self.left_axis.get_xlim(), self.left_axis.get_ylim())):
+            # print("Update in graph_v2; drawing")
+            self._full_draw = False
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.figure.bbox)
+
+    def _on_draw(self, _):
+        """ After a full render save the background for blitting, and
+        add the data lines that are left out of the full render """
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in list(self.lines.values()) + list(self.mean_lines.values()):
+            self.left_axis.draw_artist(line)
 
     def toggle_right_axis(self):
         print(f"Toggling the right hand size axis")
@@ -291,20 +510,16 @@ class PyPlotFrame(tk.Frame):
 
     def rolling_avg(self, _list):
         """
-        Calculate the rolling average of a list.  From ChatGPT
+        Calculate the rolling average of a list.
 
         Args:
             _list (list): The input list of values.
 
         Returns:
-            list: The list of rolling averages.
+            np.ndarray: The rolling averages.
 
         """
-        _rolling_avg = [
-            statistics.mean(_list[max(0, i - self.rolling_samples):i])
-            for i in range(1, len(_list) + 1)
-        ]
-        return _rolling_avg
+        return rolling_stats.rolling_mean(_list, self.rolling_samples)
 
     def rolling_avg_depr(self, _list):
         _rolling_avg = []
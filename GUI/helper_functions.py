@@ -11,6 +11,9 @@ import json
 import logging
 import os
 
+# local files
+import instrumentation
+
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
 logger = logging.getLogger(__name__)
@@ -27,6 +30,7 @@ def get_packet_data(pkt):
         return None
 
 
+@instrumentation.timed("check_database_info")
 def check_database_info(data_pkt):
     if "Info" in data_pkt:  # is database information
         time = data_pkt[TIME_KEYWORD]
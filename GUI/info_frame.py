@@ -56,20 +56,19 @@ class InfoFrame(tk.Frame):
         cpu_temp = "missing"
         av = ""
         ory = ""
-        date = ""
-        if "SensorTemp" in data_pkt:
-            sensor_temp = data_pkt["SensorTemp"]
-        if "CPUTemp" in data_pkt:
-            cpu_temp = data_pkt["CPUTemp"]
-        if "AV" in data_pkt and data_pkt["AV"] is not None:
-            av = data_pkt["AV"]
-        if "OryConc" in data_pkt:
-            ory = data_pkt["OryConc"]
+        if data_pkt.sensor_temp is not None:
+            sensor_temp = data_pkt.sensor_temp
+        if data_pkt.cpu_temp is not None:
+            cpu_temp = data_pkt.cpu_temp
+        if data_pkt.av is not None:
+            av = data_pkt.av
+        if data_pkt.ory_conc is not None:
+            ory = data_pkt.ory_conc
         self.current_read_frames[position].update_current_info(cpu_temp,
                                                                sensor_temp,
                                                                av, ory,
-                                                               data_pkt["date"],
-                                                               data_pkt["time"].time().strftime('%H:%M:%S'))
+                                                               str(data_pkt.date),
+                                                               data_pkt.time.strftime('%H:%M:%S'))
 
 
 class SensorInfoFrame(tk.Frame):
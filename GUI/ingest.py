@@ -0,0 +1,190 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Pipeline to move the work of handling the sensor messages off the
+Tk main thread.
+
+The MQTT network threads only decode each message and submit the
+function to handle it.  A worker thread runs the submitted functions
+in order, so the parsing, model fitting and saving of the data is done
+there.  Anything that changes the Tk widgets is put on a UI queue with
+call_in_ui by the worker or network threads, and the Tk thread runs
+those calls from an after loop every ui_interval milliseconds.
+
+The worker holds the pipeline's lock while it runs each function and
+the Tk thread holds it while it runs the UI calls, so the UI never
+reads the data while the worker is changing it.  Tk code that uses the
+data outside of the UI queue should hold the lock also.
+
+Until start is called there is no worker thread and the functions are
+just called directly, which is how the tests and offline tools use it.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import logging
+import queue
+import threading
+import time
+import tkinter as tk  # type hinting
+from typing import Callable
+
+MAX_QUEUE_SIZE = 1000  # messages waiting for the worker before submit blocks
+UI_INTERVAL = 50  # ms between runs of the UI queue
+MAX_UI_CALLS = 200  # UI calls to run each interval, so the Tk loop is never held for long
+_STOP = object()  # put on the work queue to stop the worker
+
+
+class IngestPipeline:
+    """
+    Hand off work from the network threads to a worker thread, and the
+    UI updates from the worker thread to the Tk thread.
+
+    Attributes:
+        root_app (tk.Tk): root application, the UI queue is run with its after method
+        lock (threading.RLock): held while the data is being changed or read
+        work_queue (queue.Queue): functions waiting for the worker thread
+        ui_queue (queue.Queue): functions waiting for the Tk thread
+    """
+    def __init__(self, root_app: tk.Tk, max_queue_size: int = MAX_QUEUE_SIZE,
+                 ui_interval: int = UI_INTERVAL, max_ui_calls: int = MAX_UI_CALLS):
+        """
+        Args:
+            root_app (tk.Tk): root application to run the UI calls on
+            max_queue_size (int): number of messages the work queue holds
+            before submit blocks the network thread
+            ui_interval (int): milliseconds between runs of the UI queue
+            max_ui_calls (int): maximum UI calls to run each interval
+        """
+        self.root_app = root_app
+        self.ui_interval = ui_interval
+        self.max_ui_calls = max_ui_calls
+        self.lock = threading.RLock()
+        self.work_queue = queue.Queue(maxsize=max_queue_size)
+        self.ui_queue = queue.Queue()
+        self.worker = None  # type: threading.Thread
+        self._ui_after = None
+        self._metrics_lock = threading.Lock()  # the metrics are changed from every thread
+        self._metrics = {"messages handled": 0, "errors": 0,
+                         "max queue size": 0, "max handle seconds": 0.0,
+                         "ui calls": 0}
+
+    @property
+    def running(self) -> bool:
+        """ True if there is a worker thread to submit functions to """
+        return self.worker is not None and self.worker.is_alive()
+
+    def start(self):
+        """ Start the worker thread and the UI queue loop """
+        if self.running:
+            return
+        self.worker = threading.Thread(target=self._work, name="Ingest", daemon=True)
+        self.worker.start()
+        self._ui_after = self.root_app.after(self.ui_interval, self._run_ui_queue)
+
+    def submit(self, func: Callable, *args):
+        """
+        Run func(*args) on the worker thread.  Called from the network
+        threads, this blocks if the worker is max_queue_size messages behind.
+        If the worker is not running, or this is the worker thread, func is
+        called now.
+
+        Args:
+            func (Callable): function to handle a message
+            *args: arguments to call func with
+        """
+        if not self.running or threading.current_thread() is self.worker:
+            self._handle(func, args)
+            return
+        self.work_queue.put((func, args))
+        with self._metrics_lock:
+            self._metrics["max queue size"] = max(self._metrics["max queue size"],
+                                                  self.work_queue.qsize())
+
+    def call_in_ui(self, func: Callable, *args):
+        """
+        Run func(*args) on the Tk thread.  From the Tk (main) thread func is
+        called now, from any other thread, the worker or a network thread,
+        it is put on the UI queue for the Tk thread's UI loop to run.
+
+        Args:
+            func (Callable): function that uses the Tk widgets
+            *args: arguments to call func with
+        """
+        if threading.current_thread() is threading.main_thread():
+            func(*args)
+        else:
+            self.ui_queue.put((func, args))
+
+    def after(self, wait_time: int, func: Callable, *args):
+        """
+        Like tk.Tk.after, but func is run on the worker thread, so timers
+        started by the worker can change the data safely.
+
+        Args:
+            wait_time (int): milliseconds to wait
+            func (Callable): function to run on the worker thread
+            *args: arguments to call func with
+        """
+        self.call_in_ui(self.root_app.after, wait_time, self.submit, func, *args)
+
+    def close(self, timeout: float = None):
+        """
+        Let the worker finish the messages already submitted and stop it.
+
+        Args:
+            timeout (float): maximum seconds to wait for the worker
+        """
+        if self._ui_after is not None:
+            self.root_app.after_cancel(self._ui_after)
+            self._ui_after = None
+        if self.running:
+            self.work_queue.put((_STOP, ()))
+            self.worker.join(timeout)
+        self.worker = None
+
+    def metrics(self) -> dict:
+        """ Get the counts of messages handled and how far behind the worker got """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue size"] = self.work_queue.qsize()
+        metrics["ui queue size"] = self.ui_queue.qsize()
+        return metrics
+
+    def _work(self):
+        while True:
+            func, args = self.work_queue.get()
+            if func is _STOP:
+                return
+            self._handle(func, args)
+
+    def _handle(self, func: Callable, args: tuple):
+        start = time.perf_counter()
+        with self.lock:
+            try:
+                func(*args)
+            except Exception as _error:
+                logging.exception(f"Error handling message with {func}: {_error}")
+                with self._metrics_lock:
+                    self._metrics["errors"] += 1
+        with self._metrics_lock:
+            self._metrics["messages handled"] += 1
+            self._metrics["max handle seconds"] = max(self._metrics["max handle seconds"],
+                                                      time.perf_counter() - start)
+
+    def _run_ui_queue(self):
+        """ Run the UI calls the worker has queued, then schedule the next run """
+        with self.lock:
+            for _ in range(self.max_ui_calls):
+                try:
+                    func, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception as _error:
+                    logging.exception(f"Error updating the UI with {func}: {_error}")
+                with self._metrics_lock:
+                    self._metrics["ui calls"] += 1
+        self._ui_after = self.root_app.after(self.ui_interval, self._run_ui_queue)
@@ -0,0 +1,129 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Level of detail (min / max decimation) for plotting long time series.
+
+A MinMaxPyramid keeps, for buckets of 2, 4, 8, ... points, the index of
+the smallest and largest value in each bucket.  To plot a range of the
+data only the minimum and maximum of each bucket at the level where
+there are about as many buckets as pixels are used, so spikes are still
+shown but the number of points matplotlib draws depends on the width of
+the graph, not on how much data there is.  Zooming in to a smaller
+range picks a finer level, down to the full resolution data.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# installed libraries
+import numpy as np
+
+MIN_LEVEL_SIZE = 64  # stop making coarser levels below this many buckets
+
+
+class MinMaxPyramid:
+    """
+    Indexes of the min and max value of y in buckets of 2**level points.
+
+    Attributes:
+        n_points (int): number of points in the data the pyramid was made from
+        levels (list): for level k (starting at 1) a tuple of the min and
+        max index arrays for buckets of 2**k points
+    """
+    def __init__(self, y):
+        """
+        Args:
+            y (array_like): data to decimate, NaNs are only picked if a
+            bucket has no other values
+        """
+        self.n_points = 0
+        self.levels = []
+        self._low = self._high = np.empty(0)
+        self.update(y)
+
+    def update(self, y, start: int = 0):
+        """
+        Update the pyramid for new data where only the values from index
+        start on are different, or were added, so only the buckets with
+        those points are made again.
+
+        Args:
+            y (array_like): the new data
+            start (int): index of the first value that is not the same
+            as the data the pyramid was made or last updated with
+        """
+        y = np.asarray(y, dtype=np.float64)
+        n_points = y.shape[0]
+        start = min(max(int(start), 0), self.n_points, n_points)
+        is_nan = np.isnan(y[start:])
+        self._low = np.concatenate((self._low[:start], np.where(is_nan, np.inf, y[start:])))
+        self._high = np.concatenate((self._high[:start], np.where(is_nan, -np.inf, y[start:])))
+        self.n_points = n_points
+        old_levels, self.levels = self.levels, []
+        min_index = max_index = np.arange(n_points)  # each point is its own bucket
+        while min_index.shape[0] > MIN_LEVEL_SIZE:
+            level = len(self.levels)
+            start //= 2  # first bucket of this level with a changed point
+            if level >= len(old_levels):
+                start = 0
+            new_min, new_max = self._pair(min_index[2 * start:], max_index[2 * start:])
+            if start:
+                new_min = np.concatenate((old_levels[level][0][:start], new_min))
+                new_max = np.concatenate((old_levels[level][1][:start], new_max))
+            self.levels.append((new_min, new_max))
+            min_index, max_index = new_min, new_max
+
+    def _pair(self, min_index: np.ndarray, max_index: np.ndarray):
+        """ Join each 2 buckets of a level to make the buckets of the next level """
+        if min_index.shape[0] % 2:  # pair the last bucket with itself
+            min_index = np.append(min_index, min_index[-1])
+            max_index = np.append(max_index, max_index[-1])
+        left, right = min_index[0::2], min_index[1::2]
+        min_index = np.where(self._low[right] < self._low[left], right, left)
+        left, right = max_index[0::2], max_index[1::2]
+        max_index = np.where(self._high[right] > self._high[left], right, left)
+        return min_index, max_index
+
+    def indices(self, start: int, stop: int, n_buckets: int) -> np.ndarray:
+        """
+        Get the indexes of the points to plot for the data in [start, stop).
+
+        Args:
+            start (int): first index of the range to plot
+            stop (int): index after the last point to plot
+            n_buckets (int): about how many buckets to use, like the number
+            of pixels the range is plotted on, each gives its min and max point
+
+        Returns:
+            np.ndarray: sorted indexes of the points to plot, the first and
+            last point of the range are always included
+        """
+        start, stop = max(start, 0), min(stop, self.n_points)
+        n_range = stop - start
+        if n_range <= 2 * max(n_buckets, 1) or not self.levels:
+            return np.arange(start, stop)
+        level = min(int(np.ceil(np.log2(n_range / max(n_buckets, 1)))), len(self.levels))
+        if level < 1:
+            return np.arange(start, stop)
+        bucket_size = 2 ** level
+        first, last = start // bucket_size, (stop - 1) // bucket_size + 1
+        min_index, max_index = self.levels[level - 1]
+        index = np.concatenate((min_index[first:last], max_index[first:last],
+                                [start, stop - 1]))
+        # the buckets at the ends can reach outside the range
+        index = index[(index >= start) & (index < stop)]
+        return np.unique(index)
+
+
+def visible_range(x: np.ndarray, x_low: float, x_high: float):
+    """
+    Get the index range of sorted x data to plot for the x limits, with one
+    extra point on each side so the lines go to the edge of the graph.
+
+    Test
+    -------------
+    >>> visible_range(np.arange(10.0), 2.5, 5.5)
+    (2, 7)
+    """
+    start = int(np.searchsorted(x, x_low, side="left")) - 1
+    stop = int(np.searchsorted(x, x_high, side="right")) + 1
+    return max(start, 0), min(stop, x.shape[0])
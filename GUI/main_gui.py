@@ -88,6 +88,10 @@ class RBOGUI(Tk):
 
         # check what time stamps for each device_number we have received
         self.load_previous_data()
+        # handle the sensor messages on a worker thread from here on
+        self.data.ingest.start()
+        # sample the cpu and RAM and log the stage latencies
+        self.data.reporter.start()
         self.graphs.pack(side=TOP, expand=True, fill=BOTH)
         self.info = info_frame.InfoFrame(self, POSITIONS)
         self.info.pack(side=BOTTOM)
@@ -224,12 +228,15 @@ class RBOGUI(Tk):
         """
         Go through the connection and stop the mqtt loop and disconnect,
         then stop the thread in the graph to update the status labels,
+        then finish the messages received and write and fsync the
+        queued data files,
         then quit, destory and exit, idk how many are actually
         needed but it works
         """
         if self.loop:
             self.after_cancel(self.loop)
         self.connection.destroy()
+        self.data.close()
         #         self.graphs.destroy()
         self.quit()
         self.destroy()
@@ -0,0 +1,281 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Decode and check the MQTT messages from the sensors, in 1 place, before
+anything reaches the data class.
+
+Every payload is parsed as JSON, with orjson if it is installed, and
+then checked against the schema of its topic:
+    data: a live data packet, or a "data packets" message with the
+    saved packets a sensor was asked for, each as "packet {id}"
+    status: a dict with the position in "status" and optionally
+    "running", "packets sent", "model params" and "saved files"
+
+Status payloads that are not JSON, like the Python dicts with True and
+False some sensor versions send, are read with ast.literal_eval as they
+are.  If that fails, only the true and false tokens outside of the
+strings are changed to True and False and it is tried again, for the
+sensors that send Python dicts with JSON's booleans, so values inside
+the strings are never changed.
+
+Messages that do not match are raised as MessageError, and saved packets
+that do not match are dropped from their message, so the connection
+can count them and the data class only gets packets it can use.  The
+data packets that pass are made into sensor_packet.Packets here, so
+each packet is parsed only once.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import ast
+import datetime as dt
+import json
+import re
+from typing import NamedTuple, Union
+
+# installed libraries
+import numpy as np
+try:
+    import orjson  # optional, about 2x faster for the data packets
+except ImportError:
+    orjson = None
+
+# local files
+import global_params
+import sensor_packet
+
+DATA = "data"
+SAVED_DATA = "saved data"
+STATUS = "status"
+SAVED_PACKETS_KEY = "data packets"
+STATUS_KEYS = ("status", "saved files")
+# a quoted string, or a true or false token of an older sensor's status
+BOOLEAN_TOKEN = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|\b(true|false)\b""")
+PYTHON_BOOLEANS = {"true": "True", "false": "False"}
+
+
+class MessageError(ValueError):
+    """ A message that can not be decoded or does not match its topic's schema """
+
+
+class DecodedMessage(NamedTuple):
+    """
+    A checked message from a sensor.
+
+    kind is DATA, SAVED_DATA or STATUS, and body is the
+    sensor_packet.Packet, the list of saved Packets, or the status dict.
+    """
+    kind: str
+    device: str
+    position: str
+    body: Union[sensor_packet.Packet, list, dict]
+    n_rejected: int = 0  # saved packets dropped from the message
+
+
+def loads(payload: Union[bytes, str]):
+    """
+    Parse a JSON payload, with orjson if it is installed.
+
+    Args:
+        payload (bytes, str): message payload
+
+    Returns:
+        the parsed JSON
+
+    Raises:
+        MessageError: if the payload is not JSON
+    """
+    try:
+        if orjson is not None:
+            return orjson.loads(payload)
+        return json.loads(payload)
+    except (ValueError, TypeError) as _error:  # orjson.JSONDecodeError is a ValueError
+        raise MessageError(f"not JSON: {_error}") from None
+
+
+def decode_message(topic: str, payload: Union[bytes, str]) -> DecodedMessage:
+    """
+    Decode and check a message from a sensor.
+
+    Args:
+        topic (str): topic of the message, i.e. "device/device_2/data"
+        payload (bytes, str): message payload
+
+    Returns:
+        DecodedMessage: the checked message
+
+    Raises:
+        MessageError: if the topic is not a sensor's data or status
+        topic or the payload does not match the topic's schema
+
+    Test
+    -------------
+    >>> message = decode_message("device/device_2/status",
+    ...                          b'{"status": "position 2", "running": true}')
+    >>> message.kind, message.position, message.body
+    ('status', 'position 2', {'status': 'position 2', 'running': True})
+    >>> decode_message("device/device_2/status", b"{'status': 'position 2', 'running': False}").body
+    {'status': 'position 2', 'running': False}
+    """
+    parts = topic.split("/")
+    if len(parts) < 3 or parts[1] not in global_params.DEVICES:
+        raise MessageError(f"not a sensor topic: {topic}")
+    device = parts[1]
+    position = global_params.DEVICES[device]
+    if parts[2] == DATA:
+        body = loads(payload)
+        if type(body) is not dict:
+            raise MessageError(f"data message is a {type(body).__name__}, not a dict")
+        if SAVED_PACKETS_KEY in body:
+            packets, n_rejected = check_saved_packets(body)
+            return DecodedMessage(SAVED_DATA, device, position, packets, n_rejected)
+        return DecodedMessage(DATA, device, position, check_data_packet(body))
+    if parts[2] == STATUS:
+        return DecodedMessage(STATUS, device, position, check_status(decode_status(payload)))
+    raise MessageError(f"not a data or status topic: {topic}")
+
+
+def decode_status(payload: Union[bytes, str]) -> dict:
+    """
+    Parse a status payload as JSON, or as a Python dict for the older
+    sensors, which can also have JSON's true and false in it.
+
+    Test
+    -------------
+    >>> decode_status(b"{'status': 'position 2', 'running': true, 'mode': 'true'}")
+    {'status': 'position 2', 'running': True, 'mode': 'true'}
+    """
+    try:
+        return loads(payload)
+    except MessageError:
+        pass
+    try:
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf8")
+    except UnicodeDecodeError:
+        raise MessageError("status is not JSON or a Python dict") from None
+    for text in (payload, _python_booleans(payload)):
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+    raise MessageError("status is not JSON or a Python dict")
+
+
+def _python_booleans(payload: str) -> str:
+    """ Change the true and false tokens outside of the strings to True and False """
+    def replace(match):
+        if match.group(1):  # a quoted string, keep it as it is
+            return match.group(1)
+        return PYTHON_BOOLEANS[match.group(2)]
+    return BOOLEAN_TOKEN.sub(replace, payload)
+
+
+def check_data_packet(data_pkt: dict) -> sensor_packet.Packet:
+    """
+    Check a data packet has the values the data class uses, and make
+    it a sensor_packet.Packet.
+
+    Args:
+        data_pkt (dict): decoded data packet
+
+    Returns:
+        sensor_packet.Packet: the data packet
+
+    Raises:
+        MessageError: if a value is missing or can not be used
+
+    Test
+    -------------
+    >>> check_data_packet({"device": "position 2 ", "packet_id": "7", "date": "2022-08-25",
+    ...                    "time": "10:00:00", "OryConc": 5000.1})
+    Packet(position 2, 7, 2022-08-25 10:00:00, OryConc=5000.1)
+    >>> check_data_packet({"device": "position 2", "packet_id": 7, "date": "2022-08-25",
+    ...                    "time": "10:00:00", "Raw_data": [1.0, "x"]})
+    Traceback (most recent call last):
+    ...
+    message_decoder.MessageError: Raw_data is not a list of numbers
+    """
+    if type(data_pkt) is not dict:
+        raise MessageError(f"data packet is a {type(data_pkt).__name__}, not a dict")
+    position = data_pkt.get("device", data_pkt.get("position"))
+    if not isinstance(position, str) or position.strip() not in global_params.POSITIONS:
+        raise MessageError(f"unknown position: {position}")
+    if "date" not in data_pkt:  # a packet without a date would be given today's date
+        raise MessageError("no date")
+    if "Raw_data" in data_pkt:
+        raw_data = data_pkt["Raw_data"]
+        if type(raw_data) is not list or not raw_data:
+            raise MessageError("Raw_data is not a list of numbers")
+    elif "OryConc" not in data_pkt:
+        raise MessageError("no Raw_data or OryConc")
+    try:
+        packet = sensor_packet.Packet.from_dict(data_pkt)
+    except KeyError as _error:
+        raise MessageError(f"no {_error.args[0]}") from None
+    except (ValueError, TypeError, AttributeError) as _error:
+        if "Raw_data" in data_pkt:
+            try:  # tell which value was bad, the raw data is the usual one
+                np.asarray(data_pkt["Raw_data"], dtype=float)
+            except (ValueError, TypeError):
+                raise MessageError("Raw_data is not a list of numbers") from None
+        raise MessageError(f"bad packet value: {_error}") from None
+    if packet.raw_data is not None and packet.raw_data.ndim != 1:
+        raise MessageError("Raw_data is not a list of numbers")
+    return packet
+
+
+def check_saved_packets(message: dict) -> (list, int):
+    """
+    Get the saved data packets of a "data packets" message that pass
+    check_data_packet.
+
+    Args:
+        message (dict): decoded message, with a "packet {id}" key for each packet
+
+    Returns:
+        list, int: the good data packets, and the number that were dropped
+
+    Raises:
+        MessageError: if the message has packets and none of them are good
+    """
+    packets = []
+    n_rejected = 0
+    for key, data_pkt in message.items():
+        if key == SAVED_PACKETS_KEY:
+            continue
+        try:
+            packets.append(check_data_packet(data_pkt))
+        except MessageError:
+            n_rejected += 1
+    if n_rejected and not packets:
+        raise MessageError(f"all {n_rejected} saved packets are bad")
+    return packets, n_rejected
+
+
+def check_status(status: dict) -> dict:
+    """
+    Check a status message has the values connection.BaseConnectionClass uses.
+
+    Args:
+        status (dict): decoded status message
+
+    Returns:
+        dict: the same status message
+
+    Raises:
+        MessageError: if a value is missing or has the wrong type
+    """
+    if type(status) is not dict:
+        raise MessageError(f"status message is a {type(status).__name__}, not a dict")
+    if not any(key in status for key in STATUS_KEYS):
+        raise MessageError("status message has no status or saved files")
+    if "status" in status and not isinstance(status["status"], str):
+        raise MessageError(f"bad status position: {status['status']}")
+    if "running" in status and type(status["running"]) is not bool:
+        raise MessageError(f"running is not true or false: {status['running']}")
+    if "packets sent" in status:
+        if type(status["packets sent"]) is not int:
+            raise MessageError(f"packets sent is not an int: {status['packets sent']}")
+    return status
@@ -1,7 +1,18 @@
 # Copyright (c) 2019 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
 
 """
+Fake sensors to run the GUI and stress test it without the hardware.
 
+MockSensor makes the data packets a sensor sends, with spectra taken
+from the saved GUI/data/*_raw_data.csv files, and can drop, duplicate
+and reorder its live packets.  Every packet it makes is kept, like the
+sensors save their data, and the packets asked for with a "send packet"
+command are sent back in bursts of "data packets" messages.
+
+SensorFleet runs many MockSensors from a thread at a set rate and gives
+each message to a publish function, either a connection's _on_message
+or a MQTT client, see tools/load_generator.py.  MockConn is a
+connection with 1 MockSensor run from the Tk after loop.
 """
 
 __author__ = "Kyle Vitatus Lopin"
@@ -9,16 +20,33 @@ __author__ = "Kyle Vitatus Lopin"
 # standard libraries
 import ast
 from datetime import datetime
+import glob
+import heapq
 import json
+import logging
+import os
+import queue
+import random
 import threading
+import time
 import tkinter as tk
+from typing import Callable, Dict, List, Tuple
+
+# installed libraries
+import numpy as np
 
 # local files
 import connection
 import data_class
 import global_params
+import raw_reader
 
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
 POSITIONS = global_params.POSITIONS
+RAW_DATA_FILES = os.path.join(__location__, "data", "*_raw_data.csv")
+MAX_SPECTRA = 5000  # spectra loaded from the raw data files
+BURST_SIZE = 20  # packets in each "data packets" message
 
 
 class MSG:
@@ -64,38 +92,270 @@ class ConnectionClass_old:
         print(f"Parsing packet: {packet}")
 
 
-class MockConn(connection.ConnectionClass):
+
+
+def load_spectra(pattern: str = RAW_DATA_FILES, max_spectra: int = MAX_SPECTRA,
+                 rate: int = 25) -> np.ndarray:
+    """
+    Get spectra for the mock sensors from the saved raw data files.  If there
+    are no files, make sawtooth spectra like the first mock data did.
+
+    Args:
+        pattern (str): glob of the raw data files
+        max_spectra (int): most spectra to load
+        rate (int): slope of the sawtooth spectra if there are no files
+
+    Returns:
+        np.ndarray: shape (n_spectra, 301)
+    """
+    blocks = []
+    n_spectra = 0
+    for filename in sorted(glob.glob(pattern)):
+        for block in raw_reader.read_raw_blocks(filename):
+            blocks.append(block.spectra)
+            n_spectra += len(block)
+            if n_spectra >= max_spectra:
+                return np.concatenate(blocks)[:max_spectra]
+    if blocks:
+        return np.concatenate(blocks)
+    periods = np.arange(10, 910, 60)
+    return (np.arange(raw_reader.N_WAVELENGTHS) * rate % periods[:, np.newaxis]) + 200.0
+
+
+class MockSensor:
+    """
+    Make the messages of 1 sensor.
+
+    Attributes:
+        position (str): position the sensor sends as, i.e. "position 2"
+        device (str): device name in the topics, i.e. "device_2"
+        next_packet_id (int): id of the next packet measured
+        drop_rate (float): chance a live packet is not sent
+        duplicate_rate (float): chance a live packet is sent twice
+        reorder_rate (float): chance a live packet is held and sent after the next one
+    """
+    def __init__(self, position: str, spectra: np.ndarray,
+                 drop_rate: float = 0.0, duplicate_rate: float = 0.0,
+                 reorder_rate: float = 0.0, burst_size: int = BURST_SIZE,
+                 seed: int = None):
+        self.position = position
+        self.device = POSITIONS[position]
+        self.spectra = spectra
+        self.drop_rate = drop_rate
+        self.duplicate_rate = duplicate_rate
+        self.reorder_rate = reorder_rate
+        self.burst_size = max(int(burst_size), 1)
+        self.random = random.Random(seed)
+        self.next_packet_id = 0
+        # packet id to (date, time, cpu temp, sensor temp, spectrum index),
+        # the spectra are made when the packet is sent so they are not all kept
+        self._saved = {}  # type: Dict[int, Tuple[str, str, float, float, int]]
+        self._held = None  # live packet held to send out of order
+
+    @property
+    def data_topic(self) -> str:
+        return f"device/{self.device}/data"
+
+    def make_packet(self, packet_id: int, mode: str = "live") -> dict:
+        """ Make the data packet of a measurement the sensor saved """
+        date, _time, cpu_temp, sensor_temp, spectrum_index = self._saved[packet_id]
+        return {"time": _time, "date": date, "packet_id": packet_id,
+                "device": self.position, "mode": mode,
+                "CPUTemp": cpu_temp, "SensorTemp": sensor_temp,
+                "Raw_data": [round(float(value), 2)
+                             for value in self.spectra[spectrum_index]]}
+
+    def measure(self, now: datetime = None) -> List[dict]:
+        """
+        Take a new measurement, and get the live packets to send for it,
+        with the dropped, duplicated and out of order packets put in.
+
+        Args:
+            now (datetime): time of the measurement, the current time if None
+
+        Returns:
+            list: data packets to send, in order
+        """
+        now = now or datetime.now()
+        packet_id = self.next_packet_id
+        self.next_packet_id += 1
+        self._saved[packet_id] = (now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"),
+                                  round(self.random.uniform(45, 55), 1),
+                                  round(self.random.uniform(38, 42), 1),
+                                  self.random.randrange(len(self.spectra)))
+        if self.random.random() < self.drop_rate:
+            return []  # still saved on the sensor, for the GUI to ask for
+        packets = [self.make_packet(packet_id)]
+        if self.random.random() < self.duplicate_rate:
+            packets.append(dict(packets[0]))
+        if self._held is not None:  # send the held packet after this one
+            packets.append(self._held)
+            self._held = None
+        elif self.random.random() < self.reorder_rate:
+            self._held = packets.pop(0)
+        return packets
+
+    def saved_packets(self, pkt_ranges: List[List[int]]) -> List[dict]:
+        """
+        Get the reply messages to a "send packet" command, each is a
+        "data packets" message with up to burst_size packets.
+
+        Args:
+            pkt_ranges (list): [start, end] ranges of the packets asked for, inclusive
+
+        Returns:
+            list: messages to send on the data topic
+        """
+        packet_ids = [packet_id for start, end in pkt_ranges
+                      for packet_id in range(int(start), int(end) + 1)
+                      if packet_id in self._saved]
+        messages = []
+        for i in range(0, len(packet_ids), self.burst_size):
+            burst = packet_ids[i:i + self.burst_size]
+            message = {"data packets": len(burst)}
+            for packet_id in burst:
+                message[f"packet {packet_id}"] = self.make_packet(packet_id, mode="saved")
+            messages.append(message)
+        return messages
+
+
+class SensorFleet:
+    """
+    Run many mock sensors from a thread, each sending a packet every
+    1 / rate seconds, and answer the "send packet" requests with bursts
+    of saved packets.
+
+    Attributes:
+        publish (Callable): called with the topic and the message dict of
+        every message the sensors send
+        sensors (dict): position to its MockSensor
+        rate (float): packets each sensor measures every second
+    """
+    def __init__(self, publish: Callable[[str, dict], None],
+                 positions: List[str], rate: float = 1.0,
+                 spectra: np.ndarray = None, seed: int = None, **sensor_kwargs):
+        """
+        Args:
+            publish (Callable): function to send the messages with
+            positions (list): positions of the sensors, i.e. "position 4",
+            they have to be in global_params.POSITIONS
+            rate (float): packets per second of each sensor
+            spectra (np.ndarray): spectra to send, load_spectra() if None
+            seed (int): seed for the random faults, None for a new run each time
+            **sensor_kwargs: drop_rate, duplicate_rate, reorder_rate and
+            burst_size of the MockSensors
+        """
+        self.publish = publish
+        self.rate = rate
+        spectra = load_spectra() if spectra is None else spectra
+        self.sensors = {position: MockSensor(position, spectra,
+                                             seed=None if seed is None else seed + i,
+                                             **sensor_kwargs)
+                        for i, position in enumerate(positions)}
+        self.requests = queue.Queue()  # (position, packet ranges) to reply to
+        self.thread = None  # type: threading.Thread
+        self._stop_event = threading.Event()
+        self._metrics = {"messages sent": 0, "live packets sent": 0,
+                         "requests": 0, "saved packets sent": 0}
+
+    def ask_for_stored_data(self, position: str, pkt_ranges: List[List[int]]):
+        """
+        Ask a sensor to send saved packets, the same as
+        connection.ConnectionClass.ask_for_stored_data, so the fleet can be
+        the data's connection.  The reply is sent from the fleet's thread.
+        """
+        self.requests.put((position, pkt_ranges))
+
+    def handle_control(self, device: str, msg_dict: dict):
+        """ Handle a message sent on a sensor's control topic """
+        if msg_dict.get("command") == "send packet":
+            self.ask_for_stored_data(global_params.DEVICES[device], msg_dict["packet ranges"])
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="SensorFleet", daemon=True)
+        self.thread.start()
+
+    def close(self, timeout: float = None):
+        """ Stop the sensors, requests still queued are answered first """
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self._answer_requests()
+
+    def metrics(self) -> dict:
+        metrics = dict(self._metrics)
+        metrics["packets measured"] = sum(sensor.next_packet_id
+                                          for sensor in self.sensors.values())
+        return metrics
+
+    def _send(self, topic: str, message: dict):
+        self.publish(topic, message)
+        self._metrics["messages sent"] += 1
+
+    def _answer_requests(self):
+        while True:
+            try:
+                position, pkt_ranges = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            self._metrics["requests"] += 1
+            sensor = self.sensors.get(position)
+            if sensor is None:
+                continue
+            for message in sensor.saved_packets(pkt_ranges):
+                self._send(sensor.data_topic, message)
+                self._metrics["saved packets sent"] += message["data packets"]
+
+    def _run(self):
+        period = 1.0 / self.rate if self.rate > 0 else 0.0
+        start = time.monotonic()
+        # (time to measure, position), the sensors start spread over 1 period
+        schedule = [(start + period * i / len(self.sensors), position)
+                    for i, position in enumerate(self.sensors)]
+        heapq.heapify(schedule)
+        while not self._stop_event.is_set():
+            self._answer_requests()
+            next_time, position = schedule[0]
+            wait_time = next_time - time.monotonic()
+            if wait_time > 0 and self._stop_event.wait(wait_time):
+                return
+            sensor = self.sensors[position]
+            try:
+                for packet in sensor.measure():
+                    self._send(sensor.data_topic, packet)
+                    self._metrics["live packets sent"] += 1
+            except Exception as _error:
+                logging.exception(f"Error sending mock data for {position}: {_error}")
+            heapq.heapreplace(schedule, (next_time + period, position))
+
+
+class MockConn(connection.BaseConnectionClass):
+    """ Connection with 1 mock sensor that sends a packet every 5 seconds
+    from the Tk after loop, and answers the backfill requests """
     def __init__(self, master: tk.Tk, data=None,
                  name="position 2", rate=25):
-        connection.ConnectionClass.__init__(self, master, "MOCK", data=data)
-        self.period = 10
+        connection.BaseConnectionClass.__init__(self, master, "MOCK", data=data)
         self.name = name
         self.rate = rate
+        self.sensor = MockSensor(name, load_spectra(rate=rate))
         self.mock_loop()
 
     def input_mock_data(self):
-        data = self.make_mock_data()
-        # print(f"Mock data: {data}")
-        # make mock data package
-        today = datetime.today().strftime("%Y-%m-%d")
-        now = datetime.now().strftime("%H:%M:%S")
-        # print(type(now))
-        pkt = {'date': today}
-        pkt["time"] = now
-        pkt["Raw_data"] = data
-        pkt["device_number"] = self.name
-        pkt["OryConc"] = self.period
-        mock_msg = MSG(pkt, "device_number/device_2_data")
-        self._on_message("", "", mock_msg)
-
-    def make_mock_data(self):
-        mock_data = []
-        for i in range(301):
-            mock_data.append(((i*self.rate) % self.period) + 200)
-        self.period = (self.period % 900) + 60
-        return mock_data
+        for pkt in self.sensor.measure():
+            self._on_message("", "", MSG(pkt, self.sensor.data_topic))
+
+    def ask_for_stored_data(self, position, pkt_ranges):
+        # this is called while the backfill is sending the request, so
+        # reply after the request is finished, like a real sensor would
+        self.data.ingest.after(100, self.send_saved_packets, pkt_ranges)
+
+    def send_saved_packets(self, pkt_ranges):
+        for message in self.sensor.saved_packets(pkt_ranges):
+            self._on_message("", "", MSG(message, self.sensor.data_topic))
 
     def mock_loop(self):
         self.input_mock_data()
         self.loop_thread = self.master.after(5000, self.mock_loop)
 
+    def destroy(self):
+        self.master.after_cancel(self.loop_thread)
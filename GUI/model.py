@@ -20,15 +20,19 @@ The model files are in the sensor_models.json with a structure:
 __author__ = "Kyle Vitatus Lopin"
 
 # standard libraries
+from functools import lru_cache
 import json
+from math import factorial
 import os
 
 # installed libraries
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 # import pandas as pd
 
 # local files
 import global_params
+import instrumentation
 
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -59,6 +63,7 @@ class Models:
             else:
                 print(f"Skipping device: {device}, there is not model")
 
+    @instrumentation.timed("model fit")
     def fit(self, raw_data, device):
         if device in self.models:
             return self.models[device].fit(raw_data)
@@ -66,6 +71,25 @@ class Models:
             print(f"{device} not in models keys\n"
                   f"use one of these: {self.models.keys()}")
 
+    @instrumentation.timed("model fit batch")
+    def fit_batch(self, raw_matrix, device):
+        """
+        Calculate the model values of many spectra at once.
+
+        Args:
+            raw_matrix (array_like): raw data, shape (N, 301), one spectrum per row
+            device (str): which model to use, i.e. "device_1" or "AV"
+
+        Returns:
+            np.ndarray: shape (N,) of the model values, or None if there is no
+            model for the device
+        """
+        if device in self.models:
+            return self.models[device].fit_batch(raw_matrix)
+        else:
+            print(f"{device} not in models keys\n"
+                  f"use one of these: {self.models.keys()}")
+
 
 class Model:
     def __init__(self, model_params):
@@ -88,45 +112,68 @@ class Model:
         if "abs_signal_process" in model_params:
             # print("setting abs signal")
             self.abs_signal_process = model_params["abs_signal_process"]
+        self.abs_steps = []
+        self.weights = None
+        self.compile()
+
+    def compile(self):
+        """
+        Precompute the absorbance signal processes and the coefficients.
+        SG filters and the final sum of the coefficients times the data
+        are both linear, so any SG filters after the last nonlinear
+        process (SNV) are folded into the coefficients, giving one weight
+        vector the absorbance data (after the remaining processes) is dotted with.
+        """
+        processes = list(self.abs_signal_process or [])
+        # find the length of the data after each process to line up the coeffs
+        n_points = self.dark.shape[0]
+        for process in processes:
+            if process[0] == "SG":
+                n_points -= process[1]["window"] - 1
+        if self.coeffs.shape[0] > n_points:
+            # a SG filter shortens the data, only use the coeffs that line up
+            self.coeffs = self.coeffs[:n_points]
+        weights = self.coeffs
+        while processes and processes[-1][0] == "SG":
+            params = processes.pop()[1]
+            kernel = savitzky_golay_kernel(params["window"], params["polyorder"],
+                                           deriv=params["deriv"])
+            # sum(c[n] * sum(m[j] * x[n+j])) = sum(x[k] * (c conv m)[k])
+            weights = np.convolve(weights, kernel)
+        self.abs_steps = processes
+        self.weights = weights
 
     def fit(self, raw_data):
         # print(f"Fit: {len(raw_data)}, {self.raw_signal_process}")
+        return float(self.fit_batch(raw_data)[0])
+
+    def fit_batch(self, raw_data):
+        """
+        Calculate the model value for each spectrum (row) of raw_data.
+        Every signal process works along the last axis so all the
+        spectra are done together.
+
+        Args:
+            raw_data (array_like): raw data of shape (N, 301), or a single
+            spectrum of shape (301,)
 
-        raw_data = np.array(raw_data)
+        Returns:
+            np.ndarray: shape (N,) of the model values
+        """
+        raw_data = np.atleast_2d(np.asarray(raw_data, dtype=float))
         # print(raw_data.shape)
         if self.raw_signal_process:
             raw_data = self.fit_signal_processes(raw_data, self.raw_signal_process)
-        # print(len(raw_data), len(self.dark), len(self.ref_minus_dark))
-        # print(type(raw_data), type(self.dark), type(self.ref_minus_dark))
-        # print(type(raw_data[0]), type(self.dark[0]), type(self.ref_minus_dark[0]))
-        
+
         refl_data = (raw_data-self.dark) / self.ref_minus_dark
         # print('procss: ', self.refl_signal_process)
         if self.refl_signal_process:
             refl_data = self.fit_signal_processes(refl_data, self.refl_signal_process)
         abs_data = -np.log10(refl_data)
-        # print(abs_data)
-        # print(type(abs_data))
-        # for x in abs_data:f
-        #     print(x)
-        abs_data = np.array([0 if np.isnan(x) else x for x in abs_data])
-        # print('kl', len(abs_data))
-        # print(self.abs_signal_process)
-        if self.abs_signal_process:
-            abs_data = self.fit_signal_processes(abs_data, self.abs_signal_process)
-        # print(f"abs data len: {abs_data.shape}")
-        # print(f"coefs len: {self.coeffs.shape}")
-        # print(self.constant)
-        if self.coeffs.shape[0] > abs_data.shape[0]:
-            print(len(self.coeffs[:abs_data.shape[0]]))
-            self.coeffs = self.coeffs[:abs_data.shape[0]]
-            print("trimmed")
-        final_array = abs_data * self.coeffs
-        conc = final_array.sum() + self.constant
-        # print(f"type conc: {conc}, {type(conc)}")
-        if type(conc) is list:
-            conc = conc[0]
-        return float(final_array.sum() + self.constant)
+        abs_data[np.isnan(abs_data)] = 0
+        if self.abs_steps:  # only the processes that could not be folded in
+            abs_data = self.fit_signal_processes(abs_data, self.abs_steps)
+        return abs_data @ self.weights + self.constant
 
     def fit_signal_processes(self, data, processes):
         # print(f"processing: {processes}")
@@ -155,8 +202,9 @@ def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     approaches, such as moving averages techniques.
     Parameters
     ----------
-    y : array_like, shape (N,)
-        the values of the time history of the signal.
+    y : array_like, shape (N,) or (M, N)
+        the values of the time history of the signal, or M signals
+        to filter along the last axis.
     window_size : int
         the length of the window. Must be an odd integer number.
     order : int
@@ -195,8 +243,33 @@ def savitzky_golay(y, window_size, order, deriv=0, rate=1):
        W.H. Press, S.A. Teukolsky, W.T. Vetterling, B.P. Flannery
        Cambridge University Press ISBN-13: 9780521880688
     """
-    import numpy as np
-    from math import factorial
+    m = savitzky_golay_kernel(window_size, order, deriv=deriv, rate=rate)
+    # pad the signal at the extremes with
+    # values taken from the signal itself
+    # firstvals = y[0] - np.abs(y[1:half_window + 1][::-1] - y[0])
+    # lastvals = y[-1] + np.abs(y[-half_window - 1:-1][::-1] - y[-1])
+    # y = np.concatenate((firstvals, y, lastvals))
+    # each window of the last axis dotted with m is the same as
+    # np.convolve(m[::-1], y, mode='valid') but works on a 2-D array of spectra
+    return sliding_window_view(np.asarray(y), m.shape[0], axis=-1) @ m
+
+
+@lru_cache(maxsize=None)
+def savitzky_golay_kernel(window_size, order, deriv=0, rate=1):
+    """
+    Make the Savitzky-Golay filter coefficients, the pseudo-inverse is
+    only calculated once for each set of parameters.
+
+    Args:
+        window_size (int): length of the window, positive odd number
+        order (int): order of the polynomial fitted to each window
+        deriv (int): order of the derivative to compute
+        rate (float): sample spacing
+
+    Returns:
+        np.ndarray: read-only filter coefficients of length window_size,
+        the filtered value of a window is the window dotted with the coefficients
+    """
     try:
         window_size = np.abs(int(window_size))
         order = np.abs(int(order))
@@ -209,22 +282,19 @@ def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     order_range = range(order + 1)
     half_window = (window_size - 1) // 2
     # precompute coefficients
-    b = np.mat([[k ** i for i in order_range] for k in range(-half_window, half_window + 1)])
-    m = np.linalg.pinv(b).A[deriv] * rate ** deriv * factorial(deriv)
-    # pad the signal at the extremes with
-    # values taken from the signal itself
-    # firstvals = y[0] - np.abs(y[1:half_window + 1][::-1] - y[0])
-    # lastvals = y[-1] + np.abs(y[-half_window - 1:-1][::-1] - y[-1])
-    # y = np.concatenate((firstvals, y, lastvals))
-    return np.convolve(m[::-1], y, mode='valid')
+    b = np.array([[k ** i for i in order_range] for k in range(-half_window, half_window + 1)])
+    m = np.linalg.pinv(b)[deriv] * rate ** deriv * factorial(deriv)
+    m.flags.writeable = False  # this is shared by every call from the cache
+    return m
 
 
 # from https://nirpyresearch.com/two-scatter-correction-techniques-nir-spectroscopy-python/
 def snv(input_data):
     # Define a new array and populate it with the corrected data
-    output_data = np.zeros_like(input_data)
-    # print(input_data.shape)
-    output_data = (input_data - np.mean(input_data)) / np.std(input_data)
+    # normalize each spectrum along the last axis, so a 2-D array
+    # of spectra (one per row) is done in one step
+    output_data = ((input_data - np.mean(input_data, axis=-1, keepdims=True))
+                   / np.std(input_data, axis=-1, keepdims=True))
 
     # for i in range(input_data.shape[0]):
     #     # Apply correction
@@ -0,0 +1,237 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Record the MQTT messages from the sensors to a capture file, and replay
+them later through a connection's _on_message without a broker, to
+reproduce a problem from the field or profile a day of traffic.
+
+A capture file starts with CAPTURE_MAGIC, then has 1 record for each
+message: the time it was received, the topic length, the QoS and the
+payload length, packed with RECORD_HEADER, then the utf8 topic and the
+payload as it was sent.  The records are only appended, so a capture
+cut off by a crash is read up to its last complete record, and the
+cut off record is removed when a CaptureWriter opens the file again.
+The writer buffers the messages and writes them every FLUSH_MESSAGES
+messages or FLUSH_INTERVAL seconds, whichever comes first, so a crash
+only loses the last few seconds of traffic.
+
+replay sends the messages with the same spacing they were received
+with, divided by speed, or as fast as possible when speed is 0.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+CAPTURE_MAGIC = b"RBO MQTT CAPTURE 1\n"
+# time received (s since the epoch), topic bytes, QoS, payload bytes
+RECORD_HEADER = struct.Struct("<dHBI")
+FLUSH_MESSAGES = 100  # messages buffered before they are written to the file
+FLUSH_INTERVAL = 2.0  # most seconds a message is buffered before it is written
+
+
+class CapturedMessage(NamedTuple):
+    """ A recorded message, with the topic and payload like a paho MQTTMessage """
+    timestamp: float
+    topic: str
+    payload: bytes
+    qos: int = 0
+
+
+def encode_message(message: CapturedMessage) -> bytes:
+    """
+    Make the capture record of a message.
+
+    Args:
+        message (CapturedMessage): message to save
+
+    Returns:
+        bytes: header, topic and payload
+
+    Test
+    -------------
+    >>> record = encode_message(CapturedMessage(1.5, "device/device_2/data", b"{}", 1))
+    >>> len(record), record[RECORD_HEADER.size:]
+    (37, b'device/device_2/data{}')
+    """
+    topic = message.topic.encode("utf8")
+    return RECORD_HEADER.pack(message.timestamp, len(topic), message.qos,
+                              len(message.payload)) + topic + message.payload
+
+
+def read_capture(filename: str) -> Iterator[CapturedMessage]:
+    """
+    Read the messages in a capture file, in the order they were received,
+    up to the first record that is cut off.
+
+    Args:
+        filename (str): capture file to read
+
+    Returns:
+        Iterator[CapturedMessage]: the recorded messages
+
+    Raises:
+        ValueError: if the file is not a capture file
+    """
+    with open(filename, 'rb') as _file:
+        for message, _ in _read_records(_file, filename):
+            yield message
+
+
+def _read_records(_file, filename: str) -> Iterator[tuple]:
+    """ Read the messages of an open capture file, with the file offset
+    after each one, up to the first record that is cut off """
+    if _file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+        raise ValueError(f"{filename} is not a MQTT capture file")
+    while True:
+        header = _file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        timestamp, topic_length, qos, payload_length = RECORD_HEADER.unpack(header)
+        topic = _file.read(topic_length)
+        payload = _file.read(payload_length)
+        if len(topic) < topic_length or len(payload) < payload_length:
+            return  # cut off
+        yield CapturedMessage(timestamp, topic.decode("utf8"), payload, qos), _file.tell()
+
+
+class CaptureWriter:
+    """
+    Append messages to a capture file.
+
+    Attributes:
+        filename (str): capture file, a new one is started if it does not exist
+        flush_messages (int): messages buffered before they are written
+        flush_interval (float): most seconds a message is buffered before it
+        is written, None to only write every flush_messages messages
+        n_messages (int): messages recorded
+    """
+    def __init__(self, filename: str, flush_messages: int = FLUSH_MESSAGES,
+                 flush_interval: float = FLUSH_INTERVAL):
+        """
+        Args:
+            filename (str): capture file to append to
+            flush_messages (int): messages to buffer before writing them
+            flush_interval (float): seconds to wait at most before writing
+            the buffered messages, None for no time limit
+
+        Raises:
+            ValueError: if the file exists and is not a capture file
+        """
+        self.filename = filename
+        self.flush_messages = flush_messages
+        self.flush_interval = flush_interval
+        self.n_messages = 0
+        self._buffer = []
+        self._lock = threading.Lock()  # the flush timer writes from its own thread
+        self._timer = None  # type: threading.Timer
+        if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+            with open(filename, 'wb') as _file:
+                _file.write(CAPTURE_MAGIC)
+        else:
+            self._drop_cut_off_record()
+
+    def _drop_cut_off_record(self):
+        """ Cut off a record left partly written by a crash, so the new
+        records are not appended behind it where they can not be read """
+        with open(self.filename, 'r+b') as _file:
+            n_good_bytes = len(CAPTURE_MAGIC)
+            for _, n_good_bytes in _read_records(_file, self.filename):
+                pass
+            n_bytes = _file.seek(0, os.SEEK_END)
+            if n_good_bytes < n_bytes:
+                logging.warning(f"dropping {n_bytes - n_good_bytes} bytes of a cut "
+                                f"off record from the end of {self.filename}")
+                _file.truncate(n_good_bytes)
+
+    def record(self, topic: str, payload: bytes, qos: int = 0,
+               timestamp: float = None):
+        """
+        Add a received message to the capture.
+
+        Args:
+            topic (str): topic the message was received on
+            payload (bytes): message as it was received
+            qos (int): QoS of the message
+            timestamp (float): time it was received, now if None
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        record = encode_message(CapturedMessage(timestamp, topic, bytes(payload), qos))
+        with self._lock:
+            self._buffer.append(record)
+            self.n_messages += 1
+            if len(self._buffer) >= self.flush_messages:
+                self._write_buffer()
+            elif self._timer is None and self.flush_interval is not None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """ Write the buffered messages to the file """
+        with self._lock:
+            self._write_buffer()
+
+    def close(self):
+        self.flush()
+
+    def _write_buffer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        with open(self.filename, 'ab') as _file:
+            _file.write(b"".join(self._buffer))
+        self._buffer = []
+
+
+def replay(messages: Iterable[CapturedMessage],
+           on_message: Callable[[CapturedMessage], None],
+           speed: float = 1.0) -> dict:
+    """
+    Send recorded messages to on_message with the timing they were received with.
+
+    Args:
+        messages (Iterable[CapturedMessage]): messages to send, in order
+        on_message (Callable): called with each message
+        speed (float): times faster than real time to send them, 0 for
+        as fast as possible
+
+    Returns:
+        dict: messages sent, seconds the replay took, seconds the recording
+        covered, and the most seconds a message was sent late
+
+    Test
+    -------------
+    >>> sent = []
+    >>> recorded = [CapturedMessage(100.0, "a", b"1"), CapturedMessage(160.0, "b", b"2")]
+    >>> metrics = replay(recorded, sent.append, speed=0)
+    >>> [message.topic for message in sent], metrics["messages"], metrics["recorded seconds"]
+    (['a', 'b'], 2, 60.0)
+    """
+    metrics = {"messages": 0, "seconds": 0.0, "recorded seconds": 0.0,
+               "max late seconds": 0.0}
+    start = time.monotonic()
+    first_timestamp = None
+    for message in messages:
+        if first_timestamp is None:
+            first_timestamp = message.timestamp
+        recorded_seconds = message.timestamp - first_timestamp
+        if speed > 0:
+            wait_time = start + recorded_seconds / speed - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            else:
+                metrics["max late seconds"] = max(metrics["max late seconds"], -wait_time)
+        on_message(message)
+        metrics["messages"] += 1
+        metrics["recorded seconds"] = recorded_seconds
+    metrics["seconds"] = time.monotonic() - start
+    return metrics
@@ -18,6 +18,7 @@ import numpy as np
 # local file
 import global_params
 import graph_v2 as graph
+import redraw_scheduler
 
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -43,6 +44,9 @@ class Notebook(tk.Frame):
         tk.Frame.__init__(self, master=root_app)
         notebook = ttk.Notebook(root_app)
         notebook.pack(expand=True, fill=tk.BOTH)
+        # draw the graphs together, and only on the selected tab
+        self.redraw_scheduler = redraw_scheduler.RedrawScheduler(root_app,
+                                                                 max_fps=graph.MAX_FPS)
 
         self.ory_plot = graph.PyPlotFrame(notebook, root_app,
                                           fig_size=(9, 4),
@@ -50,19 +54,25 @@ class Notebook(tk.Frame):
                                           xlabel="Time",
                                           ylim=[0, 16000],
                                           hlines=[3500, 5000, 8000, 10000],
-                                          ylim_buttons=global_params.ORY_GRAPH_BUTTON_OPTS)
+                                          ylim_buttons=global_params.ORY_GRAPH_BUTTON_OPTS,
+                                          redraw_scheduler=self.redraw_scheduler,
+                                          use_blit=graph.USE_BLIT)
         self.ory_plot.pack()
         self.av_plot = graph.PyPlotFrame(notebook, root_app,
                                          fig_size=(9, 4),
                                          ylabel="Acid Value",
                                          xlabel="Time",
                                          ylim=[0.1, 100],
-                                         use_log=True)
+                                         use_log=True,
+                                         redraw_scheduler=self.redraw_scheduler,
+                                         use_blit=graph.USE_BLIT)
         self.av_plot.pack()
         self.temp_plot = graph.PyPlotFrame(notebook, root_app,
                                            fig_size=(9, 4),
                                            ylabel="Temperature",
-                                           xlabel="Time")
+                                           xlabel="Time",
+                                           redraw_scheduler=self.redraw_scheduler,
+                                           use_blit=graph.USE_BLIT)
         self.temp_plot.pack()
 
         # _refl_frame = tk.Frame(notebook)
@@ -82,6 +92,10 @@ class Notebook(tk.Frame):
         notebook.add(self.av_plot, text="AV")
         notebook.add(self.temp_plot, text="Temperature")
         # notebook.add(_refl_frame, text="Reflectance")
+        for plot in [self.ory_plot, self.av_plot, self.temp_plot]:
+            self.redraw_scheduler.register(
+                plot, lambda _plot=plot: notebook.select() == str(_plot))
+        notebook.bind("<<NotebookTabChanged>>", self.redraw_scheduler.visibility_changed)
 
     def update_notebook(self, position, data):
         # print("pp", data.time_series)
@@ -91,12 +105,14 @@ class Notebook(tk.Frame):
                          data.sensor_temp,
                          position)
         self.update_ory(data.time_series,
-                        data.oryzanol, position)
+                        data.oryzanol, position,
+                        rolling=data.ory_rolling)
         if position == "position 1" or position == "position 2":
             # print(f"updating AV")
             # print(data.av)
             self.update_av(data.time_series,
-                           data.av, position)
+                           data.av, position,
+                           rolling=data.av_rolling)
 
     # def update_spectrum(self, raw_data, position):
     #     # TODO: convert the models from device_number to positions
@@ -108,41 +124,25 @@ class Notebook(tk.Frame):
     #                                            reflectance_data,
     #                                            show_mean=False)
 
-    def update_ory(self, time, ory_conc, _position):
+    def update_ory(self, time, ory_conc, _position, rolling=None):
         self.ory_plot.update_graph(time, ory_conc,
-                                   label=_position)
+                                   label=_position, rolling=rolling)
 
-    def update_av(self, time, av, device):
+    def update_av(self, time, av, device, rolling=None):
         # print("update av")
         # print(time, av)
         self.av_plot.update_graph(time, av,
-                                  label=device)
+                                  label=device, rolling=rolling)
 
     def update_temp(self, time, cpu_temp,
                     sensor_temp, _position):
         # print(f"Update temp with calls: {time}, {cpu_temp}, {sensor_temp}, {_position}")
-        sensor_mask = np.ma.masked_not_equal(np.array(sensor_temp), 0.0)
-
         self.temp_plot.update_graph(time, cpu_temp,
                                     label=f"CPU {_position}",
                                     show_mean=False)
-        # print(sensor_mask.mask)
-        # print(np.array(time)[sensor_mask.mask])
-        # print(f"time: {type(time)}")
-        # print(f"temp: {type(sensor_temp)}")
-        # print(f"mask: {type(sensor_mask.mask)}")
-        # print(sensor_mask.count())
-        # print(sensor_mask.count_masked)
-        # if len(time) != len(sensor_mask.mask) or \
-        #         len(sensor_temp) != len(sensor_mask.mask):
-        #     print("Error in length of sensor temp mask")
-        #     with open("notebook_debug.dump", 'a') as _file:
-        #         _file.write(f"sensor temp: {sensor_temp}")
-        #         _file.write(f"sensor mask: {sensor_mask.mask}")
-            # print(np.array(time)[sensor_mask.mask])
-            # print(np.array(sensor_temp)[sensor_mask.mask])
-
-        self.temp_plot.update_graph(np.array(time)[sensor_mask.mask],
-                                    np.array(sensor_temp)[sensor_mask.mask],
+        # a sensor temperature of 0 is a missing reading, so leave those out
+        has_reading = np.asarray(sensor_temp) != 0.0
+        self.temp_plot.update_graph(np.asarray(time)[has_reading],
+                                    np.asarray(sensor_temp)[has_reading],
                                     label=f"Sensor {_position}",
                                     show_mean=False)
@@ -0,0 +1,185 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Keep track of which packet ids have been received from a sensor as
+sorted runs of consecutive ids, so the missing packets can be given
+as a few [start, end] ranges instead of checking every id.
+
+Adding a packet is a binary search to find the runs it joins, and
+finding the missing packets only looks at the gaps between the runs,
+so neither depends on how many packets have been received.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from bisect import bisect_right
+from typing import List
+
+# installed libraries
+import numpy as np
+
+
+class PacketGaps:
+    """
+    Interval set of the received packet ids.
+
+    Attributes:
+        starts (list): first packet id of each run of received ids, sorted
+        ends (list): last packet id of each run, inclusive
+    """
+    def __init__(self, packet_ids=()):
+        """
+        Args:
+            packet_ids (array_like): packet ids already received, in any order
+        """
+        self.starts = []  # type: List[int]
+        self.ends = []  # type: List[int]
+        self.set(packet_ids)
+
+    def set(self, packet_ids):
+        """
+        Replace the received packet ids, for loading saved data.
+
+        Args:
+            packet_ids (array_like): packet ids received, in any order
+        """
+        packet_ids = np.unique(np.asarray(packet_ids, dtype=np.int64))
+        # a new run starts after every jump of more than 1 id
+        breaks = np.flatnonzero(np.diff(packet_ids) > 1) + 1
+        self.starts = packet_ids[np.r_[0, breaks]].tolist() if packet_ids.size else []
+        self.ends = packet_ids[np.r_[breaks - 1, -1]].tolist() if packet_ids.size else []
+
+    def clear(self):
+        """ Remove all the received packet ids, for a new day """
+        self.starts = []
+        self.ends = []
+
+    def add(self, packet_id: int) -> bool:
+        """
+        Add a received packet id, joining it to the runs next to it.
+
+        Args:
+            packet_id (int): id of the packet received
+
+        Returns:
+            bool: False if the packet id was already received
+
+        Test
+        -------------
+        >>> gaps = PacketGaps([0, 1, 4])
+        >>> gaps.add(2), gaps.add(2)
+        (True, False)
+        >>> gaps.starts, gaps.ends
+        ([0, 4], [2, 4])
+        """
+        packet_id = int(packet_id)
+        i = bisect_right(self.starts, packet_id) - 1  # run starting at or before the id
+        if i >= 0 and packet_id <= self.ends[i]:
+            return False
+        joins_left = i >= 0 and self.ends[i] == packet_id - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == packet_id + 1
+        if joins_left and joins_right:  # fills the gap between 2 runs
+            self.ends[i] = self.ends.pop(i + 1)
+            del self.starts[i + 1]
+        elif joins_left:
+            self.ends[i] = packet_id
+        elif joins_right:
+            self.starts[i + 1] = packet_id
+        else:
+            self.starts.insert(i + 1, packet_id)
+            self.ends.insert(i + 1, packet_id)
+        return True
+
+    def __contains__(self, packet_id) -> bool:
+        i = bisect_right(self.starts, int(packet_id)) - 1
+        return i >= 0 and packet_id <= self.ends[i]
+
+    def ranges(self) -> List[List[int]]:
+        """ Get the [start, end] ranges of the received packet ids, inclusive """
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
+
+    @property
+    def last_packet_id(self) -> int:
+        """ Largest packet id received, -1 if none have been """
+        return self.ends[-1] if self.ends else -1
+
+    def missing(self, stop: int = None) -> List[List[int]]:
+        """
+        Get the ranges of the packet ids from 0 to stop that have not been received.
+
+        Args:
+            stop (int): id after the last packet to check, like the number
+            of packets the sensor has sent, None to check up to the last
+            packet received
+
+        Returns:
+            list: [start, end] of each range of missing ids, inclusive
+
+        Test
+        -------------
+        >>> PacketGaps([2, 3, 4, 8]).missing(12)
+        [[0, 1], [5, 7], [9, 11]]
+        """
+        if stop is None:
+            stop = self.last_packet_id + 1
+        ranges = []
+        next_id = 0  # first id after the last run checked
+        for start, end in zip(self.starts, self.ends):
+            if start >= stop:
+                break
+            if start > next_id:
+                ranges.append([next_id, start - 1])
+            next_id = end + 1
+        if next_id < stop:
+            ranges.append([next_id, stop - 1])
+        return ranges
+
+    def n_missing(self, stop: int = None) -> int:
+        """ Number of packet ids from 0 to stop that have not been received """
+        return sum(end - start + 1 for start, end in self.missing(stop))
+
+
+def expand_ranges(ranges: List[List[int]]) -> List[int]:
+    """
+    Get every packet id in a list of [start, end] ranges.
+
+    Test
+    -------------
+    >>> expand_ranges([[0, 1], [5, 7]])
+    [0, 1, 5, 6, 7]
+    """
+    return [packet_id for start, end in ranges
+            for packet_id in range(start, end + 1)]
+
+
+def subtract_ranges(ranges: List[List[int]], remove: List[List[int]]) -> List[List[int]]:
+    """
+    Remove the packet ids in one list of ranges from another.
+
+    Args:
+        ranges (list): sorted [start, end] ranges, inclusive and not overlapping
+        remove (list): sorted [start, end] ranges of the ids to take out
+
+    Returns:
+        list: sorted [start, end] ranges of the ids in ranges and not in remove
+
+    Test
+    -------------
+    >>> subtract_ranges([[0, 9], [20, 29]], [[3, 4], [8, 21], [25, 25]])
+    [[0, 2], [5, 7], [22, 24], [26, 29]]
+    """
+    result = []
+    j = 0  # first range to remove that can overlap the current range
+    for start, end in ranges:
+        while j < len(remove) and remove[j][1] < start:
+            j += 1
+        k = j
+        while start <= end and k < len(remove) and remove[k][0] <= end:
+            if remove[k][0] > start:
+                result.append([start, remove[k][0] - 1])
+            start = max(start, remove[k][1] + 1)
+            k += 1
+        if start <= end:
+            result.append([start, end])
+    return result
@@ -0,0 +1,108 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Read the YYYY-MM-DD_raw_data.csv files in fixed size blocks.
+
+Each row of a raw data file is the time, position and packet id of a
+packet and the 301 raw data values from 1350 nm to 1650 nm.  The files
+get too big over long runs to read all at once, so read_raw_blocks
+reads block_size lines at a time and parses the spectra with
+np.loadtxt, which is done in C, into a float32 (n_rows, 301) array.
+Only 1 block of lines is in memory at a time.
+
+Lines that are cut off, like the last line if the program stopped
+while writing it, are skipped.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from itertools import islice
+from typing import Iterator, List, NamedTuple
+
+# installed libraries
+import numpy as np
+
+BLOCK_SIZE = 4096  # lines parsed at once
+N_WAVELENGTHS = 301  # 1350 nm to 1650 nm
+N_INFO_COLUMNS = 3  # time, position and packet id before the spectrum
+SPECTRUM_COLUMNS = range(N_INFO_COLUMNS, N_INFO_COLUMNS + N_WAVELENGTHS)
+
+
+class RawBlock(NamedTuple):
+    """ A block of rows of a raw data file, in the order of the file """
+    times: np.ndarray  # str, as saved, "HH:MM:SS" or "YYYY-MM-DD HH:MM:SS"
+    positions: np.ndarray  # str, i.e. "position 2"
+    packet_ids: np.ndarray  # int64
+    spectra: np.ndarray  # float32, shape (n_rows, 301)
+
+    def __len__(self):
+        return self.packet_ids.shape[0]
+
+
+def read_raw_blocks(filename: str, block_size: int = BLOCK_SIZE) -> Iterator[RawBlock]:
+    """
+    Read a raw data csv file a block of rows at a time.
+
+    Args:
+        filename (str): raw data file, with 1 header line
+        block_size (int): number of lines to read for each block, the
+        block can be smaller if lines were skipped
+
+    Yields:
+        RawBlock: the rows of each block with a full spectrum
+    """
+    with open(filename, 'r') as _file:
+        next(_file, None)  # header
+        while True:
+            lines = list(islice(_file, block_size))
+            if not lines:
+                return
+            block = parse_raw_lines(lines)
+            if len(block):
+                yield block
+
+
+def parse_raw_lines(lines: List[str]) -> RawBlock:
+    """
+    Parse lines of a raw data file, skipping lines that are not complete.
+
+    Args:
+        lines (list): lines of the raw data file, without the header
+
+    Returns:
+        RawBlock: the parsed rows
+    """
+    rows = []
+    for line in lines:
+        if line.count(",") < N_INFO_COLUMNS + N_WAVELENGTHS - 1:
+            continue  # cut off line
+        time, position, packet_id, _ = line.split(",", N_INFO_COLUMNS)
+        try:
+            rows.append((time.strip(), position.strip(), int(packet_id), line))
+        except ValueError:
+            continue
+    try:
+        spectra = _load_spectra([row[3] for row in rows])
+    except ValueError:  # find the bad lines 1 at a time, this should be rare
+        rows = [row for row in rows if _is_spectrum(row[3])]
+        spectra = _load_spectra([row[3] for row in rows])
+    return RawBlock(times=np.array([row[0] for row in rows], dtype=str),
+                    positions=np.array([row[1] for row in rows], dtype=str),
+                    packet_ids=np.array([row[2] for row in rows], dtype=np.int64),
+                    spectra=spectra)
+
+
+def _load_spectra(lines: List[str]) -> np.ndarray:
+    if not lines:
+        return np.empty((0, N_WAVELENGTHS), dtype=np.float32)
+    return np.loadtxt(lines, delimiter=",", usecols=SPECTRUM_COLUMNS,
+                      dtype=np.float32, ndmin=2)
+
+
+def _is_spectrum(line: str) -> bool:
+    try:
+        _load_spectra([line])
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,102 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Schedule the redraws of the matplotlib figures in the GUI.
+
+Updating a graph only marks its figure as needing a redraw, and all the
+figures marked are drawn together with one Tk after call, no more often
+than max_fps times a second.  So when many packets come in at once, like
+when a sensor sends its saved data, the figures are drawn once for the
+whole group instead of once for every line of every packet.  Figures
+that are not visible, like on a notebook tab that is not selected, stay
+marked and are drawn when they are shown.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import time
+import tkinter as tk  # type hinting
+from typing import Callable
+
+MAX_FPS = 5  # maximum redraws per second
+
+
+class RedrawScheduler:
+    """
+    Coalesce redraw requests into one draw of each figure per frame.
+
+    The plots registered have to have a redraw() method that draws the figure.
+
+    Attributes:
+        root_app (tk.Tk): root application, used to schedule the draws with after
+        frame_time (float): minimum number of seconds between draws
+    """
+    def __init__(self, root_app: tk.Tk, max_fps: float = MAX_FPS):
+        """
+        Args:
+            root_app (tk.Tk): root application, used for its after method
+            max_fps (float): maximum number of times a second to draw the figures
+        """
+        self.root_app = root_app
+        self.frame_time = 1.0 / max_fps
+        self._visible_checks = {}
+        self._dirty = []  # plots waiting to be drawn, in the order they were marked
+        self._after_id = None
+        self._last_draw = 0.0
+
+    def register(self, plot, is_visible: Callable[[], bool] = None):
+        """
+        Add a plot with a function to check if it can be seen.
+
+        Args:
+            plot: graph with a redraw method
+            is_visible (Callable, optional): function that returns False if
+            the plot is hidden and should not be drawn yet, None if the
+            plot is always visible
+        """
+        self._visible_checks[plot] = is_visible
+
+    def mark_dirty(self, plot):
+        """
+        Mark a plot as needing a redraw and schedule the next frame if needed.
+
+        Args:
+            plot: graph with a redraw method, registered or not
+        """
+        if plot not in self._dirty:
+            self._dirty.append(plot)
+        if self.is_visible(plot):
+            self._schedule()
+
+    def is_visible(self, plot) -> bool:
+        """ Check if a plot can be seen, unregistered plots are always visible """
+        is_visible = self._visible_checks.get(plot)
+        return is_visible is None or is_visible()
+
+    def visibility_changed(self, *_):
+        """ Schedule a frame for any waiting plots that are now visible,
+        bind this to events like <<NotebookTabChanged>> """
+        if any(self.is_visible(plot) for plot in self._dirty):
+            self._schedule()
+
+    def draw_now(self):
+        """ Draw all the visible plots waiting for a redraw,
+        hidden plots stay waiting until they are visible """
+        if self._after_id is not None:
+            self.root_app.after_cancel(self._after_id)
+        self._draw()
+
+    def _schedule(self):
+        if self._after_id is not None:
+            return  # the next frame will draw this plot also
+        wait_time = self.frame_time - (time.monotonic() - self._last_draw)
+        self._after_id = self.root_app.after(max(int(1000 * wait_time), 0), self._draw)
+
+    def _draw(self):
+        self._after_id = None
+        self._last_draw = time.monotonic()
+        for plot in self._dirty[:]:
+            if self.is_visible(plot):
+                self._dirty.remove(plot)
+                plot.redraw()
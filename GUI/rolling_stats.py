@@ -0,0 +1,170 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Rolling (trailing window) statistics for the sensor time series.
+
+The rolling value at index i is the statistic of the window
+values[max(0, i - n_samples + 1): i + 1], so the first points use a
+shorter window.  Missing values (NaN) are skipped, a window with no
+valid values gives NaN.
+
+A full series is calculated in one vectorized pass, and RollingStats
+updates only the n_samples rolling values that a newly inserted point
+changes, so adding a point does not depend on how long the series is.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import warnings
+
+# installed libraries
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def rolling_mean(values, n_samples: int, start: int = 0,
+                 stop: int = None) -> np.ndarray:
+    """
+    Calculate the trailing rolling mean of values[start:stop] with cumulative sums.
+
+    Args:
+        values (array_like): data to average
+        n_samples (int): number of samples in the window
+        start (int): first index to calculate the rolling mean for
+        stop (int): index after the last rolling mean to calculate,
+        None for the end of values
+
+    Returns:
+        np.ndarray: the rolling means for the indexes start to stop
+
+    Test
+    -------------
+    >>> rolling_mean([10, 11, 12, 13], 2).tolist()
+    [10.0, 10.5, 11.5, 12.5]
+    >>> rolling_mean([10, np.nan, 12, 13], 2).tolist()
+    [10.0, 10.0, 12.0, 12.5]
+    >>> rolling_mean([10, 11, 12, 13], 3, start=2).tolist()
+    [11.0, 12.0]
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if stop is None:
+        stop = values.shape[0]
+    if stop <= start:
+        return np.empty(0)
+    # only the values in the windows of start to stop are needed
+    low = max(0, start - n_samples + 1)
+    segment = values[low:stop]
+    is_valid = ~np.isnan(segment)
+    sums = np.zeros(segment.shape[0] + 1)
+    np.cumsum(np.where(is_valid, segment, 0.0), out=sums[1:])
+    counts = np.zeros(segment.shape[0] + 1)
+    np.cumsum(is_valid, out=counts[1:])
+
+    index = np.arange(start, stop)
+    right = index + 1 - low
+    left = np.maximum(index - n_samples + 1, 0) - low
+    window_counts = counts[right] - counts[left]
+    means = np.full(index.shape[0], np.nan)
+    np.divide(sums[right] - sums[left], window_counts,
+              out=means, where=window_counts > 0)
+    return means
+
+
+def _window_statistic(function, values, n_samples: int,
+                      start: int = 0, stop: int = None) -> np.ndarray:
+    """ Apply a nan-skipping numpy function to each trailing window of
+    values[start:stop], the windows are views into a NaN padded copy of
+    only the values needed """
+    values = np.asarray(values, dtype=np.float64)
+    if stop is None:
+        stop = values.shape[0]
+    if stop <= start:
+        return np.empty(0)
+    low = max(0, start - n_samples + 1)
+    n_pad = n_samples - 1 - (start - low)
+    padded = np.concatenate((np.full(n_pad, np.nan), values[low:stop]))
+    windows = sliding_window_view(padded, n_samples)
+    with warnings.catch_warnings():
+        # a window of only missing values should just be NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return function(windows, axis=1)
+
+
+def rolling_median(values, n_samples: int, start: int = 0,
+                   stop: int = None) -> np.ndarray:
+    """
+    Calculate the trailing rolling median of values[start:stop].
+
+    Test
+    -------------
+    >>> rolling_median([1, 9, 2, 8], 3).tolist()
+    [1.0, 5.0, 2.0, 8.0]
+    """
+    return _window_statistic(np.nanmedian, values, n_samples, start, stop)
+
+
+def rolling_std(values, n_samples: int, start: int = 0,
+                stop: int = None) -> np.ndarray:
+    """
+    Calculate the trailing rolling (population) standard deviation of values[start:stop].
+
+    Test
+    -------------
+    >>> rolling_std([1, 3, 3, 3], 2).tolist()
+    [0.0, 1.0, 0.0, 0.0]
+    """
+    return _window_statistic(np.nanstd, values, n_samples, start, stop)
+
+
+STATISTICS = {"mean": rolling_mean,
+              "median": rolling_median,
+              "std": rolling_std}
+
+
+class RollingStats:
+    """
+    Keep a rolling statistic column up to date with its data column.
+
+    Attributes:
+        n_samples (int): number of samples in the rolling window
+        statistic (str): which statistic to calculate, a key of STATISTICS
+    """
+    def __init__(self, n_samples: int, statistic: str = "mean"):
+        if statistic not in STATISTICS:
+            raise ValueError(f"statistic has to be one of {list(STATISTICS.keys())}")
+        self.n_samples = int(n_samples)
+        self.statistic = statistic
+        self._function = STATISTICS[statistic]
+
+    def rebuild(self, values, rolling: np.ndarray = None) -> np.ndarray:
+        """
+        Calculate the rolling statistic for the whole data column in one pass.
+
+        Args:
+            values (array_like): data column
+            rolling (np.ndarray, optional): array to write the results into
+
+        Returns:
+            np.ndarray: rolling statistic of values
+        """
+        result = self._function(values, self.n_samples)
+        if rolling is not None:
+            rolling[:] = result
+            return rolling
+        return result
+
+    def update(self, values: np.ndarray, rolling: np.ndarray, index: int):
+        """
+        Update the rolling statistics after a point was inserted at index.
+        Only the rolling values whose windows include the new point,
+        index to index + n_samples - 1, are changed.
+
+        Args:
+            values (np.ndarray): data column, with the new point already inserted
+            rolling (np.ndarray): rolling column, same length as values, that is
+            updated in place
+            index (int): where the new point was inserted
+        """
+        stop = min(index + self.n_samples, values.shape[0])
+        rolling[index:stop] = self._function(values, self.n_samples, index, stop)
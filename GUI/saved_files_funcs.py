@@ -7,7 +7,6 @@
 __author__ = "Kyle Vitatus Lopin"
 
 # standard libraries
-import csv
 from datetime import datetime
 import os
 
@@ -16,6 +15,7 @@ import numpy as np
 
 # local files
 import data_class
+import external_sort
 import global_params
 
 __location__ = os.path.realpath(
@@ -27,78 +27,10 @@ POSITIONS = global_params.POSITIONS.keys()
 
 
 def sort_file(filename, n_columns=0):
+    """ Sort a saved data file by position and packet id, remove the duplicate
+    packets and the lines that are cut off, see external_sort.sort_csv_file """
     filename = os.path.join(__location__, filename)
-    print(filename)
-    try:
-        data = np.genfromtxt(filename, names=True,
-                             dtype=None, delimiter=',',
-                             encoding='bytes',
-                             autostrip=True,
-                             usecols=np.arange(0, n_columns))
-    except Exception as _error:
-        line_number = str(_error).split('#')[1].split(' ')[0]
-        fix_file(filename, line_number, n_columns)
-        data = np.genfromtxt(filename, names=True,
-                             dtype=None, delimiter=',',
-                             encoding='bytes',
-                             autostrip=True,
-                             usecols=np.arange(0, n_columns))
-    # remove any duplicate data if is in file
-    data = np.unique(data)
-    header_str = str(data.dtype.names[:7]).replace("'", "")
-    header_str = header_str.replace('(', "").replace(')', "")
-    sorted_str = header_str + ",\n"
-    for device_position in POSITIONS:
-        sorted_str += get_position_data(data, device_position)
-        sorted_str += "\n"
-    # sorted_str = sort_position_data(data)
-    with open(os.path.join(__location__, filename), "w") as _file:
-        # _file.write(str(data.dtype.names))
-        _file.write(sorted_str)
-
-
-def fix_file(filename, line_num, n_cols):
-    print(filename)
-    backup_file = filename + ".bak"
-    csv_reader = csv.reader(open(filename, 'r'))
-    file_lines = []
-    i = 0
-    line_num = int(line_num)
-    try:
-        for line in csv_reader:
-            if len(line) >= 7:
-                print(f"a: {line}")
-                file_lines.append(line)
-    except:
-        pass
-    csv_writer = csv.writer(open(backup_file, 'w'))
-    for wline in file_lines:
-        # print(wline)
-        csv_writer.writerow(wline)
-    os.replace(backup_file, filename)
-
-
-def get_position_data(_full_data, position):
-    position = position.encode('utf-8')
-    print(f"get position data: {position}")
-    # print(_full_data)
-    # print(np.unique(_full_data["device_number"]))
-    # print(position in np.unique(_full_data["device_number"]))
-    pos_data = _full_data[_full_data["device_number"] == position]
-
-    # print(pos_data)
-    return sort_position_data(pos_data)
-
-
-def sort_position_data(_data):
-    index1 = np.argsort(_data["packet_id"])
-    data_sort = _data[index1]
-    sorted_str = np.array2string(data_sort, separator=',')
-    sorted_str = sorted_str.replace('(', '').replace(")", "")
-    sorted_str = sorted_str.replace('[', '').replace("]", "")
-    sorted_str = sorted_str.replace("False", "")
-    sorted_str = sorted_str.replace("b'", "").replace("'", "")
-    return sorted_str
+    return external_sort.sort_csv_file(filename, n_columns=n_columns)
 
 
 def sort_files(date):
@@ -153,6 +85,7 @@ def load_position_data(_data: data_class.TimeStreamData,
         device_data.av = pos_data["AV"].tolist()
         print(type(device_data.av))
         print(device_data.av)
+    device_data.rebuild_rolling()
 
 
 if __name__ == "__main__":
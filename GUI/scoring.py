@@ -0,0 +1,136 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Score batches of raw spectra with the models, in a process pool when
+there are enough of them.
+
+Scoring 1 live packet, or a backfill chunk of a few saved packets, is
+faster on the ingest thread than sending it to another process, so the
+GUI scores in its own process.  Callers with big batches, like the load
+generator's --scoring-workers, can use a pool, then the spectra are
+split into chunks and scored by the models in every worker process at
+once.  Each worker makes its own model.Models when it starts, so only
+the spectra and the results are sent between the processes.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+from typing import Dict, List
+
+# installed libraries
+import numpy as np
+
+# local files
+import global_params
+import model
+import sensor_packet
+
+MIN_POOL_ROWS = 64  # batches smaller than this are scored in this process
+MIN_CHUNK_ROWS = 256  # smallest number of spectra sent to a worker at once
+_worker_models = None  # model.Models made in each worker process
+
+
+def _init_worker(devices: List[str]):
+    global _worker_models
+    _worker_models = model.Models(devices)
+
+
+def _fit_chunk(raw_matrix: np.ndarray, device: str) -> np.ndarray:
+    return _worker_models.fit_batch(raw_matrix, device)
+
+
+class Scorer:
+    """
+    Calculate the model values of many spectra, with an optional pool
+    of worker processes.
+
+    Attributes:
+        models (model.Models): models used for batches too small for the pool
+        n_workers (int): number of worker processes, 0 to score everything
+        in this process
+    """
+    def __init__(self, models: model.Models, n_workers: int = 0):
+        """
+        Args:
+            models (model.Models): models to score with, the workers make
+            their own with the same devices
+            n_workers (int): number of worker processes to use, 0 for none
+            and -1 for 1 for each cpu
+        """
+        self.models = models
+        if n_workers < 0:
+            n_workers = os.cpu_count() or 1
+        self.n_workers = n_workers
+        self._pool = None  # type: ProcessPoolExecutor
+
+    def score(self, raw_matrix, device: str) -> np.ndarray:
+        """
+        Calculate the model values of a batch of spectra.
+
+        Args:
+            raw_matrix (array_like): raw data, shape (N, 301), one spectrum per row
+            device (str): which model to use, i.e. "device_1" or "AV"
+
+        Returns:
+            np.ndarray: shape (N,) of the model values
+        """
+        return self._collect(self._submit(np.atleast_2d(raw_matrix), device))
+
+    def score_packets(self, data_pkts: List[sensor_packet.Packet]):
+        """
+        Score the packets with raw data and put the oryzanol value, and
+        the acid value for position 1, in each packet, the same as
+        DeviceData.add_data_pkt does for each packet.  The spectra are
+        grouped by position so each model is used on 1 batch, and the
+        batches of all the positions are scored at the same time.
+
+        Args:
+            data_pkts (list): data packets, the ones with raw data and a
+            known position get their ory_conc (and av) values set
+        """
+        batches = {}  # type: Dict[str, List[sensor_packet.Packet]]
+        for data_pkt in data_pkts:
+            if data_pkt.raw_data is not None and data_pkt.position in global_params.POSITIONS:
+                batches.setdefault(data_pkt.position, []).append(data_pkt)
+        # start all the batches before waiting on any of them
+        pending = []
+        for position, position_pkts in batches.items():
+            raw_matrix = np.array([data_pkt.raw_data for data_pkt in position_pkts],
+                                  dtype=float)
+            pending.append((position_pkts, "ory_conc",
+                            self._submit(raw_matrix, global_params.POSITIONS[position])))
+            if position == "position 1":
+                pending.append((position_pkts, "av", self._submit(raw_matrix, "AV")))
+        for position_pkts, attribute, parts in pending:
+            for data_pkt, value in zip(position_pkts, self._collect(parts)):
+                setattr(data_pkt, attribute, float(value))
+
+    def close(self):
+        """ Stop the worker processes, if they were started """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _submit(self, raw_matrix: np.ndarray, device: str) -> list:
+        """ Start scoring the spectra, returns the results, or futures of
+        the results, of each chunk for _collect """
+        n_rows = raw_matrix.shape[0]
+        if self.n_workers == 0 or n_rows < MIN_POOL_ROWS:
+            return [self.models.fit_batch(raw_matrix, device)]
+        if self._pool is None:
+            logging.info(f"starting {self.n_workers} scoring processes")
+            self._pool = ProcessPoolExecutor(self.n_workers, initializer=_init_worker,
+                                             initargs=(list(self.models.models.keys()),))
+        n_chunks = max(min(2 * self.n_workers, n_rows // MIN_CHUNK_ROWS), 1)
+        return [self._pool.submit(_fit_chunk, chunk, device)
+                for chunk in np.array_split(raw_matrix, n_chunks)]
+
+    @staticmethod
+    def _collect(parts: list) -> np.ndarray:
+        """ Join the results of each chunk in order, waiting for the workers """
+        return np.concatenate([part if isinstance(part, np.ndarray) else part.result()
+                               for part in parts])
@@ -0,0 +1,213 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Typed data packet, made once from the JSON dict a sensor sends, so the
+data class does not have to look up, convert and parse each value of
+every packet again in each step.
+
+The date and time are combined into 1 datetime, the values are floats,
+or None if the packet did not have them, and the raw spectrum is a
+float32 array, which is about 1.2 kB instead of about 7 kB as a list
+of Python floats.  Packet uses __slots__, so it has no __dict__ either.
+
+The functions that took the dict packets still take them, as_packet
+makes a Packet from them, so the csv rows, the database packets and
+the tests can use them.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import datetime as dt
+from typing import Optional, Union
+
+# installed libraries
+import numpy as np
+
+# decimal places of each value in the csv files, trailing zeros are removed
+CSV_DECIMALS = {"ory_conc": 1, "av": 1, "cpu_temp": 2, "sensor_temp": 2}
+# JSON key the sensors use for each value
+VALUE_KEYS = {"ory_conc": "OryConc", "av": "AV",
+              "cpu_temp": "CPUTemp", "sensor_temp": "SensorTemp"}
+
+
+class Packet:
+    """
+    A data packet from a sensor, or a row of a saved csv file.
+
+    Attributes:
+        position (str): position of the sensor, i.e. "position 2"
+        packet_id (int): number of the packet, counted from 0 each day
+        time (dt.datetime): date and time of the measurement
+        mode (str): "live" or "saved", None for the csv rows
+        ory_conc (float): oryzanol value, None until it is scored
+        av (float): acid value, None for the positions without it
+        cpu_temp (float): temperature of the sensor's computer
+        sensor_temp (float): temperature of the sensor
+        raw_data (np.ndarray): float32 spectrum, None if the packet did not have it
+    """
+    __slots__ = ("position", "packet_id", "time", "mode", "ory_conc", "av",
+                 "cpu_temp", "sensor_temp", "raw_data")
+
+    def __init__(self, position: str, packet_id: int, time: dt.datetime,
+                 mode: str = None, ory_conc: float = None, av: float = None,
+                 cpu_temp: float = None, sensor_temp: float = None,
+                 raw_data: np.ndarray = None):
+        self.position = position
+        self.packet_id = packet_id
+        self.time = time
+        self.mode = mode
+        self.ory_conc = ory_conc
+        self.av = av
+        self.cpu_temp = cpu_temp
+        self.sensor_temp = sensor_temp
+        self.raw_data = raw_data
+
+    @classmethod
+    def from_dict(cls, data_pkt: dict, today: dt.date = None) -> "Packet":
+        """
+        Make a Packet from a data packet dict, checking each value.
+
+        Args:
+            data_pkt (dict): data packet like the sensors send, or from
+            data_class.convert_csv_row_to_packet
+            today (dt.date): date to use if the packet has only a time,
+            the current date if None
+
+        Returns:
+            Packet: the data packet
+
+        Raises:
+            KeyError: if there is no position, packet_id or time
+            ValueError, TypeError: if a value can not be converted
+
+        Test
+        -------------
+        >>> Packet.from_dict({"time": "09:55:22", "date": "2022-11-18", "packet_id": 1,
+        ...                   "device": "position 2 ", "OryConc": -20139, "CPUTemp": "48.31",
+        ...                   "Raw_data": [1211.37, 1207.14]})
+        Packet(position 2, 1, 2022-11-18 09:55:22, OryConc=-20139.0, CPUTemp=48.31, 2 raw values)
+        """
+        if "device" in data_pkt:  # this is the code in the sensors still
+            position = data_pkt["device"]
+        elif "position" in data_pkt:
+            position = data_pkt["position"]
+        else:
+            raise KeyError("data packet has to have 'position' or 'device' in it")
+        raw_data = data_pkt.get("Raw_data")
+        if raw_data is not None:
+            raw_data = np.asarray(raw_data, dtype=np.float32)
+        return cls(position.strip(), int(data_pkt["packet_id"]),
+                   parse_time(data_pkt["time"], data_pkt.get("date"), today),
+                   mode=data_pkt.get("mode"),
+                   ory_conc=optional_float(data_pkt.get("OryConc")),
+                   av=optional_float(data_pkt.get("AV")),
+                   cpu_temp=optional_float(data_pkt.get("CPUTemp")),
+                   sensor_temp=optional_float(data_pkt.get("SensorTemp")),
+                   raw_data=raw_data)
+
+    @property
+    def date(self) -> dt.date:
+        return self.time.date()
+
+    def to_dict(self) -> dict:
+        """ Get the packet in the JSON format the sensors send """
+        data_pkt = {"time": self.time.strftime("%H:%M:%S"),
+                    "date": self.time.strftime("%Y-%m-%d"),
+                    "packet_id": self.packet_id, "device": self.position}
+        if self.mode is not None:
+            data_pkt["mode"] = self.mode
+        for attribute, key in VALUE_KEYS.items():
+            if getattr(self, attribute) is not None:
+                data_pkt[key] = getattr(self, attribute)
+        if self.raw_data is not None:
+            data_pkt["Raw_data"] = self.raw_data.tolist()
+        return data_pkt
+
+    def csv_values(self) -> list:
+        """
+        Get the values saved in a row of the day's csv file, in the order of
+        data_class.FILE_HEADER, with the missing values blank.
+
+        Test
+        -------------
+        >>> Packet("position 2", 3, dt.datetime(2022, 11, 18, 10, 5, 13), ory_conc=5000.123,
+        ...        av=-2.0, cpu_temp=48.3, sensor_temp=41.79).csv_values()
+        ['2022-11-18 10:05:13', 'position 2', '5000.1', '-2', '48.3', '41.79', '3']
+        """
+        return [str(self.time), self.position,
+                *[format_value(getattr(self, attribute), decimals)
+                  for attribute, decimals in CSV_DECIMALS.items()],
+                str(self.packet_id)]
+
+    def __repr__(self):
+        values = [f"{key}={getattr(self, attribute)}" for attribute, key in VALUE_KEYS.items()
+                  if getattr(self, attribute) is not None]
+        if self.raw_data is not None:
+            values.append(f"{self.raw_data.size} raw values")
+        return f"Packet({', '.join([self.position, str(self.packet_id), str(self.time)] + values)})"
+
+
+def as_packet(data_pkt: Union[Packet, dict], today: dt.date = None) -> Packet:
+    """
+    Get a data packet as a Packet, the dict packets are converted with
+    Packet.from_dict, Packets are returned as they are.
+    """
+    if isinstance(data_pkt, Packet):
+        return data_pkt
+    return Packet.from_dict(data_pkt, today)
+
+
+def parse_time(time: Union[str, dt.datetime], date: Optional[str] = None,
+               today: dt.date = None) -> dt.datetime:
+    """
+    Combine the time and date of a packet.
+
+    Args:
+        time (str, dt.datetime): "%H:%M:%S" time, a full isoformat
+        datetime string, or a datetime
+        date (str): "%Y-%m-%d" date for a "%H:%M:%S" time
+        today (dt.date): date to use if there is no date, the current date if None
+
+    Returns:
+        dt.datetime: date and time
+
+    Test
+    -------------
+    >>> parse_time("9:05:02", "2022-11-18")
+    datetime.datetime(2022, 11, 18, 9, 5, 2)
+    """
+    if isinstance(time, dt.datetime):
+        return time
+    time = time.strip()
+    if len(time) > 8:
+        return dt.datetime.fromisoformat(time)
+    if date:
+        day = dt.date.fromisoformat(date)
+    else:
+        day = today or dt.date.today()
+    return dt.datetime.combine(day, dt.time(*[int(part) for part in time.split(":")]))
+
+
+def optional_float(value) -> Optional[float]:
+    """ Convert a value to a float, None for missing or blank values """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return float(value)
+
+
+def format_value(value: Optional[float], decimals: int) -> str:
+    """
+    Format a value for the csv files, blank if it is missing.
+
+    Test
+    -------------
+    >>> format_value(-20139.0, 1), format_value(48.31, 2), format_value(5000.16, 1), format_value(None, 1)
+    ('-20139', '48.31', '5000.2', '')
+    """
+    if value is None:
+        return ""
+    text = f"{value:.{decimals}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text
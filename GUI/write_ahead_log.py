@@ -0,0 +1,199 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Append only log of the summary lines saved each day, so the day's csv
+file can be rebuilt after a crash without rewriting it for every packet.
+
+Each line is saved as 1 record: the length of the line and its crc32
+checksum, packed with RECORD_HEADER, and then the utf8 line.  The
+records are appended by the file_thread.FileWriter with fsync on, so
+all the records of a batch are committed to disk with 1 fsync (group
+commit).  When the program stops while a record is written, the record
+is cut off or its checksum does not match, and it and anything after
+it is ignored.
+
+The lines are still appended to the day csv file as they come in, the
+log is only read to repair the csv file.  compact merges the log into
+the sorted day csv file with external_sort.sort_csv_file, replaces the
+csv file atomically and then deletes the log, so the log only holds the
+lines since the last compaction.  TimeStreamData compacts on start up,
+which puts back any lines a crash cut off the csv file, and when a day
+is finished, on a date change or when it closes, so the whole file is
+never rewritten while packets are coming in.
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import logging
+import os
+import struct
+import threading
+from typing import List
+import zlib
+
+# local files
+import external_sort
+import file_thread  # type hinting
+
+RECORD_HEADER = struct.Struct("<II")  # line length in bytes, crc32 of the line
+
+
+def encode_record(line: str) -> bytes:
+    """
+    Make the log record of a line.
+
+    Args:
+        line (str): line to save
+
+    Returns:
+        bytes: header with the length and checksum, then the utf8 line
+
+    Test
+    -------------
+    >>> encode_record("00:00:01, position 2, 5\\n")
+    b'\\x18\\x00\\x00\\x00==\\xbd&00:00:01, position 2, 5\\n'
+    """
+    payload = line.encode("utf8")
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(data: bytes) -> (List[str], int):
+    """
+    Get the lines of the complete records, stopping at the first record
+    that is cut off or does not match its checksum.
+
+    Args:
+        data (bytes): contents of a log file
+
+    Returns:
+        list, int: the lines, and the number of bytes of good records
+
+    Test
+    -------------
+    >>> data = encode_record("a, 1\\n") + encode_record("b, 2\\n")
+    >>> decode_records(data + encode_record("c, 3\\n")[:-2])
+    (['a, 1\\n', 'b, 2\\n'], 26)
+    """
+    lines = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        try:
+            lines.append(payload.decode("utf8"))
+        except UnicodeDecodeError:
+            break
+        offset = start + length
+    return lines, offset
+
+
+class WriteAheadLog:
+    """
+    Log of the lines saved to a day's csv file since it was last compacted.
+
+    Attributes:
+        filename (str): path of the log file
+        file_writer (file_thread.FileWriter): writer thread that appends the
+        records, None to append them directly
+    """
+    def __init__(self, filename: str, file_writer: file_thread.FileWriter = None):
+        self.filename = filename
+        self.file_writer = file_writer
+        self.lock = threading.Lock()  # protects the metrics, read from the Reporter thread
+        self._metrics = {"records": 0, "compactions": 0,
+                         "records compacted": 0, "bad bytes dropped": 0}
+
+    def append(self, line: str):
+        """
+        Log a line, it is on disk after the file writer's next batch.
+
+        Args:
+            line (str): csv line saved to the day file
+        """
+        record = encode_record(line)
+        if self.file_writer and self.file_writer.is_alive():
+            self.file_writer.write_bytes_to_file(self.filename, record, fsync=True)
+        else:
+            with open(self.filename, 'ab') as _file:
+                _file.write(record)
+                _file.flush()
+                os.fsync(_file.fileno())
+        with self.lock:
+            self._metrics["records"] += 1
+
+    def replay(self) -> List[str]:
+        """
+        Read the lines in the log.  Records after a cut off or corrupt
+        record are dropped from the file, so new records are not lost
+        behind them.
+
+        Returns:
+            list: the logged lines, in the order they were logged
+        """
+        if not os.path.isfile(self.filename):
+            return []
+        with open(self.filename, 'rb') as _file:
+            data = _file.read()
+        lines, n_good_bytes = decode_records(data)
+        if n_good_bytes < len(data):
+            logging.warning(f"dropping {len(data) - n_good_bytes} bytes of bad "
+                            f"records from the end of {self.filename}")
+            with self.lock:
+                self._metrics["bad bytes dropped"] += len(data) - n_good_bytes
+            with open(self.filename, 'r+b') as _file:
+                _file.truncate(n_good_bytes)
+        return lines
+
+    def compact(self, csv_file: str, header: List[str]) -> dict:
+        """
+        Merge the logged lines into a csv file, sorted by position and
+        packet id without duplicates, and start a new log.  The logged lines
+        still in the file writer should be written first, i.e. by calling
+        this with the file writer's call_after_writes.
+
+        Args:
+            csv_file (str): day file to merge the lines into
+            header (list): header of the csv file, used if it does not exist
+
+        Returns:
+            dict: external_sort.sort_csv_file metrics of the compaction
+        """
+        lines = self.replay()
+        merge_file = csv_file + ".compact"
+        with open(merge_file, 'w', encoding="utf8", newline='') as _file:
+            if os.path.isfile(csv_file):
+                with open(csv_file, 'r', encoding="utf8", newline='') as old_file:
+                    _file.write(_end_line(old_file.readline()))
+                    # the logged lines first so they are kept over any
+                    # duplicate line that was cut off in the csv file
+                    _file.writelines(lines)
+                    for line in old_file:
+                        _file.write(_end_line(line))
+            else:
+                _file.write(', '.join(header) + '\n')
+                _file.writelines(lines)
+        try:
+            metrics = external_sort.sort_csv_file(merge_file, n_columns=len(header))
+            os.replace(merge_file, csv_file)
+        except BaseException:
+            os.remove(merge_file)
+            raise
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        with self.lock:
+            self._metrics["compactions"] += 1
+            self._metrics["records compacted"] += len(lines)
+        return metrics
+
+    def metrics(self) -> dict:
+        """ Get the counts of records logged, compactions and bad records """
+        with self.lock:
+            return dict(self._metrics)
+
+
+def _end_line(line: str) -> str:
+    return line if line.endswith("\n") else line + "\n"
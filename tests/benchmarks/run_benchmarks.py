@@ -0,0 +1,321 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Benchmarks of the hot paths of the GUI: adding packets, scoring spectra,
+loading and sorting the saved files and updating the graphs.
+
+Each benchmark makes its data in a setup function that is not timed,
+then the run is timed with time.perf_counter, repeat times, with a new
+setup before each run.  The minimum, median and items per second of
+each benchmark are saved to a JSON file in the results folder with the
+git commit, so the numbers before and after a change can be compared.
+Everything runs headless, the graph is drawn on a matplotlib Agg canvas.
+
+Usage:
+    python tests/benchmarks/run_benchmarks.py
+    python tests/benchmarks/run_benchmarks.py --quick --filter add_data_pkt
+    python tests/benchmarks/run_benchmarks.py --compare tests/benchmarks/results/<old>.json
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+from unittest import mock
+
+# installed libraries
+import matplotlib
+matplotlib.use("Agg")  # before anything imports pyplot
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+sys.path.append(os.path.join(__location__, '..', '..', 'GUI'))
+# local files
+import data_class
+import global_params
+import graph_v2
+import model
+import raw_reader
+import saved_files_funcs
+
+RESULTS_FOLDER = os.path.join(__location__, "results")
+RAW_DATA_FILE = os.path.join(__location__, '..', '..', 'GUI', 'data',
+                             "2022-08-25_raw_data.csv")
+DATE = dt.date(2022, 8, 25)
+POSITIONS = list(global_params.POSITIONS.keys())
+REPEAT = 5
+QUICK_LIMIT = 10000  # largest size run with --quick
+# name to (function, params), the function takes a param and returns
+# the setup function, the number of items each run handles and an
+# optional cleanup function
+BENCHMARKS = {}  # type: Dict[str, Tuple[Callable, List]]
+
+
+def benchmark(*params):
+    """ Register a benchmark, run once for each param """
+    def decorator(func):
+        BENCHMARKS[func.__name__] = (func, list(params) or [None])
+        return func
+    return decorator
+
+
+def make_packets(n_packets: int, shuffle: bool, position: str = "position 2") -> List[dict]:
+    """ Make data packets like the sensors send, without spectra """
+    start = dt.datetime.combine(DATE, dt.time())
+    packets = [{"time": (start + dt.timedelta(seconds=i)).strftime("%H:%M:%S"),
+                "date": DATE.strftime("%Y-%m-%d"), "packet_id": i,
+                "device": position, "mode": "live", "OryConc": 5000.0 + i % 100,
+                "AV": 1.0, "CPUTemp": "48.3", "SensorTemp": "40.1"}
+               for i in range(n_packets)]
+    if shuffle:
+        random.Random(n_packets).shuffle(packets)
+    return packets
+
+
+def load_spectra(n_spectra: int) -> np.ndarray:
+    """ Get n_spectra of the saved spectra, repeated if there are not enough """
+    spectra = np.concatenate([block.spectra for block in raw_reader.read_raw_blocks(RAW_DATA_FILE)])
+    return np.resize(spectra, (n_spectra, spectra.shape[1])).astype(float)
+
+
+def write_summary_file(filename: str, n_rows: int, shuffle: bool):
+    """ Write a summary file like the GUI saves, with the rows of each position """
+    start = dt.datetime.combine(DATE, dt.time())
+    lines = []
+    for i in range(n_rows):
+        position = POSITIONS[i % len(POSITIONS)]
+        packet_id = i // len(POSITIONS)
+        _time = (start + dt.timedelta(seconds=packet_id)).strftime("%H:%M:%S")
+        av = "1.5" if position == "position 1" else ""
+        lines.append(f"{_time}, {position}, {5000 + i % 100}.1, {av}, 48.3, 40.1, {packet_id}, \n")
+    if shuffle:
+        random.Random(n_rows).shuffle(lines)
+    with open(filename, 'w') as _file:
+        _file.write(", ".join(data_class.FILE_HEADER) + ", \n")
+        _file.writelines(lines)
+
+
+@benchmark(("in order", 1000), ("in order", 10000), ("in order", 100000),
+           ("shuffled", 1000), ("shuffled", 10000), ("shuffled", 100000))
+def add_data_pkt(param):
+    """ DeviceData.add_data_pkt of packets with their model values already set """
+    order, n_packets = param
+    packets = make_packets(n_packets, shuffle=order == "shuffled")
+
+    def setup():
+        device_data = data_class.DeviceData(use_av=True)
+        _packets = [dict(packet) for packet in packets]
+
+        def run():
+            for packet in _packets:
+                device_data.add_data_pkt(packet, None)
+        return run
+    return setup, n_packets
+
+
+@benchmark(("per spectrum", 100), ("batch", 1000), ("batch", 10000))
+def model_fit(param):
+    """ Model.fit of 1 spectrum at a time or Model.fit_batch of all of them """
+    mode, n_spectra = param
+    models = model.Models(["device_2"])
+    spectra = load_spectra(n_spectra)
+
+    def setup():
+        if mode == "per spectrum":
+            spectra_list = [spectrum.tolist() for spectrum in spectra]
+            return lambda: [models.fit(spectrum, "device_2") for spectrum in spectra_list]
+        return lambda: models.fit_batch(spectra, "device_2")
+    return setup, n_spectra
+
+
+@benchmark(1000, 10000, 100000)
+def load_previous_data(n_rows):
+    """ TimeStreamData.load_previous_data of a synthetic summary file """
+    folder = tempfile.mkdtemp()
+    filename = os.path.join(folder, "day.csv")
+    write_summary_file(filename, n_rows, shuffle=False)
+    with mock.patch.object(data_class.TimeStreamData, "check_previous_data", return_value=True):
+        time_stream_data = data_class.TimeStreamData(mock.MagicMock())
+    time_stream_data.save_file = filename
+
+    def setup():
+        time_stream_data.positions = {}
+        return time_stream_data.load_previous_data
+
+    def cleanup():
+        time_stream_data.close()
+        os.remove(filename)
+        os.rmdir(folder)
+    return setup, n_rows, cleanup
+
+
+@benchmark(10000, 100000)
+def sort_file(n_rows):
+    """ saved_files_funcs.sort_file of a shuffled summary file with duplicates """
+    folder = tempfile.mkdtemp()
+    filename = os.path.join(folder, "day.csv")
+
+    def setup():
+        write_summary_file(filename, n_rows, shuffle=True)
+        with open(filename, 'a') as _file:  # duplicate the first 1% of the rows
+            with open(filename, 'r') as _read_file:
+                _file.writelines(_read_file.readlines()[1:n_rows // 100 + 1])
+        return lambda: saved_files_funcs.sort_file(filename, saved_files_funcs.N_SUMMARY_COLUMNS)
+
+    def cleanup():
+        os.remove(filename)
+        os.rmdir(folder)
+    return setup, n_rows, cleanup
+
+
+class AggPlotFrame(graph_v2.PyPlotFrame):
+    """ PyPlotFrame drawn on an Agg canvas instead of in a Tk window """
+    def __init__(self):  # the Tk frame is not made
+        self.root_app = None
+        self.redraw_scheduler = None
+        self.ylim = None
+        self.figure = Figure(figsize=(8, 3))
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.left_axis = self.figure.add_subplot(111)
+        self.right_axis = None
+        self.lines = {}
+        self.rolling_samples = 5
+        self.mean_lines = {}
+        self.line_buffers = {}
+        self.use_blit = False
+        self._background = None
+        self._full_draw = True
+        self.left_axis.callbacks.connect("xlim_changed", self._on_xlim_changed)
+        self.zoomed = False
+        self.needs_rescale = False
+
+
+@benchmark(600, 10000, 86400)
+def update_graph(n_points):
+    """ PyPlotFrame.update_graph of every position and the redraw """
+    start = np.datetime64(dt.datetime.combine(DATE, dt.time()), 's')
+    x = start + np.arange(n_points).astype("timedelta64[s]")
+    y = 5000 + 100 * np.sin(np.arange(n_points) / 100)
+
+    def setup():
+        frame = AggPlotFrame()
+        frame.update_graph(x[:10], y[:10], label=POSITIONS[0])  # first draw
+        return lambda: [frame.update_graph(x, y + i, label=position)
+                        for i, position in enumerate(POSITIONS)]
+    return setup, n_points * len(POSITIONS)
+
+
+def run_benchmark(func: Callable, param, repeat: int) -> dict:
+    """ Time the benchmark's run repeat times, with a new setup each time """
+    made = func(param)
+    setup, n_items = made[:2]
+    times = []
+    try:
+        for _ in range(repeat):
+            run = setup()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        if len(made) > 2:
+            made[2]()  # cleanup
+    return {"min s": min(times), "median s": statistics.median(times),
+            "items": n_items, "items per s": n_items / max(min(times), 1e-12),
+            "repeat": repeat}
+
+
+def param_name(param) -> str:
+    if param is None:
+        return ""
+    if isinstance(param, tuple):
+        return "[" + ", ".join(str(item) for item in param) + "]"
+    return f"[{param}]"
+
+
+def param_size(param) -> int:
+    if isinstance(param, tuple):
+        return max([item for item in param if isinstance(item, int)] or [0])
+    return param if isinstance(param, int) else 0
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=__location__,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_file: str):
+    """ Print how much faster (> 1) or slower (< 1) each benchmark is than the baseline """
+    with open(baseline_file) as _file:
+        baseline = json.load(_file)
+    print(f"\ncompared to {baseline['commit'][:8]} ({baseline['date']}):")
+    for name, result in results.items():
+        if name in baseline["results"]:
+            speedup = baseline["results"][name]["min s"] / max(result["min s"], 1e-12)
+            print(f"    {name:45s} {speedup:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the GUI")
+    parser.add_argument("--filter", default="",
+                        help="only run the benchmarks with this in their name")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"skip the sizes over {QUICK_LIMIT} and only repeat 2 times")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="times to run each benchmark, the fastest is kept")
+    parser.add_argument("--output", default=None,
+                        help=f"JSON file for the results, default is a new file in {RESULTS_FOLDER}")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results file to compare the results to")
+    args = parser.parse_args(argv)
+    repeat = 2 if args.quick else args.repeat
+
+    results = {}
+    for name, (func, params) in BENCHMARKS.items():
+        for param in params:
+            full_name = f"{name}{param_name(param)}"
+            if args.filter not in full_name:
+                continue
+            if args.quick and param_size(param) > QUICK_LIMIT:
+                continue
+            result = run_benchmark(func, param, repeat)
+            results[full_name] = result
+            print(f"{full_name:45s} {1000 * result['min s']:10.2f} ms "
+                  f"{result['items per s']:12.0f} items/s")
+
+    commit = git_commit()
+    output = {"commit": commit, "date": dt.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "numpy": np.__version__,
+              "machine": platform.platform(), "cpus": os.cpu_count(),
+              "results": results}
+    output_file = args.output
+    if output_file is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output_file = os.path.join(RESULTS_FOLDER, f"{dt.datetime.now():%Y%m%d-%H%M%S}"
+                                                   f"_{commit[:8]}.json")
+    with open(output_file, 'w') as _file:
+        json.dump(output, _file, indent=2)
+    print(f"saved results to {output_file}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
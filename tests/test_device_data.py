@@ -12,6 +12,9 @@ import sys
 import unittest
 from unittest import mock
 
+# installed libraries
+import numpy as np
+
 sys.path.append(os.path.join('..', 'GUI'))
 # local files
 from GUI import data_class
@@ -30,10 +33,61 @@ class TestAddDataPkt(unittest.TestCase):
 
     def test_add_pos_2(self):
         # print(f"av1: {self.device_data.av}")
-        self.assertListEqual(self.device_data.av, [])
+        self.assertListEqual(self.device_data.av.tolist(), [])
         self.device_data.add_data_pkt(DATA_POS2_1, None)
         # print(f"av2: {self.device_data.av}")
-        self.assertListEqual(self.device_data.av, [-1.0])
+        self.assertListEqual(self.device_data.av.tolist(), [-1.0])
+
+    def test_out_of_order_and_duplicate_pkts(self):
+        """ Test that packets received out of order are sorted by packet id
+        and that a repeated packet id is rejected """
+        for pkt_id in [5, 1, 3, 0]:
+            pkt = DATA_POS2_1.copy()
+            pkt["packet_id"] = pkt_id
+            pkt["mode"] = "saved"
+            self.assertIsNotNone(self.device_data.add_data_pkt(pkt, None))
+        self.assertIsNone(self.device_data.add_data_pkt(DATA_POS2_1.copy(), None))
+        self.assertListEqual(self.device_data.packet_ids.tolist(), [0, 1, 3, 5])
+
+    def test_rolling_after_out_of_order_pkts(self):
+        """ Test the rolling oryzanol column is right after packets are
+        inserted out of order """
+        for pkt_id, ory in [(4, 50), (0, 10), (2, 30), (1, 20), (3, 40)]:
+            pkt = DATA_POS2_1.copy()
+            pkt["packet_id"] = pkt_id
+            pkt["OryConc"] = ory
+            self.device_data.add_data_pkt(pkt, None)
+        self.device_data.rolling_samples = 2
+        self.assertListEqual(self.device_data.ory_rolling.tolist(),
+                             [10.0, 15.0, 25.0, 35.0, 45.0])
+
+
+class TestBulkLoad(unittest.TestCase):
+    """ Test that loading whole csv files at once gives the same data
+    as adding the rows one at a time """
+    def test_csv_rows_match_add_data_pkt(self):
+        rows = [["09:55:22", " position 2", "-20139", "-1", "48.3", "0", "1"],
+                [" 2022-11-18 09:54:22", "position 2", "-20100", "", "48.3", "41.2", "0"],
+                ["09:56:22", "position 2", "-20200", "-3", "48.3", "bad", "1"],  # duplicate
+                ["", "", "", "", "", "", ""],
+                ["09:57:22", "position 3", "1500.5", " ", "47.0", "40.0", "4"]]
+        date = data_class.dt.date(2022, 11, 18)
+        columns = data_class.convert_csv_rows_to_columns(rows, date)
+        self.assertListEqual(sorted(columns.keys()), ["position 2", "position 3"])
+        for position, position_columns in columns.items():
+            bulk_data = data_class.DeviceData(use_av=True)
+            bulk_data.set_data(position_columns)
+            row_data = data_class.DeviceData(use_av=True)
+            row_data.today = date
+            for row in rows:
+                data_pkt = data_class.convert_csv_row_to_packet(row)
+                if data_pkt.get("position") == position:
+                    row_data.add_data_pkt(data_pkt, None)
+            for column in data_class.DEVICE_DATA_COLUMNS:
+                np.testing.assert_array_equal(getattr(row_data, column),
+                                              getattr(bulk_data, column),
+                                              err_msg=f"{position} {column} loaded wrong")
+        self.assertTrue(bulk_data.ask_for_missing_packets)
 
 
 class TestRollingAverage(unittest.TestCase):
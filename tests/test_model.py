@@ -7,15 +7,72 @@
 __author__ = "Kyle Vitautas Lopin"
 
 # standard libraries
+import json
 import os
 import sys
 import unittest
 from unittest import mock
 
+# installed libraries
+import numpy as np
+
 # local files
 sys.path.append(os.path.join('..', 'GUI'))
 from GUI import model
 
+MODEL_NAMES = ["device_1", "device_2", "device_3", "AV"]
+with open(os.path.join(os.path.dirname(model.__file__), model.MODEL_FILE), "r") as _file:
+    MODEL_FILE_DATA = json.load(_file)
+
+
 class TestTimeStreamDataStruct(unittest.TestCase):
     def test_models_structure(self):
         self.models = model.Models(["device_1"])
+
+
+class TestFitBatch(unittest.TestCase):
+    """ Test that fitting many spectra at once gives the
+    same values as fitting them one at a time """
+    def setUp(self) -> None:
+        self.models = model.Models(MODEL_NAMES)
+        rng = np.random.default_rng(0)
+        ref = self.models.models["device_1"].ref
+        self.raw_data = ref * rng.uniform(0.3, 0.9, (20, ref.shape[0]))
+
+    def test_fit_batch_matches_fit(self):
+        for name in MODEL_NAMES:
+            batch = self.models.fit_batch(self.raw_data, name)
+            self.assertEqual(batch.shape, (20,))
+            single = [self.models.fit(row.tolist(), name) for row in self.raw_data]
+            np.testing.assert_allclose(batch, single, rtol=1e-9,
+                                       err_msg=f"fit_batch wrong for model {name}")
+
+    def test_savitzky_golay_2d(self):
+        """ Test the SG filter of a 2-D array filters each row the same as np.convolve """
+        data = self.raw_data[:3]
+        filtered = model.savitzky_golay(data, 5, 2, deriv=1)
+        self.assertEqual(filtered.shape, (3, data.shape[1] - 4))
+        for row, filtered_row in zip(data, filtered):
+            b = np.array([[k ** i for i in range(3)] for k in range(-2, 3)])
+            m = np.linalg.pinv(b)[1]
+            np.testing.assert_allclose(filtered_row, np.convolve(m[::-1], row, mode='valid'))
+
+
+class TestCompiledModel(unittest.TestCase):
+    """ Test that the compiled models, with the SG filters folded into the
+    coefficients, give the same values as running each signal process in turn """
+    def test_compiled_matches_processes(self):
+        rng = np.random.default_rng(1)
+        for name, params in MODEL_FILE_DATA.items():
+            _model = model.Model(params)
+            raw_data = _model.ref * rng.uniform(0.3, 0.9, (10, _model.ref.shape[0]))
+            abs_data = -np.log10((raw_data - _model.dark) / _model.ref_minus_dark)
+            abs_data[np.isnan(abs_data)] = 0
+            if _model.abs_signal_process:
+                abs_data = _model.fit_signal_processes(abs_data,
+                                                       _model.abs_signal_process)
+            expected = abs_data @ _model.coeffs[:abs_data.shape[1]] + _model.constant
+            np.testing.assert_allclose(_model.fit_batch(raw_data), expected, rtol=1e-9,
+                                       err_msg=f"compiled model wrong for {name}")
+            if _model.abs_steps:  # trailing SG filters should be folded in
+                self.assertNotEqual(_model.abs_steps[-1][0], "SG")
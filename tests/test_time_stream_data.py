@@ -21,11 +21,13 @@ from unittest import mock
 
 # installed libraries
 from freezegun import freeze_time
+import numpy as np
 
 sys.path.append(os.path.join('..', 'GUI'))
 # local files
 from GUI import data_class
 from GUI import main_gui
+from GUI import packet_gaps
 
 # Test and run log files are different, but messages are the same
 logger = logging.getLogger('my_logger')
@@ -228,6 +230,8 @@ class TestAddDataPacket(unittest.TestCase):
         Delete any saved filed for the simulated test data that
         could have been made from adding a data packet
         """
+        if hasattr(self, "tsd"):  # stop the file writer before deleting its files
+            self.tsd.close()
         if os.path.exists(SAVED_FILE_PATH):
             os.remove(SAVED_FILE_PATH)
 
@@ -247,14 +251,15 @@ class TestAddDataPacket(unittest.TestCase):
             self.tsd.positions["position 2"]  # type: GUI.data_class.DeviceData
         self.assertEqual(0, returned_value,
                          msg="add_data is not returning a zero but an error code")
-        self.assertListEqual(device_data.time_series,
+        self.assertListEqual(device_data.time_series.tolist(),
                              [dt.datetime(2022, 11, 18, 9, 55, 22)],
                              msg="add_data is not saving a single time_series "
                                  "correctly")
         print(f"time series: {device_data.time_series}")
-        self.assertListEqual([-1.0], device_data.av)
-        self.assertListEqual([-20139.0], device_data.oryzanol,
+        self.assertListEqual([-1.0], device_data.av.tolist())
+        self.assertListEqual([-20139.0], device_data.oryzanol.tolist(),
                              msg="add_data is not saving a single oryzanol correctly")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual("time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                          "2022-11-18 09:55:22, position 2, -20139, -1, 48.31, 0, 1, \n",
                          get_data_file(),
@@ -277,17 +282,19 @@ class TestAddDataPacket(unittest.TestCase):
         returned_value = self.tsd.add_data(json.loads(DATA_PKT2))
         device_data = \
             self.tsd.positions["position 2"]  # type: GUI.data_class.DeviceData
-        self.assertListEqual(device_data.time_series,
+        self.assertListEqual(device_data.time_series.tolist(),
                              [dt.datetime(2022, 11, 18, 9, 55, 22),
                               dt.datetime(2022, 11, 18, 10, 5, 13)],
                              msg="add_data is not saving a second time_series "
                                  "correctly")
-        self.assertListEqual(device_data.oryzanol, [-20139.0, -20602.0],
+        self.assertListEqual(device_data.oryzanol.tolist(), [-20139.0, -20602.0],
                              msg="add_data is not saving a second oryzanol "
                                  "data packet correctly")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(returned_value, 0,
                          msg="add_data is not returning a zero but an error code"
                              "for the second packet")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(get_data_file(),
                          "time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                          "2022-11-18 09:55:22, position 2, -20139, -1, 48.31, 0, 1, \n"
@@ -299,6 +306,7 @@ class TestAddDataPacket(unittest.TestCase):
         Test that initializing data_class.TimeStreamData (done in setup) will
         create a file with the correct header
         """
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(get_data_file(), "time, position, OryConc, AV, CPUTemp,"
                                           " SensorTemp, packet_id\n",
                          msg="saved data file not being created correctly"
@@ -329,12 +337,13 @@ class TestAddDataPacket(unittest.TestCase):
             self.tsd.positions["position 2"]  # type: GUI.data_class.DeviceData
         self.assertEqual(returned_value, 222,
                          msg="add_data is not returning a zero but an error code")
-        self.assertListEqual(device_data.time_series,
+        self.assertListEqual(device_data.time_series.tolist(),
                              [dt.datetime(2022, 11, 18, 9, 55, 22)],
                              msg="add_data is not saving a single time_series "
                                  "correctly")
-        self.assertListEqual(device_data.oryzanol, [-20139.0],
+        self.assertListEqual(device_data.oryzanol.tolist(), [-20139.0],
                              msg="add_data is not saving a single oryzanol correctly")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(get_data_file(), "time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                                           "2022-11-18 09:55:22, position 2, -20139, -1, 48.31, 0, 1, \n",
                          msg=f"Saved data file is not right for test_add_data_pkt")
@@ -398,7 +407,7 @@ class TestLoadData(unittest.TestCase):
         Test that the packet ids that were loaded when from the saved
         file are correct
         """
-        self.assertListEqual(self.tsd.positions['position 2'].packet_ids,
+        self.assertListEqual(self.tsd.positions['position 2'].packet_ids.tolist(),
                              CORRECT_PACKET_IDS, msg="packet_ids not correct")
 
     def test_calc_missing_pkts(self):
@@ -408,10 +417,11 @@ class TestLoadData(unittest.TestCase):
         packet ids that are missing to ask from the sensor
         """
         device_data = self.tsd.positions['position 2']  # type: data_class.DeviceData
-        missing_pkts = self.tsd.find_next_missing_pkts(device_data, 24)
-        print(missing_pkts)
-        self.assertListEqual(missing_pkts, MISSING_PACKETS,
+        missing_ranges = self.tsd.find_next_missing_pkts(device_data, 24)
+        print(missing_ranges)
+        self.assertListEqual(packet_gaps.expand_ranges(missing_ranges), MISSING_PACKETS,
                              msg="Missing packets list wrong")
+        self.assertListEqual(missing_ranges, [[4, 11], [14, 20], [22, 23]])
 
 
 @freeze_time(TEST_DATE)
@@ -434,6 +444,8 @@ class TestAddPos1DataPacket(unittest.TestCase):
         Delete any saved filed for the simulated test data that
         could have been made from adding a data packet
         """
+        if hasattr(self, "tsd"):  # stop the file writer before deleting its files
+            self.tsd.close()
         if os.path.exists(SAVED_FILE_PATH):
             os.remove(SAVED_FILE_PATH)
 
@@ -455,14 +467,15 @@ class TestAddPos1DataPacket(unittest.TestCase):
             # print(get_data_file())
             self.assertEqual(returned_value, 0,
                              msg="add_data is not returning a zero but an error code")
-            self.assertListEqual(device_data.time_series,
+            self.assertListEqual(device_data.time_series.tolist(),
                                  [dt.datetime(2022, 11, 18, 23, 6, 13)],
                                  msg="add_data is not saving a single time_series "
                                      "correctly")
-            self.assertListEqual(device_data.oryzanol, [-20648.0],
+            self.assertListEqual(device_data.oryzanol.tolist(), [-20648.0],
                                  msg="add_data is not saving a single oryzanol correctly")
-            self.assertListEqual(device_data.av, [10.0],
+            self.assertListEqual(device_data.av.tolist(), [10.0],
                                  msg="add_data is not saving a single oryzanol correctly")
+            self.tsd.flush_files()  # wait for the file writer thread
             self.assertEqual(get_data_file(),
                              "time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                              "2022-11-18 23:06:13, position 1, -20648, 10, 47.24, 0, 46, \n",
@@ -492,6 +505,8 @@ class TestChangeDate(unittest.TestCase):
         Delete any saved filed for the simulated test data that
         could have been made from adding a data packet
         """
+        if hasattr(self, "tsd"):  # stop the file writer before deleting its files
+            self.tsd.close()
         if os.path.exists(SAVED_FILE_PATH):
             os.remove(SAVED_FILE_PATH)
         if os.path.exists(TOMORROW_FILE_PATH):
@@ -503,7 +518,7 @@ class TestChangeDate(unittest.TestCase):
         returned_value = self.tsd.add_data(json.loads(DATA_PKT_OLD))
         device_data = \
             self.tsd.positions["position 2"]  # type: GUI.data_class.DeviceData
-        self.assertListEqual(device_data.oryzanol, [],
+        self.assertListEqual(device_data.oryzanol.tolist(), [],
                              msg="add_data is not ignoring an old "
                                  "data packet correctly")
         self.assertEqual(returned_value, 201,
@@ -520,12 +535,13 @@ class TestChangeDate(unittest.TestCase):
             self.tsd.positions["position 2"]  # type: GUI.data_class.DeviceData
         self.assertEqual(returned_value, 0,
                          msg="add_data is not returning a zero but an error code")
-        self.assertListEqual(device_data.time_series,
+        self.assertListEqual(device_data.time_series.tolist(),
                              [dt.datetime(2022, 11, 18, 9, 55, 22)],
                              msg="add_data is not saving a single time_series "
                                  "correctly")
-        self.assertListEqual(device_data.oryzanol, [-20139.0],
+        self.assertListEqual(device_data.oryzanol.tolist(), [-20139.0],
                              msg="add_data is not saving a single oryzanol correctly")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(get_data_file(),
                          "time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                          "2022-11-18 09:55:22, position 2, -20139, -1, 48.31, 0, 1, \n",
@@ -544,9 +560,10 @@ class TestChangeDate(unittest.TestCase):
         self.assertEqual(returned_value, 0,
                          msg="add_data is not returning a zero but an error code"
                              "for changing the date forward")
-        self.assertListEqual(device_data.oryzanol, [-20111.0],
+        self.assertListEqual(device_data.oryzanol.tolist(), [-20111.0],
                              msg="add_data is not saving the oryzanol value for a "
                                  "data packet set for a new day")
+        self.tsd.flush_files()  # wait for the file writer thread
         self.assertEqual(get_data_file(TOMORROW_FILE_PATH),
                          "time, position, OryConc, AV, CPUTemp, SensorTemp, packet_id\n"
                          "2022-11-19 00:06:13, position 2, -20648, -5, 47.24, 0, 4, \n"
@@ -562,6 +579,8 @@ class TestUpdateGraph(unittest.TestCase):
         Delete any saved filed for the simulated test data that
         could have been made from adding a data packet
         """
+        if hasattr(self, "tsd"):  # stop the file writer before deleting its files
+            self.tsd.close()
         if os.path.exists(SAVED_FILE_PATH):
             os.remove(SAVED_FILE_PATH)
         if os.path.exists(TOMORROW_FILE_PATH):
@@ -612,7 +631,28 @@ class TestLoadPreviousData(unittest.TestCase):
                         return_value=True) as mocked_gui:
             self.tsd = data_class.TimeStreamData(mocked_gui)
 
-            self.assertListEqual(self.tsd.positions['position 2'].av, [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0, -7.0])
+            self.assertListEqual(self.tsd.positions['position 2'].av.tolist(), [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0, -7.0])
+
+    @mock.patch("GUI.data_class.USE_DAY_STORE", True)
+    def test_reload_from_day_store(self):
+        """ Test that the second start up loads the binary day store, saved
+        after the csv file was loaded, instead of the csv file """
+        with mock.patch("GUI.main_gui.RBOGUI", new_callable=mock.PropertyMock,
+                        return_value=True) as mocked_gui:
+            csv_tsd = data_class.TimeStreamData(mocked_gui)
+            csv_tsd.close()
+            with mock.patch.object(data_class.TimeStreamData,
+                                   "load_previous_data") as mocked_load:
+                binary_tsd = data_class.TimeStreamData(mocked_gui)
+            mocked_load.assert_not_called()
+        self.assertEqual(csv_tsd.positions.keys(), binary_tsd.positions.keys())
+        for position, csv_data in csv_tsd.positions.items():
+            binary_data = binary_tsd.positions[position]
+            for column in data_class.DEVICE_DATA_COLUMNS:
+                np.testing.assert_array_equal(
+                    getattr(csv_data, column), getattr(binary_data, column),
+                    err_msg=f"{position} {column} not loaded from the day store")
+        binary_tsd.close()
 
 
 @freeze_time(TEST_DATE)
@@ -634,7 +674,7 @@ class TestLoadMixedData(unittest.TestCase):
                         return_value=True) as mocked_gui:
             self.tsd = data_class.TimeStreamData(mocked_gui)
             print(self.tsd.positions)
-            self.assertListEqual(self.tsd.positions['position 2'].av, [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0, -7.0])
+            self.assertListEqual(self.tsd.positions['position 2'].av.tolist(), [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0, -7.0])
             # print(f"av: {self.tsd.positions['position 2'].av}")
 
 
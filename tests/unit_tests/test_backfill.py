@@ -0,0 +1,107 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the chunked missing packet requests in the backfill.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import backfill
+
+POSITION = "position 2"
+
+
+class TestBackfillScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root_app = mock.Mock()
+        self.sent = []
+        self.connected = True
+        self.now = 100.0
+        patcher = mock.patch.object(backfill.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backfill = backfill.BackfillScheduler(self.root_app, self.send,
+                                                   chunk_size=5, timeout=5000,
+                                                   max_in_flight=2, max_retries=1)
+
+    def send(self, position, ranges):
+        if not self.connected:
+            return False
+        self.sent.append(ranges)
+        return True
+
+    def receive(self, packet_ids):
+        for packet_id in packet_ids:
+            self.backfill.packet_received(POSITION, packet_id)
+
+    def test_chunks_and_in_flight_limit(self):
+        """ Test the gaps are split into chunks and only max_in_flight are sent """
+        self.backfill.request(POSITION, [[0, 6], [10, 12]])
+        self.assertListEqual(self.sent, [[[0, 4]], [[5, 6]]])
+        self.assertEqual(self.backfill.pending(POSITION), 3)
+        self.receive([5, 6])  # finishing a chunk sends the next one
+        self.assertListEqual(self.sent[-1], [[10, 12]])
+        # asking again does not repeat the chunks already sent
+        self.backfill.request(POSITION, [[0, 4], [10, 12]])
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual(self.backfill.pending(POSITION), 2)
+
+    def test_retry_then_abandon(self):
+        """ Test a chunk not finished in time is asked for again, then
+        given up on, and not asked for again until ABANDON_TIME passes """
+        self.backfill.request(POSITION, [[0, 4]])
+        self.receive([0, 1, 3])
+        self.now += 5
+        self.backfill._check_timeouts(POSITION)
+        self.assertListEqual(self.sent[-1], [[2, 2], [4, 4]])
+        self.now += 5
+        self.backfill._check_timeouts(POSITION)
+        self.assertEqual(self.backfill.pending(POSITION), 0)
+        self.assertEqual(self.backfill.metrics()["chunks abandoned"], 1)
+        self.backfill.request(POSITION, [[2, 2], [4, 4], [8, 8]])
+        self.assertListEqual(self.sent[-1], [[8, 8]])
+        self.now += backfill.ABANDON_TIME
+        self.backfill.request(POSITION, [[2, 2], [4, 4]])
+        self.assertListEqual(self.sent[-1], [[2, 2]])  # [8, 8] is still in flight
+        self.assertEqual(self.backfill.pending(POSITION), 3)
+
+    def test_each_abandoned_range_has_own_time(self):
+        """ Test giving up on a later chunk does not keep the packets given
+        up on before from being asked for again after ABANDON_TIME """
+        self.backfill = backfill.BackfillScheduler(self.root_app, self.send, chunk_size=5,
+                                                   timeout=5000, max_retries=0)
+        self.backfill.request(POSITION, [[0, 0]])
+        self.now += 5
+        self.backfill._check_timeouts(POSITION)
+        self.now += backfill.ABANDON_TIME - 10
+        self.backfill.request(POSITION, [[0, 0], [7, 7]])
+        self.assertListEqual(self.sent[-1], [[7, 7]])
+        self.now += 5
+        self.backfill._check_timeouts(POSITION)
+        self.now += 10
+        self.backfill.request(POSITION, [[0, 0], [7, 7]])
+        self.assertListEqual(self.sent[-1], [[0, 0]])
+        self.assertEqual(self.backfill.pending(POSITION), 1)
+
+    def test_no_connection_keeps_queue(self):
+        self.connected = False
+        self.backfill.request(POSITION, [[0, 9]])
+        self.assertEqual(self.backfill.pending(POSITION), 2)
+        self.connected = True
+        self.backfill.request(POSITION, [[0, 9]])
+        self.assertListEqual(self.sent, [[[0, 4]], [[5, 9]]])
+        self.backfill.clear()
+        self.assertEqual(self.backfill.pending(POSITION), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the ColumnStore class in the column_store.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+from datetime import datetime
+import os
+import sys
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import column_store
+
+COLUMNS = {"time": "datetime64[s]", "id": np.int32, "value": np.float32}
+
+
+class TestColumnStore(unittest.TestCase):
+    """ Test the ColumnStore keeps the columns in order and as views """
+    def setUp(self) -> None:
+        self.store = column_store.ColumnStore(COLUMNS, capacity=4)
+
+    def test_append_grows(self):
+        """ Test appending past the initial capacity keeps all the data """
+        for i in range(10):
+            self.store.append({"id": i, "value": i / 2})
+        self.assertEqual(len(self.store), 10)
+        self.assertGreaterEqual(self.store.capacity, 10)
+        self.assertListEqual(self.store["id"].tolist(), list(range(10)))
+        self.assertListEqual(self.store["value"].tolist(), [i / 2 for i in range(10)])
+
+    def test_insert_out_of_order(self):
+        """ Test inserting in the middle and the front of the columns """
+        for i in [0, 2, 3, 5]:
+            self.store.append({"id": i})
+        self.store.insert(1, {"id": 1})
+        self.store.insert(4, {"id": 4})
+        self.store.trim(5)  # frees the front, so the next insert shifts the head
+        self.store.insert(0, {"id": 0})
+        self.assertListEqual(self.store["id"].tolist(), [0, 1, 2, 3, 4, 5])
+
+    def test_search_sorted(self):
+        """ Test the binary search returns the insert index and if the value is there """
+        for i in [1, 3, 5]:
+            self.store.append({"id": i})
+        self.assertEqual(self.store.search_sorted("id", 0), (0, False))
+        self.assertEqual(self.store.search_sorted("id", 3), (1, True))
+        self.assertEqual(self.store.search_sorted("id", 4), (2, False))
+        self.assertEqual(self.store.search_sorted("id", 6), (3, False))
+
+    def test_missing_values(self):
+        """ Test that columns not given a value get their missing value """
+        self.store.append({"id": 3})
+        self.assertTrue(np.isnan(self.store["value"][0]))
+        self.assertTrue(np.isnat(self.store["time"][0]))
+
+    def test_views(self):
+        """ Test that the columns are views of the buffers, not copies """
+        self.store.append({"id": 1, "value": 1.0})
+        view = self.store["value"]
+        view[0] = 5.0
+        self.assertEqual(self.store["value"][0], 5.0)
+
+    def test_max_length(self):
+        """ Test a store with a max_length only keeps the newest points """
+        store = column_store.ColumnStore(COLUMNS, capacity=4, max_length=5)
+        for i in range(100):
+            store.append({"id": i, "time": datetime(2023, 5, 1, 0, 0, i % 60)})
+        self.assertListEqual(store["id"].tolist(), list(range(95, 100)))
+        self.assertLessEqual(store.capacity, 16)
+
+    def test_set_column(self):
+        """ Test assigning columns one at a time resizes the store """
+        self.store.set_column("id", [1, 2, 3])
+        self.store.set_column("value", [1.5, 2.5, 3.5])
+        self.assertListEqual(self.store["id"].tolist(), [1, 2, 3])
+        self.assertListEqual(self.store["value"].tolist(), [1.5, 2.5, 3.5])
+        with self.assertRaises(ValueError):
+            self.store.set_columns({"id": [1, 2], "value": [1.0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
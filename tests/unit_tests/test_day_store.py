@@ -0,0 +1,93 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the DayStore class in the day_store.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import datetime as dt
+import os
+import sys
+import tempfile
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import day_store
+
+
+def make_packet(packet_id, position="position 2", raw=False):
+    data_pkt = {"time": dt.datetime(2023, 5, 1, 10, 0, packet_id),
+                "device": position, "packet_id": packet_id,
+                "OryConc": 5000.0 + packet_id, "CPUTemp": 45.5, "SensorTemp": 30.0}
+    if raw:
+        data_pkt["Raw_data"] = [float(i) for i in range(day_store.N_WAVELENGTHS)]
+    return data_pkt
+
+
+class TestDayStore(unittest.TestCase):
+    """ Test the DayStore appends fixed-width records and reads them back """
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.store = day_store.DayStore(self.folder.name, "2023-05-01")
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_append_and_read(self):
+        """ Test the summary and raw records are saved with missing values as NaN """
+        self.store.append(make_packet(0, raw=True))
+        self.store.append(make_packet(1))
+        summary = self.store.summary()
+        self.assertIsInstance(summary, np.memmap)
+        self.assertEqual(len(self.store), 2)
+        self.assertListEqual(summary["packet_id"].tolist(), [0, 1])
+        self.assertListEqual(summary["oryzanol"].tolist(), [5000.0, 5001.0])
+        self.assertTrue(np.isnan(summary["av"]).all())
+        self.assertEqual(summary["time"][1], np.datetime64("2023-05-01T10:00:01"))
+        raw = self.store.raw()
+        self.assertEqual(raw["spectrum"].shape, (1, day_store.N_WAVELENGTHS))
+        self.assertEqual(raw["spectrum"].dtype, np.float32)
+
+    def test_partial_record_dropped(self):
+        """ Test a record cut off in the middle is ignored and removed on opening """
+        self.store.append(make_packet(0))
+        with open(self.store.summary_file, 'ab') as _file:
+            _file.write(b"half a record")
+        self.assertEqual(len(self.store.summary()), 1)
+        store = day_store.DayStore(self.folder.name, "2023-05-01")
+        self.assertEqual(os.path.getsize(store.summary_file),
+                         day_store.SUMMARY_RECORD.itemsize)
+
+    def test_columns_round_trip(self):
+        """ Test splitting records into position columns and back """
+        for i in range(3):
+            self.store.append(make_packet(i, position="position 1"))
+            self.store.append(make_packet(i, position="position 2"))
+        positions = day_store.records_to_columns(self.store.summary())
+        self.assertListEqual(sorted(positions.keys()), ["position 1", "position 2"])
+        self.assertListEqual(positions["position 1"]["packet_ids"].tolist(), [0, 1, 2])
+        records = day_store.positions_to_records(positions)
+        self.store.rewrite_summary(records)
+        self.assertEqual(len(self.store), 6)
+        self.assertEqual(len(day_store.positions_to_records({})), 0)
+
+    def test_matches_csv(self):
+        """ Test the store only matches a csv file with the same number of rows """
+        csv_file = os.path.join(self.folder.name, "2023-05-01.csv")
+        with open(csv_file, 'w') as _file:
+            _file.write("header\nrow 1\nrow 2\n")
+        self.store.append(make_packet(0))
+        self.assertFalse(self.store.matches_csv(csv_file))
+        self.store.append(make_packet(1))
+        self.assertTrue(self.store.matches_csv(csv_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for sorting the saved data files in the external_sort.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import external_sort
+
+DATA_FOLDER = os.path.join(os.path.dirname(external_sort.__file__), "data")
+SUMMARY_FILE = os.path.join(DATA_FOLDER, "2022-08-25.csv")
+RAW_FILE = os.path.join(DATA_FOLDER, "2022-08-25_raw_data.csv")
+
+
+def line_key(line, packet_id_column):
+    fields = line.split(",")
+    return fields[1].strip(), int(fields[packet_id_column])
+
+
+class TestSortCsvFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, "data.csv")
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def write_shuffled(self, source_file, n_duplicates):
+        """ Write the lines of a saved file in a random order with
+        some duplicated lines, and return the header and lines """
+        with open(source_file, 'r') as _file:
+            header, *lines = [line for line in _file if line.strip()]
+        shuffled = lines + random.Random(1).sample(lines, n_duplicates)
+        random.Random(2).shuffle(shuffled)
+        with open(self.filename, 'w') as _file:
+            _file.writelines([header] + shuffled)
+        return header, lines
+
+    def read_lines(self):
+        with open(self.filename, 'r') as _file:
+            return _file.readlines()
+
+    def test_sort_summary_file_many_runs(self):
+        """ Test a shuffled file is sorted and the duplicates removed when
+        the runs are small enough to need more than 1 merge pass """
+        header, lines = self.write_shuffled(SUMMARY_FILE, 50)
+        metrics = external_sort.sort_csv_file(self.filename, n_columns=7,
+                                              run_bytes=500, max_merge_files=3)
+        self.assertGreater(metrics["runs"], 9)
+        self.assertEqual(metrics["duplicates"], 50)
+        self.assertEqual(metrics["rows"], len(lines))
+        sorted_lines = self.read_lines()
+        self.assertEqual(sorted_lines[0], header)
+        self.assertListEqual(sorted_lines[1:], sorted(lines, key=lambda line: line_key(line, 6)))
+        self.assertListEqual(os.listdir(self.folder.name), ["data.csv"])
+
+    def test_sort_raw_file(self):
+        """ Test the raw data lines are copied without changing the values """
+        header, lines = self.write_shuffled(RAW_FILE, 10)
+        metrics = external_sort.sort_csv_file(self.filename, n_columns=304,
+                                              run_bytes=100000)
+        self.assertEqual(metrics["rows"], len(lines))
+        self.assertListEqual(self.read_lines()[1:],
+                             sorted(lines, key=lambda line: line_key(line, 2)))
+
+    def test_bad_lines_dropped(self):
+        """ Test cut off lines and lines without a packet id are dropped and
+        the first of the duplicate packets is kept """
+        with open(self.filename, 'w') as _file:
+            _file.write("time, position, OryConc, packet_id\n"
+                        "00:00:02, position 2, 5000.1, 2\n"
+                        "00:00:03, position 2, 5000.2, \n"
+                        "00:00:01, position 2, 5000.3, 1\n"
+                        "00:00:02, position 2, 5000.4, 2\n"
+                        "00:00:04, position 1, 5000.5, 3\n"
+                        "00:00:05, position 1, 50")
+        metrics = external_sort.sort_csv_file(self.filename, n_columns=4)
+        self.assertDictEqual(metrics, {"rows": 3, "duplicates": 1, "dropped": 2, "runs": 1})
+        self.assertListEqual(self.read_lines(),
+                             ["time, position, OryConc, packet_id\n",
+                              "00:00:04, position 1, 5000.5, 3\n",
+                              "00:00:01, position 2, 5000.3, 1\n",
+                              "00:00:02, position 2, 5000.1, 2\n"])
+
+    def test_no_packet_id_column(self):
+        """ Test the file is not changed if there is no packet id column """
+        with open(self.filename, 'w') as _file:
+            _file.write("time, position\n00:00:01, position 2\n")
+        with self.assertRaises(ValueError):
+            external_sort.sort_csv_file(self.filename)
+        self.assertListEqual(self.read_lines(), ["time, position\n", "00:00:01, position 2\n"])
+        self.assertListEqual(os.listdir(self.folder.name), ["data.csv"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the FileWriter class in the file_thread.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import file_thread
+
+
+class TestFileWriter(unittest.TestCase):
+    """ Test the FileWriter thread writes the queued lines in order """
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, "data.csv")
+        self.writer = file_thread.FileWriter(flush_interval=60, flush_size=1000)
+        self.writer.start()
+
+    def tearDown(self) -> None:
+        self.writer.close()
+        self.folder.cleanup()
+
+    def read_file(self, filename=None) -> str:
+        with open(filename or self.filename, encoding="utf8") as _file:
+            return _file.read()
+
+    def test_flush_writes_in_order(self):
+        """ Test lines and lists are written in order, with newlines, after a flush """
+        other_file = os.path.join(self.folder.name, "raw.csv")
+        self.writer.write_line_to_file(self.filename, "a, 1\n")
+        self.writer.write_line_to_file(other_file, ["x", "y"])
+        self.writer.write_line_to_file(self.filename, ["b", "2"])
+        self.assertFalse(os.path.isfile(self.filename),
+                         msg="lines should wait for the flush interval or size")
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(self.read_file(), "a, 1\nb, 2\n")
+        self.assertEqual(self.read_file(other_file), "x, y\n")
+        metrics = self.writer.metrics()
+        self.assertEqual(metrics["lines queued"], 3)
+        self.assertEqual(metrics["lines written"], 3)
+        self.assertEqual(metrics["batches written"], 2)
+        self.assertEqual(metrics["lines waiting"], 0)
+
+    def test_flush_size(self):
+        """ Test a batch is written when flush_size lines are waiting """
+        self.writer.close()
+        self.writer = file_thread.FileWriter(flush_interval=60, flush_size=3)
+        self.writer.start()
+        for i in range(3):
+            self.writer.write_line_to_file(self.filename, f"{i}")
+        for _ in range(100):  # wait for the thread without flushing it
+            if self.writer.metrics()["lines written"] == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.read_file(), "0\n1\n2\n")
+
+    def test_call_after_writes(self):
+        """ Test the function runs on the writer thread after the lines queued before it """
+        calls = []
+        self.writer.write_line_to_file(self.filename, "before")
+        self.writer.call_after_writes(lambda name: calls.append(self.read_file(name)),
+                                      self.filename)
+        self.writer.write_line_to_file(self.filename, "after")
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertListEqual(calls, ["before\n"])
+        self.assertEqual(self.read_file(), "before\nafter\n")
+
+    def test_close_writes_and_stops(self):
+        """ Test closing the writer writes the queued lines and ends the thread """
+        self.writer.write_line_to_file(self.filename, "last line")
+        self.writer.close(timeout=5)
+        self.assertFalse(self.writer.is_alive())
+        self.assertEqual(self.read_file(), "last line\n")
+
+    def test_write_error_retried(self):
+        """ Test lines that could not be written are kept for the next batch """
+        missing_folder = os.path.join(self.folder.name, "later")
+        filename = os.path.join(missing_folder, "data.csv")
+        self.writer.write_line_to_file(filename, "kept")
+        self.writer.flush(timeout=5)
+        self.assertEqual(self.writer.metrics()["write errors"], 1)
+        os.mkdir(missing_folder)
+        self.writer.flush(timeout=5)
+        self.assertEqual(self.read_file(filename), "kept\n")
+
+    def test_write_error_backs_off(self):
+        """ Test a file that failed is not tried again by every batch, and
+        only the newest max_retry_lines lines are kept for it """
+        self.writer.close()
+        self.writer = file_thread.FileWriter(flush_interval=60, flush_size=1,
+                                             max_retry_lines=3, retry_interval=60)
+        self.writer.start()
+        filename = os.path.join(self.folder.name, "later", "data.csv")
+        for i in range(5):
+            self.writer.write_line_to_file(filename, f"{i}")
+        self.writer.write_line_to_file(self.filename, "other file")
+        for _ in range(100):  # wait for the thread without flushing it
+            if self.writer.metrics()["lines written"] == 1:
+                break
+            time.sleep(0.01)
+        metrics = self.writer.metrics()
+        self.assertEqual(metrics["write errors"], 1)
+        self.assertEqual(metrics["lines dropped"], 2)
+        self.assertEqual(metrics["lines to retry"], 3)
+        self.assertEqual(self.read_file(), "other file\n")
+        os.mkdir(os.path.dirname(filename))
+        self.writer.flush(timeout=5)
+        self.assertEqual(self.read_file(filename), "2\n3\n4\n")
+
+    def test_close_fsyncs_written_files(self):
+        """ Test closing fsyncs the files written in earlier batches also """
+        other_file = os.path.join(self.folder.name, "raw.csv")
+        self.writer.write_line_to_file(other_file, "written before")
+        self.writer.flush(timeout=5)
+        self.writer.write_line_to_file(self.filename, "last line")
+        with mock.patch.object(file_thread.os, "fsync") as fsync:
+            self.writer.close(timeout=5)
+        self.assertEqual(fsync.call_count, 2)
+        self.assertEqual(self.writer.metrics()["fsyncs"], 2)
+
+    def test_bad_data(self):
+        with self.assertRaises(TypeError):
+            self.writer.write_line_to_file(self.filename, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the worker thread and UI queue in the ingest.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import ingest
+
+
+class TestIngestPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root_app = mock.Mock()
+        self.pipeline = ingest.IngestPipeline(self.root_app)
+        self.calls = []
+
+    def tearDown(self) -> None:
+        self.pipeline.close(timeout=5)
+
+    def record(self, name):
+        self.calls.append((name, threading.current_thread().name))
+
+    def run_ui_queue(self):
+        """ Run the UI loop the pipeline passed to root_app.after """
+        self.root_app.after.call_args.args[1]()
+
+    def test_not_started_calls_directly(self):
+        """ Test without a worker thread the functions are called now,
+        like in the tests that use TimeStreamData directly """
+        self.pipeline.submit(self.record, "work")
+        self.pipeline.call_in_ui(self.record, "ui")
+        main = threading.current_thread().name
+        self.assertListEqual(self.calls, [("work", main), ("ui", main)])
+
+    def test_worker_and_ui_threads(self):
+        """ Test submitted work runs in order on the worker thread, and the
+        UI calls it makes wait for the Tk thread to run the UI queue """
+        def handle(name):
+            self.record(name)
+            self.pipeline.call_in_ui(self.record, f"ui {name}")
+
+        self.pipeline.start()
+        for name in ["a", "b", "c"]:
+            self.pipeline.submit(handle, name)
+        self.pipeline.close(timeout=5)
+        self.assertListEqual(self.calls, [("a", "Ingest"), ("b", "Ingest"),
+                                          ("c", "Ingest")])
+        self.run_ui_queue()
+        main = threading.current_thread().name
+        self.assertListEqual(self.calls[3:], [("ui a", main), ("ui b", main),
+                                              ("ui c", main)])
+        self.assertEqual(self.pipeline.metrics()["messages handled"], 3)
+
+    def test_error_does_not_stop_worker(self):
+        self.pipeline.start()
+        self.pipeline.submit(lambda: 1 / 0)
+        self.pipeline.submit(self.record, "after error")
+        self.pipeline.close(timeout=5)
+        self.assertListEqual(self.calls, [("after error", "Ingest")])
+        self.assertEqual(self.pipeline.metrics()["errors"], 1)
+
+    def test_after_runs_on_worker(self):
+        """ Test the after method schedules the function back on the worker thread """
+        self.pipeline.start()
+        handled, done = threading.Event(), threading.Event()
+        self.pipeline.submit(lambda: self.pipeline.after(100, done.set))
+        self.pipeline.submit(handled.set)
+        self.assertTrue(handled.wait(5))
+        self.run_ui_queue()  # runs the root_app.after call the worker queued
+        wait_time, submit, func = self.root_app.after.call_args_list[-2].args
+        self.assertEqual(wait_time, 100)
+        submit(func)
+        self.assertTrue(done.wait(5))
+
+    def test_other_threads_use_ui_queue(self):
+        """ Test a UI call from a thread that is not the Tk thread, like the
+        MQTT network thread, waits for the UI queue even without a worker """
+        network = threading.Thread(target=self.pipeline.call_in_ui,
+                                   args=(self.record, "check in"), name="paho")
+        network.start()
+        network.join(5)
+        self.assertListEqual(self.calls, [])
+        self.pipeline.start()
+        self.run_ui_queue()
+        main = threading.current_thread().name
+        self.assertListEqual(self.calls, [("check in", main)])
+
+
+if __name__ == '__main__':
+    unittest.main()
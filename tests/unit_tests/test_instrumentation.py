@@ -0,0 +1,112 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the latency histograms and counters in the
+instrumentation.py file in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import logging
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import instrumentation
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """ Test the percentiles are within 1 bucket of the real times """
+        histogram = instrumentation.LatencyHistogram()
+        for us in range(1, 1001):
+            histogram.record(us / 1e6)  # 1 µs to 1 ms
+        bucket_ratio = 10 ** (1 / instrumentation.BUCKETS_PER_DECADE)
+        for percent in (50, 95, 99):
+            expected = percent / 100 * 1e-3
+            self.assertLessEqual(0.999 * expected, histogram.percentile(percent))
+            self.assertLessEqual(histogram.percentile(percent), expected * bucket_ratio)
+        self.assertEqual(histogram.percentile(100), 1e-3)
+        self.assertEqual(histogram.count, 1000)
+
+    def test_fixed_memory(self):
+        """ Test times past the last bucket go in the last bucket """
+        histogram = instrumentation.LatencyHistogram()
+        histogram.record(0.0)
+        histogram.record(1e4)
+        self.assertEqual(len(histogram.counts), len(instrumentation.BUCKET_BOUNDS))
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.summary()["max ms"], 1e7)
+
+    def test_empty(self):
+        self.assertDictEqual(instrumentation.LatencyHistogram().summary(),
+                             {"count": 0, "mean ms": 0.0, "p50 ms": 0.0,
+                              "p95 ms": 0.0, "p99 ms": 0.0, "max ms": 0.0})
+
+
+class TestInstruments(unittest.TestCase):
+    def setUp(self) -> None:
+        self.instruments = instrumentation.Instruments()
+
+    def test_timed(self):
+        """ Test the decorator times each call, even ones that raise """
+        @self.instruments.timed("stage")
+        def func(value):
+            if value is None:
+                raise ValueError
+            return value
+
+        self.assertEqual(func(5), 5)
+        with self.assertRaises(ValueError):
+            func(None)
+        self.assertEqual(self.instruments.snapshot()["stages"]["stage"]["count"], 2)
+
+    def test_counters_from_threads(self):
+        """ Test the counters do not lose counts from many threads """
+        def add():
+            for _ in range(1000):
+                self.instruments.count("packets")
+                self.instruments.record("stage", 0.001)
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = self.instruments.snapshot()
+        self.assertEqual(snapshot["counters"]["packets"], 4000)
+        self.assertEqual(snapshot["stages"]["stage"]["count"], 4000)
+        self.instruments.reset()
+        self.assertDictEqual(self.instruments.snapshot(),
+                             {"stages": {}, "counters": {}, "gauges": {}})
+
+
+class TestReporter(unittest.TestCase):
+    def test_samples_and_logs(self):
+        """ Test the reporter samples the cpu and RAM on its own timer and
+        logs the snapshot with the sources' metrics """
+        instruments = instrumentation.Instruments()
+        instruments.count("packets", 3)
+        sampled = threading.Event()
+        with mock.patch.object(instrumentation, "sample_system",
+                               side_effect=lambda _instruments: sampled.set()):
+            reporter = instrumentation.Reporter(instruments, sample_interval=0.01,
+                                                log_interval=60,
+                                                sources={"ingest": lambda: {"errors": 0}})
+            reporter.start()
+            self.assertTrue(sampled.wait(5))
+            with self.assertLogs(level=logging.INFO) as captured_logs:
+                reporter.close(5)
+        self.assertFalse(reporter.is_alive())
+        self.assertIn("'packets': 3", captured_logs.output[-1])
+        self.assertIn("'ingest': {'errors': 0}", captured_logs.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
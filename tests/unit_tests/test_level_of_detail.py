@@ -0,0 +1,84 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the min / max decimation in the level_of_detail.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import level_of_detail
+
+
+class TestMinMaxPyramid(unittest.TestCase):
+    """ Test the pyramid picks a bounded number of points and keeps the extremes """
+    def setUp(self) -> None:
+        self.y = np.random.default_rng(4).normal(0, 1, 100000)
+        self.y[12345] = 50.0
+        self.y[67890] = -50.0
+        self.y[200:300] = np.nan
+        self.pyramid = level_of_detail.MinMaxPyramid(self.y)
+
+    def test_points_bounded_by_pixels(self):
+        """ Test the whole range is decimated to about 2 points a pixel """
+        index = self.pyramid.indices(0, self.y.shape[0], 800)
+        self.assertLessEqual(index.shape[0], 2 * 800 + 2)
+        self.assertEqual(index[0], 0)
+        self.assertEqual(index[-1], self.y.shape[0] - 1)
+        self.assertTrue(np.all(np.diff(index) > 0))
+
+    def test_spikes_kept(self):
+        """ Test the largest and smallest values are always plotted """
+        index = self.pyramid.indices(0, self.y.shape[0], 100)
+        self.assertIn(12345, index)
+        self.assertIn(67890, index)
+
+    def test_zoom_gives_full_resolution(self):
+        """ Test a range with fewer points than pixels is not decimated """
+        index = self.pyramid.indices(1000, 1300, 800)
+        self.assertListEqual(index.tolist(), list(range(1000, 1300)))
+
+    def test_update_matches_new_pyramid(self):
+        """ Test updating after points are added or put in the middle gives
+        the same buckets as making the pyramid again """
+        rng = np.random.default_rng(7)
+        y = self.y[:5000]
+        pyramid = level_of_detail.MinMaxPyramid(y)
+        for _ in range(20):
+            insert_idx = int(rng.integers(0, y.shape[0] + 1))
+            n_new = int(rng.integers(1, 300))
+            y = np.insert(y, insert_idx, rng.normal(0, 3, n_new))
+            pyramid.update(y, insert_idx)
+            expected = level_of_detail.MinMaxPyramid(y)
+            self.assertEqual(pyramid.n_points, expected.n_points)
+            self.assertEqual(len(pyramid.levels), len(expected.levels))
+            for (min_index, max_index), (expected_min, expected_max) in zip(
+                    pyramid.levels, expected.levels):
+                np.testing.assert_array_equal(min_index, expected_min)
+                np.testing.assert_array_equal(max_index, expected_max)
+
+    def test_update_shorter(self):
+        """ Test updating with less data, like after the oldest points are trimmed """
+        y = self.y[:3000]
+        self.pyramid.update(y, 0)
+        np.testing.assert_array_equal(self.pyramid.indices(0, 3000, 50),
+                                      level_of_detail.MinMaxPyramid(y).indices(0, 3000, 50))
+
+    def test_visible_range(self):
+        x = np.arange(100.0)
+        self.assertEqual(level_of_detail.visible_range(x, 10.5, 20.5), (10, 22))
+        self.assertEqual(level_of_detail.visible_range(x, -10, 200), (0, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the LineBuffer class in the graph_v2.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import unittest
+from unittest import mock
+
+# installed libraries
+import matplotlib.dates as mdates
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import graph_v2
+
+START = np.datetime64("2023-05-01T08:00:00")
+
+
+def make_times(n_points):
+    return START + np.arange(n_points).astype("timedelta64[s]")
+
+
+class TestLineBuffer(unittest.TestCase):
+    """ Test the LineBuffer keeps the plotted float data of a line """
+    def setUp(self) -> None:
+        self.buffer = graph_v2.LineBuffer(capacity=4)
+
+    def test_append_only_converts_new_points(self):
+        """ Test adding points to the end only converts the new x values """
+        times = make_times(10)
+        self.buffer.update(times[:6], np.arange(6))
+        with mock.patch.object(graph_v2, "to_plot_numbers",
+                               wraps=graph_v2.to_plot_numbers) as mocked_convert:
+            self.buffer.update(times, np.arange(10), mean=np.ones(10))
+        self.assertEqual(len(mocked_convert.call_args.args[0]), 4)
+        np.testing.assert_allclose(self.buffer.x, mdates.date2num(times))
+        self.assertListEqual(self.buffer.y.tolist(), list(range(10)))
+        self.assertListEqual(self.buffer.mean.tolist(), [1.0] * 10)
+
+    def test_insert_converts_all(self):
+        """ Test a point put in the middle gives the right x data """
+        times = make_times(6)
+        self.buffer.update(np.delete(times, 2), np.arange(5))
+        self.buffer.update(times, np.arange(6))
+        np.testing.assert_allclose(self.buffer.x, mdates.date2num(times))
+        self.assertEqual(self.buffer.length, 6)
+
+    def test_insert_with_same_ends(self):
+        """ Test a point put in the middle is converted when the first and
+        last x values stay the same, like 2 packets measured in 1 second """
+        times = make_times(4)[[0, 1, 2, 3, 3]]
+        self.buffer.update(np.delete(times, 2), np.arange(4))
+        with mock.patch.object(graph_v2, "to_plot_numbers",
+                               wraps=graph_v2.to_plot_numbers) as mocked_convert:
+            self.buffer.update(times, np.arange(5))
+        self.assertEqual(len(mocked_convert.call_args.args[0]), 3)
+        np.testing.assert_allclose(self.buffer.x, mdates.date2num(times))
+
+
+    def test_plot_indices_after_insert(self):
+        """ Test the level of detail points after a point is put in the middle
+        are the same as for a new buffer with the same data """
+        rng = np.random.default_rng(3)
+        times = make_times(3000)
+        y = rng.normal(0, 1, 3000)
+        self.buffer.update(np.delete(times, 1500), np.delete(y, 1500))
+        self.buffer.plot_indices(0, 2999, 100)
+        self.buffer.update(times, y)
+        new_buffer = graph_v2.LineBuffer()
+        new_buffer.update(times, y)
+        np.testing.assert_array_equal(self.buffer.plot_indices(0, 3000, 100),
+                                      new_buffer.plot_indices(0, 3000, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
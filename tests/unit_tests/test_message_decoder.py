@@ -0,0 +1,162 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for decoding and checking the sensor messages in the
+message_decoder.py file in the GUI folder, and for the connection
+rejecting the bad ones
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import connection
+from GUI import message_decoder
+from GUI import mock_conn
+
+DATA_TOPIC = "device/device_2/data"
+STATUS_TOPIC = "device/device_2/status"
+
+
+def make_packet(packet_id: int = 7, **changes) -> dict:
+    packet = {"time": "10:00:00", "date": "2022-08-25", "packet_id": packet_id,
+              "device": "position 2", "mode": "live", "CPUTemp": "48.3",
+              "SensorTemp": 40.1, "Raw_data": [1000.5] * 301}
+    packet.update(changes)
+    return {key: value for key, value in packet.items() if value is not None}
+
+
+def encode(message) -> bytes:
+    return json.dumps(message).encode("utf8")
+
+
+class TestDecodeMessage(unittest.TestCase):
+    def test_live_packet(self):
+        message = message_decoder.decode_message(DATA_TOPIC, encode(make_packet(packet_id="7")))
+        self.assertEqual(message.kind, message_decoder.DATA)
+        self.assertEqual(message.device, "device_2")
+        self.assertEqual(message.position, "position 2")
+        self.assertEqual(message.body.packet_id, 7)
+
+    def test_saved_packets(self):
+        """ Test the bad saved packets are dropped and the good ones kept """
+        saved = {"data packets": 3, "packet 1": make_packet(1),
+                 "packet 2": make_packet(2, Raw_data="broken"),
+                 "packet 3": make_packet(3)}
+        message = message_decoder.decode_message(DATA_TOPIC, encode(saved))
+        self.assertEqual(message.kind, message_decoder.SAVED_DATA)
+        self.assertEqual([packet.packet_id for packet in message.body], [1, 3])
+        self.assertEqual(message.n_rejected, 1)
+
+    def test_all_saved_packets_bad(self):
+        saved = {"data packets": 1, "packet 1": make_packet(1, date=None)}
+        with self.assertRaises(message_decoder.MessageError):
+            message_decoder.decode_message(DATA_TOPIC, encode(saved))
+
+    def test_bad_data_packets(self):
+        """ Test each kind of malformed data packet is rejected """
+        bad_payloads = [b"{not json", encode([1, 2]), encode(5),
+                        encode(make_packet(device="position 9")),
+                        encode(make_packet(packet_id=None)),
+                        encode(make_packet(packet_id="seven")),
+                        encode(make_packet(date="25/08/2022")),
+                        encode(make_packet(time="25:00:00")),
+                        encode(make_packet(Raw_data=[])),
+                        encode(make_packet(Raw_data=None)),
+                        encode(make_packet(CPUTemp="hot"))]
+        for payload in bad_payloads:
+            with self.subTest(payload=payload[:60]):
+                with self.assertRaises(message_decoder.MessageError):
+                    message_decoder.decode_message(DATA_TOPIC, payload)
+
+    def test_status_values_not_changed(self):
+        """ Test true and false inside the values are not changed, like the
+        string replace used to """
+        status = {"status": "position 2", "running": False,
+                  "saved files": ["untrue_2022-08-25.csv", "falsetto.csv"]}
+        message = message_decoder.decode_message(STATUS_TOPIC, encode(status))
+        self.assertEqual(message.kind, message_decoder.STATUS)
+        self.assertEqual(message.body, status)
+
+    def test_python_status(self):
+        """ Test the Python dicts the older sensors send are still read """
+        payload = b"{'status': 'position 2', 'running': True, 'packets sent': 12}"
+        message = message_decoder.decode_message(STATUS_TOPIC, payload)
+        self.assertEqual(message.body, {"status": "position 2", "running": True,
+                                        "packets sent": 12})
+
+    def test_python_status_json_booleans(self):
+        """ Test the Python dicts with true and false are still read, without
+        changing true and false in the strings """
+        payload = (b"{'status': 'position 2', 'running': false, "
+                   b"'saved files': [['true_2022-08-25.csv', 'false']]}")
+        message = message_decoder.decode_message(STATUS_TOPIC, payload)
+        self.assertEqual(message.body, {"status": "position 2", "running": False,
+                                        "saved files": [["true_2022-08-25.csv", "false"]]})
+
+    def test_bad_status(self):
+        bad_payloads = [b"running", encode({"running": True}),
+                        encode({"status": "position 2", "running": "yes"}),
+                        encode({"status": "position 2", "packets sent": "12"}),
+                        b"__import__('os')"]
+        for payload in bad_payloads:
+            with self.subTest(payload=payload):
+                with self.assertRaises(message_decoder.MessageError):
+                    message_decoder.decode_message(STATUS_TOPIC, payload)
+
+    def test_bad_topics(self):
+        for topic in ["device/device_9/data", "device/device_2/control", "device"]:
+            with self.subTest(topic=topic):
+                with self.assertRaises(message_decoder.MessageError):
+                    message_decoder.decode_message(topic, encode(make_packet()))
+
+    def test_json_fallback(self):
+        """ Test the standard json module is used without orjson """
+        with mock.patch.object(message_decoder, "orjson", None):
+            self.assertEqual(message_decoder.loads(b'{"a": true}'), {"a": True})
+            with self.assertRaises(message_decoder.MessageError):
+                message_decoder.loads(b"{'a': True}")
+
+
+class TestConnectionRejects(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = mock.MagicMock()
+        self.conn = connection.BaseConnectionClass(mock.MagicMock(), "TEST", data=self.data)
+        # the instruments connection counts with, GUI.instrumentation is another copy
+        self.instruments = connection.instrumentation.INSTRUMENTS
+        self.instruments.reset()
+
+    def test_good_message(self):
+        self.conn._on_message(None, None, mock_conn.MSG(make_packet(), DATA_TOPIC))
+        self.data.ingest.submit.assert_called_once()
+        func, message = self.data.ingest.submit.call_args[0]
+        self.assertEqual(func, self.conn.parse_mqtt_data)
+        self.assertEqual(message.body.packet_id, 7)
+
+    def test_bad_message(self):
+        """ Test a malformed packet is counted and never reaches the data class """
+        self.conn._on_message(None, None, mock_conn.MSG(make_packet(date=None), DATA_TOPIC))
+        self.data.ingest.submit.assert_not_called()
+        counters = self.instruments.snapshot()["counters"]
+        self.assertEqual(counters["mqtt messages rejected"], 1)
+        self.data.ingest.call_in_ui.assert_not_called()
+
+    def test_unknown_device(self):
+        """ Test a message from a device the GUI does not have is counted as rejected """
+        self.conn._on_message(None, None, mock_conn.MSG(make_packet(), "device/device_9/data"))
+        self.data.ingest.submit.assert_not_called()
+        self.data.ingest.call_in_ui.assert_not_called()
+        counters = self.instruments.snapshot()["counters"]
+        self.assertEqual(counters["mqtt messages"], 1)
+        self.assertEqual(counters["mqtt messages rejected"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the mock sensors in the mock_conn.py file in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import time
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import mock_conn
+
+SPECTRA = np.arange(3 * 301, dtype=float).reshape(3, 301)
+
+
+class TestMockSensor(unittest.TestCase):
+    def test_packets_in_order(self):
+        """ Test a sensor with no faults sends each packet once, in order """
+        sensor = mock_conn.MockSensor("position 2", SPECTRA)
+        packets = [packet for _ in range(10) for packet in sensor.measure()]
+        self.assertEqual([packet["packet_id"] for packet in packets], list(range(10)))
+        self.assertEqual(packets[0]["device"], "position 2")
+        self.assertEqual(len(packets[0]["Raw_data"]), 301)
+        self.assertEqual(sensor.data_topic, "device/device_2/data")
+
+    def test_faults(self):
+        """ Test the dropped, duplicated and out of order packets """
+        sensor = mock_conn.MockSensor("position 1", SPECTRA, drop_rate=0.2,
+                                      duplicate_rate=0.2, reorder_rate=0.2, seed=3)
+        packet_ids = [packet["packet_id"] for _ in range(500) for packet in sensor.measure()]
+        self.assertEqual(sensor.next_packet_id, 500)
+        self.assertLess(len(set(packet_ids)), 500)  # some dropped
+        self.assertGreater(len(packet_ids), len(set(packet_ids)))  # some duplicated
+        self.assertNotEqual(packet_ids, sorted(packet_ids))  # some out of order
+
+    def test_saved_packets(self):
+        """ Test the saved packets are sent back in bursts """
+        sensor = mock_conn.MockSensor("position 3", SPECTRA, drop_rate=1.0, burst_size=4)
+        for _ in range(12):
+            self.assertEqual(sensor.measure(), [])
+        messages = sensor.saved_packets([[0, 4], [8, 20]])
+        self.assertEqual([message["data packets"] for message in messages], [4, 4, 1])
+        self.assertEqual(messages[2]["packet 11"]["packet_id"], 11)
+        self.assertEqual(messages[0]["packet 0"]["mode"], "saved")
+
+
+class TestSensorFleet(unittest.TestCase):
+    def test_fleet(self):
+        """ Test the fleet sends live packets and answers the requests """
+        sent = []
+        fleet = mock_conn.SensorFleet(lambda topic, message: sent.append((topic, message)),
+                                      ["position 1", "position 2"], rate=100,
+                                      spectra=SPECTRA, seed=1)
+        fleet.start()
+        time.sleep(0.2)
+        fleet.handle_control("device_1", {"command": "send packet",
+                                          "packet ranges": [[0, 1]]})
+        fleet.close()
+        metrics = fleet.metrics()
+        self.assertGreater(metrics["live packets sent"], 0)
+        self.assertEqual(metrics["requests"], 1)
+        self.assertEqual(metrics["saved packets sent"], 2)
+        self.assertEqual(metrics["messages sent"], len(sent))
+        self.assertEqual({topic for topic, _ in sent},
+                         {"device/device_1/data", "device/device_2/data"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for recording and replaying the MQTT messages in the
+mqtt_capture.py file in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import mqtt_capture
+
+PACKET = {"time": "10:00:00", "date": "2022-08-25", "packet_id": 7,
+          "device": "position 2", "Raw_data": [1.5, 2.5]}
+
+
+class TestCaptureFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, "day.mqtt")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def record(self, n_messages: int, flush_messages: int = 3, flush_interval: float = None):
+        writer = mqtt_capture.CaptureWriter(self.filename, flush_messages=flush_messages,
+                                            flush_interval=flush_interval)
+        for i in range(n_messages):
+            writer.record(f"device/device_{i % 3 + 1}/data",
+                          json.dumps(PACKET).encode("utf8"), qos=i % 2,
+                          timestamp=1000.0 + i)
+        return writer
+
+    def test_round_trip(self):
+        """ Test the recorded messages are read back the same """
+        self.record(10).close()
+        messages = list(mqtt_capture.read_capture(self.filename))
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(messages[4].topic, "device/device_2/data")
+        self.assertEqual(messages[4].qos, 0)
+        self.assertEqual(messages[5].timestamp, 1005.0)
+        self.assertEqual(json.loads(messages[9].payload), PACKET)
+
+    def test_append(self):
+        """ Test a second writer appends to the same capture """
+        self.record(4).close()
+        self.record(5).close()
+        self.assertEqual(len(list(mqtt_capture.read_capture(self.filename))), 9)
+
+    def test_unflushed(self):
+        """ Test only the flushed messages are in the file before close """
+        self.record(7, flush_messages=3)
+        self.assertEqual(len(list(mqtt_capture.read_capture(self.filename))), 6)
+
+    def test_cut_off(self):
+        """ Test a capture cut off in its last record is read up to that record """
+        self.record(5).close()
+        with open(self.filename, 'r+b') as _file:
+            _file.truncate(os.path.getsize(self.filename) - 10)
+        self.assertEqual(len(list(mqtt_capture.read_capture(self.filename))), 4)
+
+    def test_flush_interval(self):
+        """ Test buffered messages are written after flush_interval seconds,
+        without waiting for flush_messages more """
+        self.record(2, flush_messages=100, flush_interval=0.05)
+        for _ in range(200):
+            if len(list(mqtt_capture.read_capture(self.filename))) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(list(mqtt_capture.read_capture(self.filename))), 2)
+
+    def test_append_after_cut_off(self):
+        """ Test the messages recorded after a crash cut off a record can be read """
+        self.record(5).close()
+        with open(self.filename, 'r+b') as _file:
+            _file.truncate(os.path.getsize(self.filename) - 10)
+        self.record(3).close()
+        self.assertEqual(len(list(mqtt_capture.read_capture(self.filename))), 7)
+
+    def test_not_a_capture(self):
+        with open(self.filename, 'w') as _file:
+            _file.write("time, position\n")
+        with self.assertRaises(ValueError):
+            list(mqtt_capture.read_capture(self.filename))
+        with self.assertRaises(ValueError):
+            mqtt_capture.CaptureWriter(self.filename)
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 50.0
+        fake_time = mock.Mock()
+        fake_time.monotonic = lambda: self.now
+        fake_time.sleep = self.sleep
+        patcher = mock.patch.object(mqtt_capture, "time", fake_time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+    def test_speed(self):
+        """ Test the messages are spaced by the recorded times divided by the speed """
+        messages = [mqtt_capture.CapturedMessage(100.0 + i, "a", b"") for i in range(3)]
+        sent_times = []
+        metrics = mqtt_capture.replay(messages, lambda _: sent_times.append(self.now),
+                                      speed=20)
+        self.assertEqual(metrics["messages"], 3)
+        self.assertEqual(metrics["recorded seconds"], 2.0)
+        self.assertEqual(sent_times, [50.0, 50.05, 50.1])
+        self.assertAlmostEqual(metrics["seconds"], 0.1)
+
+    def test_late(self):
+        """ Test a message that could not be sent on time is sent right away """
+        messages = [mqtt_capture.CapturedMessage(100.0 + i, "a", b"") for i in range(3)]
+
+        def slow_handler(_):
+            self.now += 2.0
+        metrics = mqtt_capture.replay(messages, slow_handler, speed=1)
+        self.assertEqual(metrics["messages"], 3)
+        self.assertAlmostEqual(metrics["max late seconds"], 2.0)
+
+    def test_max_speed(self):
+        """ Test a day of messages is sent without waiting at speed 0 """
+        messages = [mqtt_capture.CapturedMessage(3600.0 * i, "a", b"") for i in range(25)]
+        metrics = mqtt_capture.replay(messages, lambda _: None, speed=0)
+        self.assertEqual(metrics["recorded seconds"], 86400.0)
+        self.assertLess(metrics["seconds"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
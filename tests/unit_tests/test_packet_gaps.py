@@ -0,0 +1,78 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the received packet id ranges in the packet_gaps.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import check_saved_data
+from GUI import connection
+from GUI import packet_gaps
+
+
+def slow_missing(packet_ids, stop):
+    """ Missing packet ids found by checking each id, to check against """
+    return [i for i in range(stop) if i not in packet_ids]
+
+
+class TestPacketGaps(unittest.TestCase):
+    def test_add_matches_set(self):
+        """ Test adding packets one at a time in a random order gives the
+        same runs as setting them all at once """
+        rng = np.random.default_rng(3)
+        packet_ids = rng.choice(2000, 1500, replace=False)
+        gaps = packet_gaps.PacketGaps()
+        for packet_id in packet_ids:
+            self.assertTrue(gaps.add(packet_id))
+        self.assertFalse(gaps.add(packet_ids[0]))
+        bulk_gaps = packet_gaps.PacketGaps(packet_ids)
+        self.assertListEqual(gaps.starts, bulk_gaps.starts)
+        self.assertListEqual(gaps.ends, bulk_gaps.ends)
+        for stop in [0, 1, 1000, 2500]:
+            self.assertListEqual(packet_gaps.expand_ranges(gaps.missing(stop)),
+                                 slow_missing(set(packet_ids.tolist()), stop))
+
+    def test_missing_defaults_to_last_packet(self):
+        gaps = packet_gaps.PacketGaps([1, 2, 5])
+        self.assertListEqual(gaps.missing(), [[0, 0], [3, 4]])
+        self.assertEqual(gaps.n_missing(), 3)
+        self.assertIn(2, gaps)
+        self.assertNotIn(3, gaps)
+        gaps.clear()
+        self.assertListEqual(gaps.missing(), [])
+        self.assertListEqual(gaps.missing(3), [[0, 2]])
+
+    def test_check_saved_data_ranges(self):
+        """ Test the saved data check asks for ranges of the packets the sensor has """
+        self.assertListEqual(check_saved_data.find_missing_packets([0, 1, 3, 4, 9], "12"),
+                             [[2, 2], [5, 8], [10, 11]])
+
+    def test_backfill_command(self):
+        """ Test the backfill command still has every packet number for the
+        sensors that do not read the ranges """
+        conn = connection.ConnectionClass.__new__(connection.ConnectionClass)
+        conn.publish = mock.Mock()
+        conn.ask_for_stored_data("position 2", [[2, 3], [7, 7]])
+        topic, message = conn.publish.call_args.args
+        self.assertEqual(topic, "device/device_2/control")
+        self.assertDictEqual(json.loads(message),
+                             {"command": "send packet", "packet numbers": [2, 3, 7],
+                              "packet ranges": [[2, 3], [7, 7]]})
+
+
+if __name__ == '__main__':
+    unittest.main()
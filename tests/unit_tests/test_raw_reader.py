@@ -0,0 +1,64 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for reading the raw data files in blocks in the raw_reader.py
+file in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import raw_reader
+
+RAW_FILE = os.path.join(os.path.dirname(raw_reader.__file__), "data",
+                        "2022-08-25_raw_data.csv")
+
+
+class TestReadRawBlocks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.raw_file = os.path.join(self.folder.name, "raw_data.csv")
+        shutil.copy(RAW_FILE, self.raw_file)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_blocks_match_csv_reader(self):
+        """ Test the blocks have the same rows as reading the file with csv """
+        with open(RAW_FILE, newline='') as _file:
+            rows = list(csv.reader(_file, skipinitialspace=True))[1:]
+        blocks = list(raw_reader.read_raw_blocks(self.raw_file, block_size=50))
+        self.assertListEqual([len(block) for block in blocks], [50, 50, 32])
+        self.assertEqual(blocks[0].spectra.dtype, np.float32)
+        self.assertListEqual(np.concatenate([block.packet_ids for block in blocks]).tolist(),
+                             [int(row[2]) for row in rows])
+        self.assertListEqual(np.concatenate([block.positions for block in blocks]).tolist(),
+                             [row[1] for row in rows])
+        np.testing.assert_array_equal(np.concatenate([block.spectra for block in blocks]),
+                                      np.array([row[3:] for row in rows], dtype=np.float32))
+
+    def test_bad_lines_skipped(self):
+        """ Test lines that are cut off or have bad values are skipped """
+        spectrum = ", ".join(["1000.5"] * 301)
+        with open(self.raw_file, 'a') as _file:
+            _file.write(f"01:00:00, position 2, bad, {spectrum}\n")
+            _file.write(f"01:00:01, position 2, 998, {spectrum[:-4]}abc\n")
+            _file.write("01:00:02, position 2, 999, 1200.5, 1200.1")
+        blocks = list(raw_reader.read_raw_blocks(self.raw_file, block_size=100))
+        self.assertListEqual([len(block) for block in blocks], [100, 32])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the RedrawScheduler class in the redraw_scheduler.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import redraw_scheduler
+
+
+class TestRedrawScheduler(unittest.TestCase):
+    """ Test the scheduler draws each marked plot once per frame """
+    def setUp(self) -> None:
+        self.root_app = mock.MagicMock()
+        self.scheduler = redraw_scheduler.RedrawScheduler(self.root_app, max_fps=10)
+        self.plot = mock.MagicMock()
+        self.hidden_plot = mock.MagicMock()
+        self.selected = self.plot
+        self.scheduler.register(self.plot, lambda: self.selected is self.plot)
+        self.scheduler.register(self.hidden_plot,
+                                lambda: self.selected is self.hidden_plot)
+
+    def run_after_call(self):
+        """ Run the function the scheduler passed to root_app.after """
+        delay, function = self.root_app.after.call_args.args
+        self.assertLessEqual(delay, 100)
+        function()
+
+    def test_updates_coalesced(self):
+        """ Test marking a plot many times only draws it once in one after call """
+        for _ in range(6):
+            self.scheduler.mark_dirty(self.plot)
+        self.assertEqual(self.root_app.after.call_count, 1)
+        self.plot.redraw.assert_not_called()
+        self.run_after_call()
+        self.plot.redraw.assert_called_once()
+
+    def test_hidden_plot_waits(self):
+        """ Test a plot on a hidden tab is only drawn after it is shown """
+        self.scheduler.mark_dirty(self.hidden_plot)
+        self.root_app.after.assert_not_called()
+        self.scheduler.mark_dirty(self.plot)
+        self.run_after_call()
+        self.hidden_plot.redraw.assert_not_called()
+        self.selected = self.hidden_plot
+        self.scheduler.visibility_changed()
+        self.run_after_call()
+        self.hidden_plot.redraw.assert_called_once()
+        self.plot.redraw.assert_called_once()
+
+    def test_draw_now(self):
+        """ Test draw_now cancels the scheduled frame and draws right away """
+        self.scheduler.mark_dirty(self.plot)
+        self.scheduler.draw_now()
+        self.root_app.after_cancel.assert_called_once()
+        self.plot.redraw.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for replaying MQTT captures in the replay_capture.py file in the
+tools folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import contextlib
+import datetime as dt
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from tools import replay_capture
+
+N_SENSORS = 5
+N_PACKETS = 2
+
+
+def make_packet(sensor: int, packet_id: int) -> dict:
+    now = dt.datetime.now()
+    return {"time": now.strftime("%H:%M:%S"), "date": now.strftime("%Y-%m-%d"),
+            "packet_id": packet_id, "device": f"position {sensor}", "mode": "live",
+            "CPUTemp": 45.0, "SensorTemp": 40.0,
+            "Raw_data": [200.0 + (i * 25) % 60 for i in range(301)]}
+
+
+class TestReplayCapture(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.capture = os.path.join(self.folder, "day.mqtt")
+        writer = replay_capture.mqtt_capture.CaptureWriter(self.capture)
+        for packet_id in range(N_PACKETS):
+            for sensor in range(1, N_SENSORS + 1):
+                writer.record(f"device/device_{sensor}/data",
+                              json.dumps(make_packet(sensor, packet_id)).encode("utf8"))
+        writer.close()
+        # replaying adds the positions the capture has past the GUI's 3
+        global_params = replay_capture.load_generator.global_params
+        for patcher in [mock.patch.dict(global_params.POSITIONS),
+                        mock.patch.dict(global_params.DEVICES)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.folder)
+
+    def test_count_sensors(self):
+        self.assertEqual(replay_capture.count_sensors([self.capture]), N_SENSORS)
+
+    def test_more_sensors_than_the_gui(self):
+        """ Test the messages of sensors past position 3 are all handled """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            replay_capture.main([self.capture, "--speed", "0",
+                                 "--data-dir", os.path.join(self.folder, "data")])
+        # the data class prints as it goes, the report is printed last
+        output = output.getvalue()
+        report = json.loads(output[output.index("\n{\n") + 1:])
+        self.assertEqual(report["replay"]["messages"], N_SENSORS * N_PACKETS)
+        self.assertEqual(report["ingest"]["messages handled"], N_SENSORS * N_PACKETS)
+        global_params = replay_capture.load_generator.global_params
+        self.assertEqual(global_params.DEVICES[f"device_{N_SENSORS}"], f"position {N_SENSORS}")
+
+
+if __name__ == '__main__':
+    unittest.main()
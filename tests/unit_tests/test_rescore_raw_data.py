@@ -0,0 +1,68 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the offline rescoring script tools/rescore_raw_data.py
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import model
+from tools import rescore_raw_data
+
+DATA_FOLDER = os.path.join(os.path.dirname(model.__file__), "data")
+DATE = "2022-08-25"
+
+
+class TestRescoreFile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        for name in [f"{DATE}.csv", f"{DATE}_raw_data.csv"]:
+            shutil.copy(os.path.join(DATA_FOLDER, name), self.folder.name)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def read_csv(self, name):
+        with open(os.path.join(self.folder.name, name), newline='') as _file:
+            return [[item.strip() for item in row]
+                    for row in csv.reader(_file) if row]
+
+    def test_rescore_matches_saved_values(self):
+        """ Test rescoring with the same models gives the saved summary file back,
+        with small chunks so the rows are split over many chunks """
+        result = rescore_raw_data.main([os.path.join(self.folder.name, f"{DATE}_raw_data.csv"),
+                                        "--chunk-size", "50", "--workers", "1"])
+        self.assertEqual(result, 0)
+        saved = self.read_csv(f"{DATE}.csv")
+        rescored = self.read_csv(f"{DATE}{rescore_raw_data.OUTPUT_SUFFIX}")
+        self.assertEqual(len(rescored), len(saved))
+        self.assertListEqual(rescored[0], rescore_raw_data.OUTPUT_HEADER)
+        for saved_row, rescored_row in zip(saved[1:], rescored[1:]):
+            self.assertListEqual(saved_row[:7], rescored_row)
+
+    def test_torn_rows_skipped(self):
+        """ Test a line cut off at the end of the raw data file, like after a
+        crash, is skipped and the other rows are still rescored """
+        raw_file = os.path.join(self.folder.name, f"{DATE}_raw_data.csv")
+        with open(raw_file, 'a') as _file:
+            _file.write("01:00:00, position 2, 999, 1200.5, 1200.1")
+        result = rescore_raw_data.rescore_file(raw_file, chunk_size=100)
+        self.assertEqual(result["rows"], 132)
+        saved = self.read_csv(f"{DATE}.csv")
+        rescored = self.read_csv(f"{DATE}{rescore_raw_data.OUTPUT_SUFFIX}")
+        self.assertEqual(len(rescored), len(saved))
+        self.assertNotIn("999", [row[-1] for row in rescored])
+
+
+if __name__ == '__main__':
+    unittest.main()
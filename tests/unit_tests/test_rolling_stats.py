@@ -0,0 +1,67 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the rolling statistics in the rolling_stats.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import rolling_stats
+
+
+def slow_rolling_mean(values, n_samples):
+    """ Rolling mean done one window at a time to check against """
+    return [np.nanmean(values[max(0, i - n_samples + 1):i + 1])
+            for i in range(len(values))]
+
+
+class TestRollingStats(unittest.TestCase):
+    def test_rolling_mean_matches_windows(self):
+        """ Test the cumulative sum rolling mean matches averaging each window """
+        values = np.random.default_rng(1).normal(5000, 100, 200)
+        for n_samples in [1, 5, 30]:
+            np.testing.assert_allclose(rolling_stats.rolling_mean(values, n_samples),
+                                       slow_rolling_mean(values, n_samples))
+
+    def test_update_after_inserts(self):
+        """ Test that updating only the changed windows after points are
+        inserted in random places gives the same as rebuilding the whole column """
+        rng = np.random.default_rng(2)
+        stats = rolling_stats.RollingStats(5)
+        values = np.empty(0)
+        rolling = np.empty(0)
+        for _ in range(100):
+            index = int(rng.integers(0, values.shape[0] + 1))
+            values = np.insert(values, index, rng.normal())
+            rolling = np.insert(rolling, index, np.nan)
+            stats.update(values, rolling, index)
+        np.testing.assert_allclose(rolling, stats.rebuild(values))
+
+    def test_median_and_std(self):
+        """ Test the median and standard deviation use the same windows as the mean """
+        values = np.random.default_rng(3).normal(0, 1, 50)
+        median = rolling_stats.rolling_median(values, 4)
+        std = rolling_stats.rolling_std(values, 4)
+        for i in [0, 2, 10, 49]:
+            window = values[max(0, i - 3):i + 1]
+            self.assertAlmostEqual(median[i], np.median(window))
+            self.assertAlmostEqual(std[i], np.std(window))
+
+    def test_bad_statistic(self):
+        with self.assertRaises(ValueError):
+            rolling_stats.RollingStats(5, statistic="mode")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the batch scoring of spectra in the scoring.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import datetime as dt
+import os
+import sys
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import model
+from GUI import scoring
+from GUI import sensor_packet
+
+MODEL_NAMES = ["device_1", "device_2", "device_3", "AV"]
+
+
+class TestScorer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.models = model.Models(MODEL_NAMES)
+        ref = cls.models.models["device_1"].ref
+        cls.raw_data = ref * np.random.default_rng(5).uniform(0.3, 0.9, (600, ref.shape[0]))
+
+    def test_pool_matches_models(self):
+        """ Test scoring in worker processes gives the same values, in the
+        same order, as fitting the batch in this process """
+        scorer = scoring.Scorer(self.models, n_workers=2)
+        try:
+            for name in ["device_2", "AV"]:
+                np.testing.assert_allclose(scorer.score(self.raw_data, name),
+                                           self.models.fit_batch(self.raw_data, name))
+            self.assertIsNotNone(scorer._pool, msg="big batches should use the pool")
+        finally:
+            scorer.close()
+
+    def test_score_packets(self):
+        """ Test the packets get the same values add_data_pkt would give them """
+        scorer = scoring.Scorer(self.models)
+        time = dt.datetime(2022, 11, 18, 10, 0, 0)
+        data_pkts = [sensor_packet.Packet("position 1", i, time, raw_data=raw_data)
+                     for i, raw_data in enumerate(self.raw_data[:3].astype(np.float32))]
+        data_pkts[1].position = "position 3"
+        data_pkts.append(sensor_packet.Packet("position 2", 3, time))
+        scorer.score_packets(data_pkts)
+        self.assertAlmostEqual(data_pkts[0].ory_conc,
+                               self.models.fit(data_pkts[0].raw_data, "device_1"), places=5)
+        self.assertAlmostEqual(data_pkts[2].av,
+                               self.models.fit(data_pkts[2].raw_data, "AV"), places=5)
+        self.assertAlmostEqual(data_pkts[1].ory_conc,
+                               self.models.fit(data_pkts[1].raw_data, "device_3"), places=5)
+        self.assertIsNone(data_pkts[1].av)
+        self.assertIsNone(data_pkts[3].ory_conc)
+
+
+if __name__ == '__main__':
+    unittest.main()
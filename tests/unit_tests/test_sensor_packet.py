@@ -0,0 +1,93 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the typed data packets in the sensor_packet.py file
+in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import datetime as dt
+import os
+import sys
+import unittest
+
+# installed libraries
+import numpy as np
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import sensor_packet
+
+DATA_PKT = {"time": "09:55:22", "date": "2022-11-18", "packet_id": "1",
+            "device": "position 2 ", "mode": "live", "OryConc": -20139,
+            "CPUTemp": "48.31", "SensorTemp": 0, "Raw_data": [1211.37, 1207.14, 1206.6]}
+
+
+class TestPacket(unittest.TestCase):
+    def test_from_dict(self):
+        """ Test the values of a sensor's packet are converted once """
+        packet = sensor_packet.Packet.from_dict(DATA_PKT)
+        self.assertEqual(packet.position, "position 2")
+        self.assertEqual(packet.packet_id, 1)
+        self.assertEqual(packet.time, dt.datetime(2022, 11, 18, 9, 55, 22))
+        self.assertEqual(packet.date, dt.date(2022, 11, 18))
+        self.assertEqual(packet.mode, "live")
+        self.assertEqual(packet.ory_conc, -20139.0)
+        self.assertEqual(packet.cpu_temp, 48.31)
+        self.assertIsNone(packet.av)
+        self.assertEqual(packet.raw_data.dtype, np.float32)
+        self.assertEqual(packet.raw_data.shape, (3,))
+
+    def test_csv_row(self):
+        """ Test a csv row is read back to the same csv line """
+        row = {"time": "2022-11-18 10:05:13", "position": "position 2",
+               "OryConc": "5000.1", "AV": "", "CPUTemp": "48.3",
+               "SensorTemp": "41.79", "packet_id": "3"}
+        packet = sensor_packet.Packet.from_dict(row)
+        self.assertIsNone(packet.av)
+        self.assertEqual(packet.csv_values(),
+                         ["2022-11-18 10:05:13", "position 2", "5000.1", "",
+                          "48.3", "41.79", "3"])
+
+    def test_no_date(self):
+        """ Test a time without a date is given the date asked for """
+        packet = sensor_packet.Packet.from_dict({"time": "10:00:00", "packet_id": 2,
+                                                 "position": "position 1"},
+                                                today=dt.date(2022, 8, 25))
+        self.assertEqual(packet.time, dt.datetime(2022, 8, 25, 10))
+
+    def test_bad_packets(self):
+        bad_packets = [({"time": "10:00:00", "packet_id": 2}, KeyError),
+                       (dict(DATA_PKT, packet_id="x"), ValueError),
+                       (dict(DATA_PKT, time="25:00:00"), ValueError),
+                       (dict(DATA_PKT, CPUTemp="hot"), ValueError)]
+        for data_pkt, error in bad_packets:
+            with self.subTest(data_pkt=data_pkt):
+                with self.assertRaises(error):
+                    sensor_packet.Packet.from_dict(data_pkt)
+
+    def test_to_dict(self):
+        """ Test to_dict gives back a packet like the sensor sent """
+        data_pkt = sensor_packet.Packet.from_dict(DATA_PKT).to_dict()
+        self.assertEqual(data_pkt["device"], "position 2")
+        self.assertEqual(data_pkt["time"], "09:55:22")
+        self.assertEqual(data_pkt["date"], "2022-11-18")
+        self.assertNotIn("AV", data_pkt)
+        np.testing.assert_allclose(data_pkt["Raw_data"], DATA_PKT["Raw_data"], rtol=1e-6)
+
+    def test_as_packet(self):
+        packet = sensor_packet.as_packet(DATA_PKT)
+        self.assertIs(sensor_packet.as_packet(packet), packet)
+
+    def test_slots(self):
+        """ Test the packets have no __dict__, so a misspelled value is an error """
+        packet = sensor_packet.Packet.from_dict(DATA_PKT)
+        self.assertFalse(hasattr(packet, "__dict__"))
+        with self.assertRaises(AttributeError):
+            packet.OryConc = 5000.0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Unit tests for the write ahead log of the saved data lines in the
+write_ahead_log.py file in the GUI folder
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join('..', '..', 'GUI'))
+# local files
+from GUI import file_thread
+from GUI import write_ahead_log
+
+HEADER = ["time", "position", "OryConc", "AV", "CPUTemp", "SensorTemp", "packet_id"]
+
+
+def make_line(packet_id, position="position 2", oryzanol="5000.1"):
+    return f"00:00:{packet_id:02d}, {position}, {oryzanol}, , 40.1, 40.2, {packet_id}, \n"
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.folder.name, "day.wal")
+        self.csv_file = os.path.join(self.folder.name, "day.csv")
+        self.wal = write_ahead_log.WriteAheadLog(self.log_file)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def read_csv(self):
+        with open(self.csv_file, 'r') as _file:
+            return _file.readlines()
+
+    def test_replay(self):
+        """ Test the logged lines are read back in order and a cut off
+        record at the end is dropped from the file """
+        lines = [make_line(i) for i in range(3)]
+        for line in lines:
+            self.wal.append(line)
+        good_size = os.path.getsize(self.log_file)
+        with open(self.log_file, 'ab') as _file:
+            _file.write(write_ahead_log.encode_record(make_line(3))[:-5])
+        self.assertListEqual(self.wal.replay(), lines)
+        self.assertEqual(os.path.getsize(self.log_file), good_size)
+        self.wal.append(make_line(4))
+        self.assertListEqual(self.wal.replay(), lines + [make_line(4)])
+
+    def test_bad_checksum(self):
+        """ Test records from a corrupt record on are not replayed """
+        self.wal.append(make_line(1))
+        self.wal.append(make_line(2))
+        with open(self.log_file, 'r+b') as _file:
+            _file.seek(-3, os.SEEK_END)
+            _file.write(b"999")
+        self.assertListEqual(self.wal.replay(), [make_line(1)])
+
+    def test_compact(self):
+        """ Test the logged lines are merged into the sorted csv file, a
+        line cut off in the csv file is replaced by the logged line, and
+        the log is started over """
+        with open(self.csv_file, 'w') as _file:
+            _file.write(", ".join(HEADER) + ", \n")
+            _file.writelines([make_line(5), make_line(1, "position 1"), make_line(2)[:20]])
+        self.wal.append(make_line(2))
+        self.wal.append(make_line(3))
+        self.wal.append(make_line(5))
+        metrics = self.wal.compact(self.csv_file, HEADER)
+        self.assertListEqual(self.read_csv(), [", ".join(HEADER) + ", \n",
+                                               make_line(1, "position 1"), make_line(2),
+                                               make_line(3), make_line(5)])
+        self.assertEqual(metrics["duplicates"], 1)
+        self.assertEqual(metrics["dropped"], 1)
+        self.assertFalse(os.path.exists(self.log_file))
+        self.assertEqual(self.wal.metrics()["records compacted"], 3)
+        self.assertListEqual(os.listdir(self.folder.name), ["day.csv"])
+
+    def test_compact_no_csv_file(self):
+        """ Test the csv file is made if there is only the log """
+        self.wal.append(make_line(2))
+        self.wal.append(make_line(1))
+        self.wal.compact(self.csv_file, HEADER)
+        self.assertListEqual(self.read_csv(), [", ".join(HEADER) + "\n",
+                                               make_line(1), make_line(2)])
+
+    def test_group_commit(self):
+        """ Test the file writer writes the records in 1 batch with 1 fsync """
+        writer = file_thread.FileWriter(flush_interval=60, flush_size=1000)
+        writer.start()
+        self.wal.file_writer = writer
+        try:
+            for i in range(10):
+                self.wal.append(make_line(i))
+            self.assertFalse(os.path.exists(self.log_file))
+            writer.flush()
+            self.assertEqual(len(self.wal.replay()), 10)
+            self.assertEqual(writer.metrics()["fsyncs"], 1)
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,35 @@
 # Copyright (c) 2022 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
 
 """
-Script to listen to traffic that is coming from the HIVEMQ broker
+Script to listen to traffic that is coming from the HIVEMQ broker, or a
+local broker with --host, and record it to a capture file that
+tools/replay_capture.py can play back through the GUI's connection.
+
+Usage:
+    python tools/hivemq_listener.py
+    python tools/hivemq_listener.py --output day.mqtt --quiet
+    python tools/hivemq_listener.py --host localhost --port 1883 --output day.mqtt
 """
 
 __author__ = "Kyle Vitautus Lopin"
 
 # standard libraries
+import argparse
 import os
-import time
+import sys
 
 # installed libraries
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 
-MQTT_PATH_LISTEN = "device/+/data"
-MQTT_STATUS_CHANNEL = "device/+/status"
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
+sys.path.append(os.path.join(__location__, '..', 'GUI'))
+# local files
+import mqtt_capture
+
+MQTT_PATH_LISTEN = "device/+/data"
+MQTT_STATUS_CHANNEL = "device/+/status"
 pem_path = os.path.join(__location__, '..', 'GUI', "isrgrootx1.pem")
 PEM_FILE = os.path.abspath(pem_path)
 env_file = os.path.join(__location__, '..', 'GUI', '.env')
@@ -29,12 +41,9 @@ HIVEMQTT_PORT = 8883
 MQTT_VERSION = mqtt.MQTTv5
 
 
-print(HIVEMQTT_SERVER)
-
-
 def on_connection(client: mqtt.Client, *args):
     print("Connected")
-    client.subscribe(MQTT_PATH_LISTEN)
+    client.subscribe(MQTT_PATH_LISTEN, qos=1)
     client.subscribe(MQTT_STATUS_CHANNEL)
 
 
@@ -42,21 +51,55 @@ def on_subscription(*args):
     print(f"got subscription: {args}")
 
 
-def on_message(client, _, msg: mqtt.MQTTMessage):
-    print(f"topic: {msg.topic}")
-    print(f"data: {msg.payload}")
-
-
-client = mqtt.Client(protocol=MQTT_VERSION)
-client.on_connect = on_connection
-client.on_message = on_message
-client.on_subscribe = on_subscription
-
-client.tls_set(PEM_FILE,
-               tls_version=mqtt.ssl.PROTOCOL_TLS)
-client.username_pw_set(username=HIVEMQTT_USERNAME,
-                       password=HIVEMQTT_PASSWORD)
-client.connect(HIVEMQTT_SERVER, HIVEMQTT_PORT)
-client.loop_forever()
-while True:
-    time.sleep(10)
+def make_on_message(writer: mqtt_capture.CaptureWriter = None, quiet: bool = False):
+    """ Make the message callback, that prints and / or records each message """
+    def on_message(client, _, msg: mqtt.MQTTMessage):
+        if writer:
+            writer.record(msg.topic, msg.payload, msg.qos)
+        if not quiet:
+            print(f"topic: {msg.topic}")
+            print(f"data: {msg.payload}")
+    return on_message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listen to and record the sensors' MQTT messages")
+    parser.add_argument("--output", default=None,
+                        help="capture file to append the messages to")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not print the messages")
+    parser.add_argument("--host", default=None,
+                        help="broker to listen to without TLS, default is the HIVEMQ server")
+    parser.add_argument("--port", type=int, default=1883,
+                        help="port of the --host broker")
+    args = parser.parse_args(argv)
+
+    writer = mqtt_capture.CaptureWriter(args.output) if args.output else None
+    client = mqtt.Client(protocol=MQTT_VERSION)
+    client.on_connect = on_connection
+    client.on_message = make_on_message(writer, args.quiet)
+    client.on_subscribe = on_subscription
+
+    if args.host:
+        client.connect(args.host, args.port)
+    else:
+        print(HIVEMQTT_SERVER)
+        client.tls_set(PEM_FILE,
+                       tls_version=mqtt.ssl.PROTOCOL_TLS)
+        client.username_pw_set(username=HIVEMQTT_USERNAME,
+                               password=HIVEMQTT_PASSWORD)
+        client.connect(HIVEMQTT_SERVER, HIVEMQTT_PORT)
+    try:
+        client.loop_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        if writer:
+            writer.close()
+            print(f"recorded {writer.n_messages} messages to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
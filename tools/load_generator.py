@@ -0,0 +1,244 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Simulate a fleet of sensors to stress test the GUI's data path and the
+backfill of missed packets, without the hardware.
+
+With --transport direct (the default) the GUI's data classes are made
+headless, with the data files in a temporary folder, and the sensors'
+messages are given straight to connection.BaseConnectionClass._on_message.
+When the sensors stop, the packets each position received are checked
+against the packets the sensors measured, and the throughput, backfill,
+ingest and stage latency metrics are printed.
+
+With --transport mqtt the messages are published to a MQTT broker, i.e.
+a local mosquitto, for a running GUI to receive, and the "send packet"
+commands on the control topics are answered.
+
+With --record the messages are also saved to a capture file that
+tools/replay_capture.py can play back.
+
+Sensors past the 3 in global_params are added as "position 4", etc.,
+and use the models of the first 3 in turn.
+
+Usage:
+    python tools/load_generator.py --sensors 10 --rate 5 --duration 60 --drop 0.05
+    python tools/load_generator.py --transport mqtt --host localhost --sensors 3
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+from unittest import mock
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+sys.path.append(os.path.join(__location__, '..', 'GUI'))
+# local files
+import connection
+import data_class
+import global_params
+import instrumentation
+import mock_conn
+import mqtt_capture
+import scoring
+
+N_BASE_SENSORS = len(global_params.POSITIONS)
+
+
+class _Ignore:
+    """ Stand in for the GUI widgets, every method call does nothing """
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class HeadlessRoot:
+    """ Stand in for the Tk root, after calls are run on timer threads """
+    def __init__(self):
+        self.graphs = _Ignore()
+        self.info = _Ignore()
+
+    def after(self, wait_time: int, func, *args) -> threading.Timer:
+        timer = threading.Timer(wait_time / 1000, func, args)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    @staticmethod
+    def after_cancel(timer: threading.Timer):
+        if timer is not None:
+            timer.cancel()
+
+
+def add_positions(n_sensors: int) -> List[str]:
+    """ Get the positions of n_sensors sensors, adding any past the
+    ones in global_params """
+    for i in range(N_BASE_SENSORS + 1, n_sensors + 1):
+        global_params.POSITIONS[f"position {i}"] = f"device_{i}"
+        global_params.DEVICES[f"device_{i}"] = f"position {i}"
+    return [f"position {i}" for i in range(1, n_sensors + 1)]
+
+
+def make_data(data_dir: str, n_sensors: int,
+              scoring_workers: int) -> data_class.TimeStreamData:
+    """ Make the data class headless, saving to data_dir """
+    os.makedirs(os.path.join(data_dir, "data"), exist_ok=True)
+    with mock.patch.object(data_class, "__location__", data_dir):
+        data = data_class.TimeStreamData(HeadlessRoot())
+    for i in range(N_BASE_SENSORS + 1, n_sensors + 1):  # share the first models
+        data.models.models[f"device_{i}"] = data.models.models[f"device_{(i - 1) % N_BASE_SENSORS + 1}"]
+    if n_sensors > N_BASE_SENSORS:
+        scoring_workers = 0  # the worker processes only have the models in the model file
+    data.scorer.close()
+    data.scorer = scoring.Scorer(data.models, n_workers=scoring_workers)
+    return data
+
+
+def recorded(publish: Callable[[str, dict], None],
+             writer: mqtt_capture.CaptureWriter = None) -> Callable[[str, dict], None]:
+    """ Wrap the fleet's publish function to also save each message to the capture """
+    if writer is None:
+        return publish
+
+    def publish_and_record(topic: str, message: dict):
+        writer.record(topic, json.dumps(message).encode("utf8"), qos=1)
+        publish(topic, message)
+    return publish_and_record
+
+
+def run_direct(args, positions: List[str],
+               writer: mqtt_capture.CaptureWriter = None) -> dict:
+    """ Send the fleet's messages to a headless copy of the GUI's data path """
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="load_generator_")
+    data = make_data(data_dir, len(positions), args.scoring_workers)
+    conn = connection.BaseConnectionClass(data.root_app, "LOAD GENERATOR", data=data)
+    fleet = mock_conn.SensorFleet(recorded(
+        lambda topic, message: conn._on_message(None, None, mock_conn.MSG(message, topic)),
+        writer), positions, rate=args.rate, seed=args.seed, drop_rate=args.drop,
+        duplicate_rate=args.duplicate, reorder_rate=args.reorder,
+        burst_size=args.burst_size)
+    data.add_connection(fleet)  # the backfill requests go to the fleet
+    data.ingest.start()
+    start = time.perf_counter()
+    fleet.start()
+    time.sleep(args.duration)
+    fleet.close()
+    # let the backfill finish asking for the packets that were dropped
+    deadline = time.monotonic() + args.settle
+    while time.monotonic() < deadline and data.backfill.metrics()["chunks pending"]:
+        time.sleep(0.1)
+        fleet._answer_requests()
+    data.ingest.close()
+    seconds = time.perf_counter() - start
+    received = {}
+    for position, sensor in fleet.sensors.items():
+        device_data = data.positions.get(position)
+        n_missing = (device_data.packet_gaps.n_missing(sensor.next_packet_id)
+                     if device_data else sensor.next_packet_id)
+        received[position] = {"measured": sensor.next_packet_id,
+                              "received": sensor.next_packet_id - n_missing,
+                              "missing": n_missing}
+    report = {"seconds": round(seconds, 2), "fleet": fleet.metrics(),
+              "messages per s": round(fleet.metrics()["messages sent"] / seconds, 1),
+              "positions": received, "ingest": data.ingest.metrics(),
+              "backfill": data.backfill.metrics(),
+              "stages": instrumentation.INSTRUMENTS.snapshot()["stages"],
+              "data folder": data_dir}
+    data.close()
+    return report
+
+
+def run_mqtt(args, positions: List[str],
+             writer: mqtt_capture.CaptureWriter = None) -> dict:
+    """ Publish the fleet's messages to a MQTT broker and answer the
+    control messages from the GUI """
+    import paho.mqtt.client as mqtt  # only needed for this transport
+
+    client = mqtt.Client("load generator")
+    fleet = mock_conn.SensorFleet(recorded(
+        lambda topic, message: client.publish(topic, json.dumps(message), qos=1),
+        writer), positions, rate=args.rate, seed=args.seed, drop_rate=args.drop,
+        duplicate_rate=args.duplicate, reorder_rate=args.reorder,
+        burst_size=args.burst_size)
+
+    def on_message(_client, _userdata, msg):
+        try:
+            fleet.handle_control(msg.topic.split("/")[1], json.loads(msg.payload))
+        except (ValueError, KeyError) as _error:
+            print(f"Could not handle control message {msg.payload}: {_error}")
+
+    client.on_message = on_message
+    client.connect(args.host, args.port)
+    client.subscribe(connection.CONTROL_TOPIC, qos=1)
+    client.loop_start()
+    start = time.perf_counter()
+    fleet.start()
+    time.sleep(args.duration)
+    fleet.close()
+    client.loop_stop()
+    client.disconnect()
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 2), "fleet": fleet.metrics(),
+            "messages per s": round(fleet.metrics()["messages sent"] / seconds, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a fleet of sensors")
+    parser.add_argument("--sensors", type=int, default=N_BASE_SENSORS,
+                        help="number of sensors to simulate")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="packets per second from each sensor, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="seconds to send live packets for")
+    parser.add_argument("--drop", type=float, default=0.0,
+                        help="chance a live packet is dropped, it is still saved on the sensor")
+    parser.add_argument("--duplicate", type=float, default=0.0,
+                        help="chance a live packet is sent twice")
+    parser.add_argument("--reorder", type=float, default=0.0,
+                        help="chance a live packet is sent after the next one")
+    parser.add_argument("--burst-size", type=int, default=mock_conn.BURST_SIZE,
+                        help="saved packets in each reply to a backfill request")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the faults")
+    parser.add_argument("--transport", choices=["direct", "mqtt"], default="direct")
+    parser.add_argument("--host", default=connection.MQTT_LOCALHOST,
+                        help="MQTT broker for the mqtt transport")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--data-dir", default=None,
+                        help="folder to save the data files in, default is a new temporary folder")
+    parser.add_argument("--scoring-workers", type=int, default=0,
+                        help="scoring processes for the saved packet bursts")
+    parser.add_argument("--settle", type=float, default=30.0,
+                        help="most seconds to wait for the backfill after the sensors stop")
+    parser.add_argument("--record", default=None,
+                        help="capture file to also save the sensors' messages to")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log every packet, like the GUI does")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    positions = add_positions(args.sensors)
+    writer = mqtt_capture.CaptureWriter(args.record) if args.record else None
+    try:
+        if args.transport == "direct":
+            report = run_direct(args, positions, writer)
+        else:
+            report = run_mqtt(args, positions, writer)
+    finally:
+        if writer:
+            writer.close()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
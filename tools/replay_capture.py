@@ -0,0 +1,115 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Replay MQTT capture files, recorded with tools/hivemq_listener.py or
+tools/load_generator.py --record, through
+connection.BaseConnectionClass._on_message without a broker, to
+reproduce a problem from the field or profile a day of traffic.
+
+The GUI's data classes are made headless like in tools/load_generator.py,
+with the data files in a temporary folder.  The messages are sent with
+the spacing they were recorded with divided by --speed, or as fast as
+possible with --speed 0.  By default each message is handled on the
+replay thread, so --profile sees all of the work; --threaded uses the
+ingest worker thread like the GUI does.  No backfill requests are sent,
+the capture already has the sensors' replies to the GUI's requests.
+Captures of more sensors than the GUI has, from load_generator.py
+--sensors, get the extra positions added like the load generator does.
+
+Usage:
+    python tools/replay_capture.py day.mqtt --speed 0
+    python tools/replay_capture.py day.mqtt --speed 60 --threaded
+    python tools/replay_capture.py day.mqtt --speed 0 --profile 25
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import argparse
+import cProfile
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import tempfile
+from typing import List
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+sys.path.append(os.path.join(__location__, '..', 'GUI'))
+sys.path.append(__location__)  # for load_generator when this is imported
+# local files
+import connection
+import instrumentation
+import load_generator
+import mqtt_capture
+
+DEVICE_TOPIC = re.compile(r"device/device_(\d+)/")
+
+
+def count_sensors(captures: List[str]) -> int:
+    """ Get the highest sensor number in the topics of the captures,
+    at least load_generator.N_BASE_SENSORS """
+    n_sensors = load_generator.N_BASE_SENSORS
+    for capture in captures:
+        for message in mqtt_capture.read_capture(capture):
+            match = DEVICE_TOPIC.match(message.topic)
+            if match:
+                n_sensors = max(n_sensors, int(match.group(1)))
+    return n_sensors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay MQTT capture files through the GUI's data path")
+    parser.add_argument("captures", nargs="+", help="capture files to replay, in order")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="times faster than recorded to replay, 0 for as fast as possible")
+    parser.add_argument("--threaded", action="store_true",
+                        help="handle the messages on the ingest worker thread, like the GUI")
+    parser.add_argument("--data-dir", default=None,
+                        help="folder to save the data files in, default is a new temporary folder")
+    parser.add_argument("--profile", type=int, default=0,
+                        help="profile the replay and print the functions with the most "
+                             "cumulative time, this many of them")
+    parser.add_argument("--verbose", action="store_true",
+                        help="log every packet, like the GUI does")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    if args.profile and args.threaded:
+        parser.error("--profile only sees the replay thread, do not use it with --threaded")
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="replay_capture_")
+    n_sensors = count_sensors(args.captures)
+    load_generator.add_positions(n_sensors)
+    data = load_generator.make_data(data_dir, n_sensors, scoring_workers=0)
+    conn = connection.BaseConnectionClass(data.root_app, "REPLAY", data=data)
+    if args.threaded:
+        data.ingest.start()
+    messages = itertools.chain.from_iterable(mqtt_capture.read_capture(capture)
+                                             for capture in args.captures)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    metrics = mqtt_capture.replay(messages,
+                                  lambda message: conn._on_message(None, None, message),
+                                  speed=args.speed)
+    data.ingest.close()
+    if profiler:
+        profiler.disable()
+    metrics["messages per s"] = round(metrics["messages"] / max(metrics["seconds"], 1e-9), 1)
+    report = {"replay": metrics, "ingest": data.ingest.metrics(),
+              "stages": instrumentation.INSTRUMENTS.snapshot()["stages"],
+              "data folder": data_dir}
+    data.close()
+    print(json.dumps(report, indent=2))
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# Copyright (c) 2023 Kyle Lopin (Naresuan University) <kylel@nu.ac.th>
+
+"""
+Rescore saved raw spectra with the current (or another) model file.
+
+After a recalibration the OryConc and AV values in the data/*.csv files
+are still from the old models.  This reads each YYYY-MM-DD_raw_data.csv
+file in blocks with raw_reader, scores each block with
+model.Models.fit_batch, and writes a YYYY-MM-DD_rescored.csv summary
+file with the new values.
+The temperatures are copied from the day's summary file if it is next
+to the raw data file.  The files are rescored in parallel, one file
+per worker process.
+
+Usage:
+    python tools/rescore_raw_data.py GUI/data/2023-01-*_raw_data.csv
+    python tools/rescore_raw_data.py --models new_models.json --output-dir rescored GUI/data
+"""
+
+__author__ = "Kyle Vitautas Lopin"
+
+# standard libraries
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import glob
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# installed libraries
+import numpy as np
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+sys.path.append(os.path.join(__location__, '..', 'GUI'))
+# local files
+import global_params
+import model
+import raw_reader
+
+CHUNK_SIZE = raw_reader.BLOCK_SIZE  # rows of the raw data file scored at once
+RAW_SUFFIX = "_raw_data.csv"
+OUTPUT_SUFFIX = "_rescored.csv"
+# same columns as the summary files the GUI saves
+OUTPUT_HEADER = ["time", "position", "OryConc", "AV", "CPUTemp", "SensorTemp", "packet_id"]
+
+
+def read_temperatures(summary_file: str) -> Dict[Tuple[str, str], Tuple[str, str]]:
+    """ Get the CPU and sensor temperatures for each (position, packet id)
+    in a summary file, empty if the file is missing """
+    temperatures = {}
+    if not os.path.isfile(summary_file):
+        return temperatures
+    with open(summary_file, 'r', newline='') as _file:
+        reader = csv.reader(_file, skipinitialspace=True)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 7:
+                temperatures[(row[1].strip(), row[6].strip())] = (row[4], row[5])
+    return temperatures
+
+
+def score_block(models: model.Models,
+                block: raw_reader.RawBlock) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score a block of spectra with the model of each row's position.
+
+    Returns:
+        tuple: oryzanol and acid values of each row, NaN if there is no model
+    """
+    oryzanol = np.full(len(block), np.nan)
+    av = np.full(len(block), np.nan)
+    for position in np.unique(block.positions):
+        if position not in global_params.POSITIONS:
+            continue
+        rows = block.positions == position
+        oryzanol[rows] = models.fit_batch(block.spectra[rows],
+                                          global_params.POSITIONS[position])
+        if position == "position 1":
+            av[rows] = models.fit_batch(block.spectra[rows], "AV")
+    return oryzanol, av
+
+
+def rescore_file(raw_file: str, output_dir: str = None,
+                 model_file: str = None, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Rescore 1 raw data file and write its rescored summary file.
+
+    Args:
+        raw_file (str): YYYY-MM-DD_raw_data.csv file to rescore
+        output_dir (str): folder to save the rescored file in, None for
+        the folder of the raw data file
+        model_file (str): model json file to use, None for the GUI's model file
+        chunk_size (int): rows to score at once
+
+    Returns:
+        dict: output file name, number of rows scored and seconds taken
+    """
+    start = time.perf_counter()
+    if model_file:
+        model.MODEL_FILE = os.path.abspath(model_file)
+    models = model.Models(list(global_params.DEVICES.keys()) + ["AV"])
+    folder, name = os.path.split(raw_file)
+    date = name.replace(RAW_SUFFIX, "")
+    temperatures = read_temperatures(os.path.join(folder, f"{date}.csv"))
+    output_file = os.path.join(output_dir or folder, f"{date}{OUTPUT_SUFFIX}")
+    n_rows = 0
+    with open(output_file + ".tmp", 'w', newline='') as _file:
+        writer = csv.writer(_file)
+        writer.writerow(OUTPUT_HEADER)
+        for block in raw_reader.read_raw_blocks(raw_file, chunk_size):
+            oryzanol, av = score_block(models, block)
+            for _time, position, packet_id, ory, acid in zip(
+                    block.times, block.positions, block.packet_ids, oryzanol, av):
+                cpu_temp, sensor_temp = temperatures.get((position, str(packet_id)),
+                                                         ("", ""))
+                writer.writerow([_time, position,
+                                 "" if np.isnan(ory) else f"{ory:.1f}",
+                                 "" if np.isnan(acid) else f"{acid:.1f}",
+                                 cpu_temp, sensor_temp, packet_id])
+            n_rows += len(block)
+    os.replace(output_file + ".tmp", output_file)  # no half written files
+    return {"output file": output_file, "rows": n_rows,
+            "seconds": time.perf_counter() - start}
+
+
+def find_raw_files(paths: List[str]) -> List[str]:
+    """ Get the raw data files from the paths, folders are searched for them """
+    raw_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            raw_files.extend(sorted(glob.glob(os.path.join(path, f"*{RAW_SUFFIX}"))))
+        else:
+            raw_files.extend(sorted(glob.glob(path)))
+    return raw_files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rescore raw spectrum files with a model file")
+    parser.add_argument("paths", nargs="+",
+                        help=f"*{RAW_SUFFIX} files, or folders with them")
+    parser.add_argument("--models", default=None,
+                        help=f"model json file, default is the GUI's {model.MODEL_FILE}")
+    parser.add_argument("--output-dir", default=None,
+                        help="folder for the rescored files, default is next to each raw file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of files to rescore at once")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows of a file to score at once")
+    args = parser.parse_args(argv)
+
+    raw_files = find_raw_files(args.paths)
+    if not raw_files:
+        print("No raw data files found")
+        return 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    total_rows = 0
+    with ProcessPoolExecutor(max(min(args.workers, len(raw_files)), 1)) as pool:
+        futures = {pool.submit(rescore_file, raw_file, args.output_dir,
+                               args.models, args.chunk_size): raw_file
+                   for raw_file in raw_files}
+        for i, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except Exception as _error:
+                print(f"[{i}/{len(raw_files)}] {futures[future]} failed: {_error}")
+                continue
+            total_rows += result["rows"]
+            print(f"[{i}/{len(raw_files)}] {result['output file']}: {result['rows']} rows "
+                  f"in {result['seconds']:.1f} s "
+                  f"({result['rows'] / max(result['seconds'], 1e-9):.0f} rows/s)")
+    seconds = time.perf_counter() - start
+    print(f"Rescored {total_rows} rows in {len(raw_files)} files in {seconds:.1f} s "
+          f"({total_rows / max(seconds, 1e-9):.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())